@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Rollups of the search log for query popularity and latency.
+
+:class:`SearchAnalytics` reads new lines of ``search.log`` and new
+:class:`~invenio_search.models.UserQuery` rows since its previous run and
+adds them to compact daily rollups kept in a SQLite file:
+
+- number of searches per query and collection,
+- number of distinct users per query and collection,
+- queries without any hit,
+- latency histogram per collection, from which percentiles are computed.
+
+Cache warming and autocomplete ranking read the rollups instead of
+scanning the raw logs:
+
+.. code-block:: python
+
+    analytics = SearchAnalytics.from_config()
+    analytics.top_queries('Articles', limit=10)
+    analytics.latency_percentile('Articles', 95)
+"""
+
+import ast
+import datetime
+import math
+import os
+import sqlite3
+from collections import Counter
+
+from six.moves.urllib.parse import parse_qs
+
+from invenio.base.globals import cfg
+
+LATENCY_BUCKET_BASE = 1.1
+"""Ratio between upper bounds of consecutive latency buckets."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    day TEXT, collection TEXT, p TEXT, count INTEGER,
+    PRIMARY KEY (day, collection, p));
+CREATE TABLE IF NOT EXISTS users (
+    day TEXT, collection TEXT, p TEXT, count INTEGER,
+    PRIMARY KEY (day, collection, p));
+CREATE TABLE IF NOT EXISTS zero_hits (
+    day TEXT, collection TEXT, p TEXT, count INTEGER,
+    PRIMARY KEY (day, collection, p));
+CREATE TABLE IF NOT EXISTS latency (
+    day TEXT, collection TEXT, bucket INTEGER, count INTEGER,
+    PRIMARY KEY (day, collection, bucket));
+CREATE TABLE IF NOT EXISTS user_queries_seen (
+    day TEXT, id_user INTEGER, id_query INTEGER,
+    PRIMARY KEY (day, id_user, id_query));
+CREATE TABLE IF NOT EXISTS position (
+    source TEXT PRIMARY KEY, inode INTEGER, value TEXT);
+"""
+
+
+def latency_bucket(duration):
+    """Return histogram bucket of a duration in milliseconds."""
+    return int(math.ceil(math.log(max(duration, 0.1), LATENCY_BUCKET_BASE)))
+
+
+def parse_log_line(line):
+    """Return (day, p, collections, hits, duration) of a search log line.
+
+    Lines are formatted ``asctime#action#p#f#colls#total#duration``; lines
+    written before the duration was logged have no last field.  Return None
+    for lines which are not searches.
+    """
+    parts = line.rstrip('\n').split('#')
+    if len(parts) < 6 or parts[1] != 'search':
+        return None
+    duration = None
+    if len(parts) >= 7 and parts[-2].isdigit():
+        try:
+            duration = float(parts[-1]) if parts[-1] else None
+        except ValueError:
+            duration = None
+        else:
+            parts = parts[:-1]
+    asctime, p, colls, total = parts[0], '#'.join(parts[2:-3]), \
+        parts[-2], parts[-1]
+    if not total.isdigit() or len(asctime) < 8:
+        return None
+    try:
+        collections = ast.literal_eval(colls)
+    except (ValueError, SyntaxError):
+        collections = colls
+    if not isinstance(collections, (list, tuple)):
+        collections = [collections]
+    day = '{0}-{1}-{2}'.format(asctime[:4], asctime[4:6], asctime[6:8])
+    return day, p, [c for c in collections if c], int(total), duration
+
+
+class SearchAnalytics(object):
+
+    """Daily rollups of searches stored in a SQLite file."""
+
+    def __init__(self, path):
+        """Open or create the store."""
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls):
+        """Open store configured by ``SEARCH_ANALYTICS_STORE``."""
+        return cls(cfg.get('SEARCH_ANALYTICS_STORE') or os.path.join(
+            cfg['CFG_LOGDIR'], 'search_analytics.db'))
+
+    def close(self):
+        """Close the store."""
+        self.db.close()
+
+    def _get_position(self, source):
+        row = self.db.execute(
+            'SELECT inode, value FROM position WHERE source = ?', (source, )
+        ).fetchone()
+        return row if row is not None else (None, None)
+
+    def _set_position(self, source, inode, value):
+        self.db.execute('INSERT OR REPLACE INTO position VALUES (?, ?, ?)',
+                        (source, inode, value))
+
+    def _add(self, table, counts):
+        """Add counts keyed by (day, collection, key) to the table."""
+        key = 'bucket' if table == 'latency' else 'p'
+        for (day, collection, value), count in counts.items():
+            self.db.execute(
+                'INSERT OR IGNORE INTO {0} VALUES (?, ?, ?, 0)'.format(table),
+                (day, collection, value))
+            self.db.execute(
+                'UPDATE {0} SET count = count + ? WHERE day = ? AND '
+                'collection = ? AND {1} = ?'.format(table, key),
+                (count, day, collection, value))
+
+    def _read_log(self, filename, offset):
+        """Yield parsed lines and offset after them."""
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # the line is still being written
+                    break
+                offset += len(line)
+                yield parse_log_line(line.decode('utf-8', 'replace')), offset
+
+    def process_log(self, filename):
+        """Add lines appended to the search log since the previous run.
+
+        A log rotated since the previous run is finished first from its
+        first backup ``filename.1``.
+        """
+        source = 'log:' + os.path.abspath(filename)
+        inode, offset = self._get_position(source)
+        offset = int(offset or 0)
+        files = []
+        current_inode = os.stat(filename).st_ino
+        if inode is not None and inode != current_inode:
+            backup = filename + '.1'
+            if os.path.exists(backup) and os.stat(backup).st_ino == inode:
+                files.append((backup, offset))
+            offset = 0
+        elif offset > os.path.getsize(filename):
+            # truncated
+            offset = 0
+        files.append((filename, offset))
+
+        searches, zero_hits, latency = Counter(), Counter(), Counter()
+        for name, start in files:
+            offset = start
+            for parsed, offset in self._read_log(name, start):
+                if parsed is None:
+                    continue
+                day, p, collections, hits, duration = parsed
+                for collection in collections:
+                    searches[day, collection, p] += 1
+                    if hits == 0:
+                        zero_hits[day, collection, p] += 1
+                    if duration is not None:
+                        latency[day, collection,
+                                latency_bucket(duration)] += 1
+        with self.db:
+            self._add('searches', searches)
+            self._add('zero_hits', zero_hits)
+            self._add('latency', latency)
+            self._set_position(source, current_inode, str(offset))
+        return sum(searches.values())
+
+    def process_user_queries(self, rows):
+        """Add user queries executed since the previous run.
+
+        A user running a query several times in a day is counted once, even
+        when the row is read again after its date has been updated.
+
+        :param rows: iterable of ``(date, id_user, id_query, urlargs)`` sorted
+            by date, e.g. from :func:`iter_user_queries`
+        """
+        _, last = self._get_position('user_query')
+        users = Counter()
+        with self.db:
+            for date, id_user, id_query, urlargs in rows:
+                last = max(last or '', date.isoformat())
+                day = date.strftime('%Y-%m-%d')
+                if not self.db.execute(
+                        'INSERT OR IGNORE INTO user_queries_seen '
+                        'VALUES (?, ?, ?)', (day, id_user, id_query)
+                ).rowcount:
+                    continue
+                if isinstance(urlargs, bytes):
+                    urlargs = urlargs.decode('utf-8', 'replace')
+                args = parse_qs(urlargs)
+                p = args.get('p', [''])[0]
+                collection = args.get('cc', [cfg['CFG_SITE_NAME']])[0]
+                users[day, collection, p] += 1
+            self._add('users', users)
+            self._set_position('user_query', None, last)
+        return sum(users.values())
+
+    def last_user_query_date(self):
+        """Return date of the last processed user query or None."""
+        _, last = self._get_position('user_query')
+        if last:
+            return datetime.datetime.strptime(last[:19],
+                                              '%Y-%m-%dT%H:%M:%S')
+
+    def user_queries_since(self, lag=None):
+        """Return date from which user queries are read again.
+
+        User queries are read again from ``lag`` seconds (defaults to
+        ``SEARCH_ANALYTICS_USER_QUERY_LAG``) before the last processed one,
+        so that rows sharing its date and rows written late by the
+        asynchronous user query logger are not missed.  Rows already
+        counted are skipped by :meth:`process_user_queries`.
+        """
+        last = self.last_user_query_date()
+        if last is None:
+            return None
+        if lag is None:
+            lag = cfg.get('SEARCH_ANALYTICS_USER_QUERY_LAG', 600)
+        return last - datetime.timedelta(seconds=lag)
+
+    def compact(self, retention_days=None, keep=None, today=None):
+        """Remove old days and rare queries of finished days.
+
+        Rows of finished days are ranked once per table in a temporary table
+        instead of ranking each day and collection again for every row.
+
+        :param retention_days: number of days to keep
+        :param keep: number of queries kept per day and collection
+        """
+        today = today or datetime.date.today()
+        retention_days = retention_days or cfg.get(
+            'SEARCH_ANALYTICS_RETENTION_DAYS', 90)
+        keep = keep or cfg.get('SEARCH_ANALYTICS_TOP_QUERIES', 1000)
+        oldest = (today - datetime.timedelta(days=retention_days)).isoformat()
+        with self.db:
+            for table in ('searches', 'users', 'zero_hits', 'latency',
+                          'user_queries_seen'):
+                self.db.execute(
+                    'DELETE FROM {0} WHERE day < ?'.format(table), (oldest, ))
+            for table in ('searches', 'users', 'zero_hits'):
+                self._keep_top(table, today.isoformat(), keep)
+
+    def _keep_top(self, table, today, keep):
+        """Keep ``keep`` most frequent queries per day and collection."""
+        self.db.execute(
+            'CREATE TEMP TABLE ranked (position INTEGER PRIMARY KEY, '
+            'id INTEGER, day TEXT, collection TEXT)')
+        self.db.execute(
+            'CREATE TEMP TABLE firsts (day TEXT, collection TEXT, '
+            'first INTEGER, PRIMARY KEY (day, collection))')
+        try:
+            # positions are assigned in the order of the rows
+            self.db.execute(
+                'INSERT INTO ranked (id, day, collection) '
+                'SELECT rowid, day, collection FROM {0} WHERE day < ? '
+                'ORDER BY day, collection, count DESC, p'.format(table),
+                (today, ))
+            self.db.execute(
+                'INSERT INTO firsts SELECT day, collection, MIN(position) '
+                'FROM ranked GROUP BY day, collection')
+            self.db.execute(
+                'DELETE FROM {0} WHERE rowid IN ('
+                ' SELECT r.id FROM ranked r JOIN firsts f'
+                ' ON r.day = f.day AND r.collection = f.collection'
+                ' WHERE r.position >= f.first + ?)'.format(table), (keep, ))
+        finally:
+            self.db.execute('DROP TABLE temp.ranked')
+            self.db.execute('DROP TABLE temp.firsts')
+
+    def _top(self, table, collection=None, day=None, limit=10):
+        where, args = [], []
+        if collection is not None:
+            where.append('collection = ?')
+            args.append(collection)
+        if day is not None:
+            where.append('day = ?')
+            args.append(day)
+        return self.db.execute(
+            'SELECT p, SUM(count) AS total FROM {0} {1} GROUP BY p '
+            'ORDER BY total DESC, p LIMIT ?'.format(
+                table, 'WHERE ' + ' AND '.join(where) if where else ''),
+            args + [limit]
+        ).fetchall()
+
+    def top_queries(self, collection=None, day=None, limit=10):
+        """Return most frequent (query, count) of all retained days."""
+        return self._top('searches', collection, day, limit)
+
+    def top_user_queries(self, collection=None, day=None, limit=10):
+        """Return (query, users) run by the highest number of users."""
+        return self._top('users', collection, day, limit)
+
+    def zero_hit_queries(self, collection=None, day=None, limit=10):
+        """Return most frequent (query, count) without any hit."""
+        return self._top('zero_hits', collection, day, limit)
+
+    def latency_percentile(self, collection, percentile=95, day=None):
+        """Return upper bound in milliseconds of the latency percentile."""
+        args = [collection]
+        if day is not None:
+            args.append(day)
+        rows = self.db.execute(
+            'SELECT bucket, SUM(count) FROM latency WHERE collection = ? '
+            '{0} GROUP BY bucket ORDER BY bucket'.format(
+                'AND day = ?' if day is not None else ''),
+            args
+        ).fetchall()
+        total = sum(count for _, count in rows)
+        seen = 0
+        for bucket, count in rows:
+            seen += count
+            if seen >= total * percentile / 100.0:
+                return LATENCY_BUCKET_BASE ** bucket
+
+
+def iter_user_queries(since=None, batch_size=10000):
+    """Yield (date, id_user, id_query, urlargs) of user queries.
+
+    :param since: only yield user queries executed at or after this date
+    """
+    from invenio.ext.sqlalchemy import db
+    from .models import UserQuery, WebQuery
+
+    query = db.session.query(
+        UserQuery.date, UserQuery.id_user, UserQuery.id_query,
+        WebQuery.urlargs
+    ).join(
+        WebQuery, UserQuery.id_query == WebQuery.id
+    ).order_by(UserQuery.date)
+    if since is not None:
+        query = query.filter(UserQuery.date >= since)
+    for row in query.yield_per(batch_size):
+        yield row
+
+
+def rollup(log=None):
+    """Update the search analytics store and return processed counts."""
+    analytics = SearchAnalytics.from_config()
+    try:
+        log = log or os.path.join(cfg['CFG_LOGDIR'], 'search.log')
+        searches = analytics.process_log(log) if os.path.exists(log) else 0
+        users = analytics.process_user_queries(
+            iter_user_queries(analytics.user_queries_since()))
+        analytics.compact()
+    finally:
+        analytics.close()
+    return searches, users
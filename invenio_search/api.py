@@ -21,15 +21,27 @@
 
 from __future__ import unicode_literals
 
+import re
+
 import pypeg2
 
+from flask import g
+
 from flask_login import current_user
 
+from invenio.base.globals import cfg
 from invenio.base.helpers import unicodifier
 
+from six import iteritems
+
 from werkzeug.utils import cached_property
 
+from .deadline import Deadline, set_deadline
+from .errors import InvenioWebSearchQueryCostError
+from .instrumentation import span
+from .metrics import es_hits, es_request_seconds, query_parse_seconds
 from .utils import parser, query_enhancers, query_walkers, search_walkers
+from .walkers.cost import QueryCost, QueryDowngrade
 from .walkers.match_unit import MatchUnit
 from .walkers.terms import Terms
 
@@ -49,24 +61,76 @@ class Query(object):
     @cached_property
     def query(self):
         """Parse query string using given grammar."""
-        tree = pypeg2.parse(self._query, parser(), whitespace="")
+        with span('parse'), query_parse_seconds.time():
+            tree = pypeg2.parse(self._query, parser(), whitespace="")
         for walker in query_walkers():
-            tree = tree.accept(walker)
+            with span('walker.' + walker.__class__.__name__):
+                tree = tree.accept(walker)
         return tree
 
-    def search(self, user_info=None, collection=None, **kwargs):
-        """Search records."""
+    def cost(self):
+        """Return estimated cost of the parsed query."""
+        return self.query.accept(QueryCost())
+
+    def check_cost(self, budget=None, policy=None):
+        """Check the estimated query cost against the budget.
+
+        With the ``'DOWNGRADE'`` policy an expensive query is replaced by its
+        cheaper version when it fits in the budget.
+
+        :param budget: maximum cost (defaults to ``SEARCH_QUERY_COST_BUDGET``)
+        :param policy: ``'REJECT'`` or ``'DOWNGRADE'`` (defaults to
+            ``SEARCH_QUERY_COST_POLICY``)
+        :raises InvenioWebSearchQueryCostError: if the query is too expensive
+        :return: estimated cost of the query that will be executed or
+            ``None`` without budget, in which case the cost is not estimated
+        """
+        budget = budget or cfg.get('SEARCH_QUERY_COST_BUDGET')
+        if not budget:
+            return None
+        cost = self.cost()
+        if cost <= budget:
+            return cost
+
+        policy = (policy or cfg['SEARCH_QUERY_COST_POLICY']).upper()
+        if policy == 'DOWNGRADE':
+            tree = self.query.accept(QueryDowngrade())
+            downgraded_cost = tree.accept(QueryCost())
+            if downgraded_cost <= budget:
+                # replace the cached parsed query
+                self.__dict__['query'] = tree
+                return downgraded_cost
+        raise InvenioWebSearchQueryCostError(cost, budget)
+
+    def search(self, user_info=None, collection=None, timeout=None,
+               wl=None, **kwargs):
+        """Search records.
+
+        :param timeout: time budget in seconds for the whole search request
+            (defaults to ``SEARCH_QUERY_TIMEOUT``). When it is exceeded the
+            native engine stops evaluating search units, Elasticsearch returns
+            whatever it collected so far and the results are marked as
+            :attr:`Results.partial`.
+        :param wl: maximum number of terms a wildcard pattern is expanded to
+            (defaults to ``CFG_WEBSEARCH_WILDCARD_LIMIT``, ``0`` means no
+            limit)
+        """
         user_info = user_info or current_user
+        if timeout is None:
+            timeout = cfg.get('SEARCH_QUERY_TIMEOUT')
+        deadline = Deadline(timeout) if timeout else None
+        set_deadline(deadline)
+        g.search_wildcard_limit = wl
+
         # Enhance query first
-        query = self.query
-        for enhancer in query_enhancers():
-            query = enhancer(query, user_info=user_info,
-                             collection=collection)
+        query = query_enhancers()(self.query, user_info=user_info,
+                                  collection=collection)
 
         for walker in search_walkers():
-            query = query.accept(walker)
-        return Results(query)
-
+            with span('walker.' + walker.__class__.__name__):
+                query = query.accept(walker)
+        return Results(query, deadline=deadline,
+                       wildcard_limit=g.search_wildcard_limit)
 
     def match(self, record, user_info=None):
         """Return True if record match the query."""
@@ -77,17 +141,112 @@ class Query(object):
         return self.query.accept(Terms(keywords=keywords))
 
 
+def _limited_wildcards(query):
+    """Yield prefix and wildcard clauses with a limited expansion."""
+    if isinstance(query, dict):
+        for key, value in iteritems(query):
+            if key in ('prefix', 'wildcard') and isinstance(value, dict):
+                for field, options in iteritems(value):
+                    if isinstance(options, dict) and 'rewrite' in options:
+                        yield key, field, options
+            else:
+                for clause in _limited_wildcards(value):
+                    yield clause
+    elif isinstance(query, list):
+        for value in query:
+            for clause in _limited_wildcards(value):
+                yield clause
+
+
+def _count_terms(explanation, field):
+    """Return number of terms of field in the explanation of a query."""
+    return len(re.findall(r'(?:^|[\s(+])' + re.escape(field) + ':',
+                          explanation))
+
+
 class Results(object):
 
-    def __init__(self, query, **kwargs):
+    def __init__(self, query, deadline=None, wildcard_limit=None, **kwargs):
         self.body = {
             'from': 0,
             'size': 10,
             'query': query,
         }
+        terminate_after = cfg.get('SEARCH_QUERY_TERMINATE_AFTER')
+        if terminate_after:
+            self.body['terminate_after'] = terminate_after
         self.body.update(kwargs)
 
+        self.deadline = deadline
+        self.wildcard_limit = wildcard_limit
         self._results = None
+        self._wildcards_truncated = None
+
+    def _search_kwargs(self, body):
+        """Apply the remaining time budget to the search request."""
+        if self.deadline is None:
+            return dict(body=body)
+        body = dict(body, timeout=self.deadline.es_timeout())
+        # Leave some slack to Elasticsearch to return partial results.
+        return dict(body=body, request_timeout=self.deadline.remaining + 1)
+
+    @property
+    def partial(self):
+        """Return True if the results are incomplete.
+
+        It happens when the time budget was exceeded or when the search was
+        terminated early by ``SEARCH_QUERY_TERMINATE_AFTER``.  The search is
+        not sent by this property: before the results are fetched only the
+        native engine can have been stopped.
+        """
+        if self.deadline is not None and self.deadline.exceeded:
+            return True
+        results = self._results or {}
+        return bool(results.get('timed_out') or
+                    results.get('terminated_early'))
+
+    @property
+    def wildcards_truncated(self):
+        """Return True if a wildcard expanded to more terms than the limit.
+
+        Only the top ``N`` terms of such a wildcard have been searched.  Each
+        limited wildcard is rewritten by Elasticsearch to its top ``N + 1``
+        terms, without searching any document, and the terms are counted in
+        the explanation of the rewritten query.
+
+        The check is only done with ``SEARCH_WILDCARD_TRUNCATION_CHECK``, and
+        not when the results are already partial or the time budget is spent.
+        """
+        from invenio.ext.es import es
+
+        if self._wildcards_truncated is not None:
+            return self._wildcards_truncated
+
+        self._wildcards_truncated = False
+        if not cfg.get('SEARCH_WILDCARD_TRUNCATION_CHECK') or self.partial:
+            return False
+        for clause, field, options in _limited_wildcards(
+                self.body.get('query')):
+            kwargs = {}
+            if self.deadline is not None:
+                if self.deadline.expired:
+                    break
+                kwargs['request_timeout'] = self.deadline.remaining
+            limit = int(options['rewrite'][len('top_terms_'):])
+            probe = dict(options, rewrite='top_terms_{0}'.format(limit + 1))
+            results = es.indices.validate_query(
+                index='records',
+                doc_type='record',
+                body={'query': {clause: {field: probe}}},
+                params={'explain': 'true', 'rewrite': 'true'},
+                **kwargs
+            )
+            for explanation in results.get('explanations', ()):
+                if _count_terms(explanation.get('explanation', ''),
+                                field) > limit:
+                    self._wildcards_truncated = True
+                    return True
+        return self._wildcards_truncated
 
     @property
     def recids(self):
@@ -97,11 +256,11 @@ class Results(object):
         results = es.search(
             index='records',
             doc_type='record',
-            body={
+            **self._search_kwargs({
                 'size': 9999999,
                 'fields': ['control_number'],
                 'query': self.body.get("query")
-            }
+            })
         )
         return intbitset([int(r['_id']) for r in results['hits']['hits']])
 
@@ -109,16 +268,20 @@ class Results(object):
         from invenio.ext.es import es
 
         if self._results is None:
-            self._results = es.search(
-                index='records',
-                doc_type='record',
-                body=self.body,
-            )
+            with span('es'), es_request_seconds.time():
+                self._results = es.search(
+                    index='records',
+                    doc_type='record',
+                    **self._search_kwargs(self.body)
+                )
+            es_hits.observe(self._results['hits']['total'])
         return self._results
 
     def records(self):
         from invenio_records.api import Record
-        return [Record(r['_source']) for r in self._search()['hits']['hits']]
+        hits = self._search()['hits']['hits']
+        with span('records'):
+            return [Record(r['_source']) for r in hits]
 
     def __len__(self):
         return self._search()['hits']['total']
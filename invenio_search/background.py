@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Bounded queues handled by a background thread in each process.
+
+The search engine writes its logs from background threads, so that
+requests never wait for file or database I/O.  The thread is started on
+first use in every process, hence again in forked workers.  Items arriving
+while the queue is full are dropped and counted instead of blocking the
+request.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from six.moves import queue
+
+from .deadline import monotonic
+
+_STOP = object()
+
+
+class BackgroundQueue(object):
+
+    """Queue whose items are handled in batches by a background thread.
+
+    :param handler: function called in the thread with a list of items
+    :param name: name of the thread
+    :param maxsize: maximum number of waiting items
+    :param batch_size: maximum number of items per batch, all waiting items
+        are handled together if None
+    :param interval: number of seconds to wait for more items before
+        handling a batch smaller than ``batch_size``
+    :param on_drop: function called when an item is dropped
+    :param flush_at_exit: if True, wait for queued items at interpreter exit
+    """
+
+    def __init__(self, handler, name, maxsize=1000, batch_size=None,
+                 interval=0, on_drop=None, flush_at_exit=False):
+        """Initialize queue; the thread is started on first use."""
+        self.handler = handler
+        self.name = name
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_drop = on_drop
+        self.flush_at_exit = flush_at_exit
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _start(self):
+        """Start handler thread, again in forked processes."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run,
+                                                name=self.name)
+                self._thread.daemon = True
+                self._thread.start()
+                if self.flush_at_exit:
+                    atexit.register(self.flush)
+                self._pid = os.getpid()
+
+    @property
+    def running(self):
+        """Return True if the thread of this process is running."""
+        return self._pid == os.getpid() and self._thread is not None and \
+            self._thread.is_alive()
+
+    def put(self, item):
+        """Queue item without blocking; return False if it was dropped."""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop()
+            return False
+        return True
+
+    def flush(self):
+        """Wait until all queued items are handled."""
+        if self.running:
+            self.queue.join()
+
+    def close(self, timeout=5):
+        """Handle queued items and stop the thread."""
+        if self.running:
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _get_batch(self):
+        """Return next items, waiting at most ``interval`` for more."""
+        items = [self.queue.get()]
+        deadline = monotonic() + self.interval
+        while items[-1] is not _STOP and (
+                self.batch_size is None or len(items) < self.batch_size):
+            timeout = deadline - monotonic()
+            try:
+                if timeout > 0:
+                    items.append(self.queue.get(timeout=timeout))
+                else:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._get_batch()
+            stop = items[-1] is _STOP
+            batch = items[:-1] if stop else items
+            try:
+                if batch:
+                    self.handler(batch)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    'Cannot handle items queued for %s', self.name)
+            finally:
+                for dummy in items:
+                    self.queue.task_done()
+            if stop:
+                return
@@ -27,10 +27,15 @@ from invenio.ext.cache import cache
 from invenio.legacy.miscutil.data_cacher import DataCacher, DataCacherProxy
 from invenio.utils.hash import md5
 
+from .metrics import cache_requests_total
 from .models import Field, Fieldname
 
 search_results_cache = cache
 
+service_answer_cache = cache
+
+service_data_cache = cache
+
 
 def get_search_query_id(**kwargs):
     """Return unique query indentifier."""
@@ -55,6 +60,32 @@ def get_search_results_cache_key_from_qid(qid=None):
         return cfg['CFG_SEARCH_RESULTS_CACHE_PREFIX'] + qid
 
 
+def get_service_answer_cache_key(service, p, f, cc, colls, ln, permissions,
+                                 version=None):
+    """Return key for search service answer cache.
+
+    :param service: name of the search service
+    :param colls: collections to search
+    :param permissions: digest of the restricted collections the user can
+        see
+    :param version: version of the data used by the service
+    """
+    return 'search::service_answer::{0}::{1}'.format(
+        service,
+        md5(repr((p, f, cc, colls, ln, permissions, version))).hexdigest())
+
+
+def get_journal_reference_cache_key(reference, cc, colls, permissions):
+    """Return key of the records a journal reference resolves to.
+
+    :param reference: journal reference
+    :param permissions: digest of the restricted collections the user can
+        see
+    """
+    return 'search::journal_reference::{0}'.format(
+        md5(repr((reference, cc, colls, permissions))).hexdigest())
+
+
 def get_collection_name_from_cache(qid):
     """Return collection name from query identifier."""
     try:
@@ -94,7 +125,9 @@ def get_results_cache(query, collection_name=None):
     try:
         results = search_results_cache.get(qid)
         if results is not None:
+            cache_requests_total.inc(cache='results', result='hit')
             return intbitset().fastload(results)
+        cache_requests_total.inc(cache='results', result='miss')
     except Exception:
         current_app.logger.exception('Invalid search results cache.')
 
@@ -146,6 +179,8 @@ def get_field_i18nname(f, ln=None, verify_cache_timestamp=True):
     out = f
     try:
         out = field_i18nname_cache.cache[f][ln]
+        cache_requests_total.inc(cache='field_i18nname', result='hit')
     except KeyError:
-        pass  # translation in LN does not exist
+        # translation in LN does not exist
+        cache_requests_total.inc(cache='field_i18nname', result='miss')
     return out
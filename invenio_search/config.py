@@ -44,6 +44,163 @@ SEARCH_WALKERS = [
     'invenio_search.walkers.elasticsearch:ElasticSearchDSL',
 ]
 
+# SEARCH_QUERY_TIMEOUT -- time budget in seconds for a single search request.
+# When it is exceeded the search stops and the results are marked as partial.
+# Set to None to disable.
+SEARCH_QUERY_TIMEOUT = None
+
+# SEARCH_QUERY_TERMINATE_AFTER -- maximum number of documents collected by
+# each Elasticsearch shard before the search terminates early.  Set to None
+# to disable.
+SEARCH_QUERY_TERMINATE_AFTER = None
+
+# SEARCH_WILDCARD_TRUNCATION_CHECK -- ask Elasticsearch whether wildcards
+# limited by ``CFG_WEBSEARCH_WILDCARD_LIMIT`` matched more terms, in order to
+# warn the user.  It costs one extra request per limited wildcard.
+SEARCH_WILDCARD_TRUNCATION_CHECK = False
+
+# SEARCH_QUERY_COST_BUDGET -- maximum estimated cost of a query accepted by the
+# search page.  Set to None to disable the check.
+SEARCH_QUERY_COST_BUDGET = None
+
+# SEARCH_QUERY_COST_POLICY -- what to do with queries above the budget:
+# 'REJECT' them or try to 'DOWNGRADE' them (remove leading wildcards, replace
+# regular expressions by prefix searches) and reject them only if they are
+# still too expensive.
+SEARCH_QUERY_COST_POLICY = 'DOWNGRADE'
+
+# SEARCH_QUERY_COST_WEIGHTS -- weights used to estimate the cost of a query.
+# Value weights are multiplied by the number of fields the keyword maps to.
+SEARCH_QUERY_COST_WEIGHTS = {
+    'node': 1,
+    'term': 1,
+    'phrase': 2,
+    'wildcard': 10,
+    'leading_wildcard': 100,
+    'regex': 50,
+    'range': 5,
+    'open_range': 10,
+}
+
+# SEARCH_REGEX_CACHE_SIZE -- number of analysed and compiled regular
+# expressions kept in memory by each worker.
+SEARCH_REGEX_CACHE_SIZE = 1024
+
+# SEARCH_STEM_CACHE_SIZE -- number of stemmed words kept in memory by each
+# worker for search services.
+SEARCH_STEM_CACHE_SIZE = 10000
+
+# SEARCH_INSTRUMENTATION -- record duration of the search stages (parsing,
+# walkers, enhancers, Elasticsearch, records, formatting) and send them in
+# the Server-Timing header of the search page.
+SEARCH_INSTRUMENTATION = False
+
+# SEARCH_METRICS_ENABLED -- collect metrics of the search subsystems and
+# expose them at ``/search/metrics`` in Prometheus text format.
+SEARCH_METRICS_ENABLED = False
+
+# SEARCH_METRICS_DIR -- directory where each worker process stores its
+# metrics in a memory mapped file.  Needed to aggregate the metrics of
+# several processes (e.g. gunicorn workers); the directory should be
+# emptied when the application is (re)started.
+SEARCH_METRICS_DIR = None
+
+# SEARCH_SLOW_QUERY_THRESHOLD -- searches taking longer than this number of
+# seconds are written to the slow query log (None disables the log).
+SEARCH_SLOW_QUERY_THRESHOLD = None
+
+# SEARCH_SLOW_QUERY_LOG -- file of the slow query log (defaults to
+# ``search_slow.log`` in ``CFG_LOGDIR``).
+SEARCH_SLOW_QUERY_LOG = None
+
+# SEARCH_SLOW_QUERY_LOG_QUEUE_SIZE -- maximum number of slow query records
+# waiting to be written; further records are dropped.
+SEARCH_SLOW_QUERY_LOG_QUEUE_SIZE = 1000
+
+# SEARCH_USER_QUERY_LOG_ASYNC -- buffer user queries in memory and write them
+# to the database in batches from a background thread instead of during the
+# search request.
+SEARCH_USER_QUERY_LOG_ASYNC = True
+
+# SEARCH_USER_QUERY_LOG_BUFFER_SIZE -- maximum number of buffered user
+# queries; further queries are dropped.
+SEARCH_USER_QUERY_LOG_BUFFER_SIZE = 10000
+
+# SEARCH_USER_QUERY_LOG_BATCH_SIZE -- number of buffered user queries
+# written at once.
+SEARCH_USER_QUERY_LOG_BATCH_SIZE = 100
+
+# SEARCH_USER_QUERY_LOG_FLUSH_INTERVAL -- maximum number of milliseconds a
+# user query stays in the buffer.
+SEARCH_USER_QUERY_LOG_FLUSH_INTERVAL = 1000
+
+# SEARCH_USER_QUERY_LOG_CACHE_SIZE -- number of query identifiers kept in
+# memory to avoid looking them up in the database.
+SEARCH_USER_QUERY_LOG_CACHE_SIZE = 10000
+
+# SEARCH_LOG_QUEUE_SIZE -- maximum number of search log records waiting to
+# be written; further records are dropped.
+SEARCH_LOG_QUEUE_SIZE = 10000
+
+# SEARCH_ANALYTICS_STORE -- SQLite file with the rollups of the search log
+# updated by ``inveniomanage search rollup`` (defaults to
+# ``search_analytics.db`` in ``CFG_LOGDIR``).
+SEARCH_ANALYTICS_STORE = None
+
+# SEARCH_ANALYTICS_RETENTION_DAYS -- number of days kept in the rollups.
+SEARCH_ANALYTICS_RETENTION_DAYS = 90
+
+# SEARCH_ANALYTICS_TOP_QUERIES -- number of queries kept per day and
+# collection once the day is over.
+SEARCH_ANALYTICS_TOP_QUERIES = 1000
+
+# SEARCH_ANALYTICS_USER_QUERY_LAG -- number of seconds before the last
+# processed user query from which user queries are read again, to count the
+# ones written late by the asynchronous user query logger.
+SEARCH_ANALYTICS_USER_QUERY_LAG = 600
+
+# SEARCH_SERVICES_POOL_SIZE -- number of threads running search services
+# concurrently in each process (0 runs them one after another).
+SEARCH_SERVICES_POOL_SIZE = 4
+
+# SEARCH_SERVICE_TIMEOUT -- number of seconds a search service has to
+# answer before its answer is ignored.
+SEARCH_SERVICE_TIMEOUT = 1.0
+
+# SEARCH_SERVICES_TIMEOUT -- number of seconds all search services have to
+# answer together (2 seconds when set to 0 or None, so that a hung service
+# never blocks the search page).
+SEARCH_SERVICES_TIMEOUT = 2.0
+
+# SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT -- number of seconds answers of
+# search services with ``cache_answers`` are cached (0 disables the cache).
+SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT = 300
+
+# SEARCH_SERVICES_PRELOAD -- prepare data of search services before the first
+# request of each worker instead of during the first search using them.
+SEARCH_SERVICES_PRELOAD = True
+
+# SEARCH_SERVICES_DATA_CACHE_CHECK_INTERVAL -- minimal number of seconds
+# between two checks whether data of a search service must be prepared again.
+SEARCH_SERVICES_DATA_CACHE_CHECK_INTERVAL = 60
+
+# SEARCH_SERVICES_DATA_CACHE_SHARED -- share data prepared by search services
+# with other workers through the cache, so that only one of them prepares it.
+SEARCH_SERVICES_DATA_CACHE_SHARED = False
+
+# SEARCH_SERVICES_DATA_CACHE_SHARED_TIMEOUT -- number of seconds shared data
+# of search services is kept in the cache.
+SEARCH_SERVICES_DATA_CACHE_SHARED_TIMEOUT = 86400
+
+# SEARCH_ACCESS_CONTROL_CHECK_INTERVAL -- minimal number of seconds between
+# two checks whether access control tables changed, which invalidates the
+# restricted collections users can see cached in their session.
+SEARCH_ACCESS_CONTROL_CHECK_INTERVAL = 10
+
+# SEARCH_FACETS_CHUNK_SIZE -- number of records whose field values are
+# fetched and counted at once when building facets.
+SEARCH_FACETS_CHUNK_SIZE = 10000
+
 # do we want experimental features? (0=no, 1=yes)
 CFG_EXPERIMENTAL_FEATURES = 0
 
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Time budget for search requests."""
+
+from __future__ import division
+
+import time
+
+from flask import g
+
+monotonic = getattr(time, 'monotonic', time.time)
+"""Monotonic clock when available (Python 3), wall clock otherwise."""
+
+
+class Deadline(object):
+
+    """Time budget of a single search request.
+
+    The deadline is started on creation and can be consulted by the search
+    walkers and by :class:`~invenio_search.api.Results` in order to stop
+    working once the budget is exhausted.  Whoever stops working early calls
+    :meth:`stop`, so that :attr:`exceeded` tells whether the results are
+    incomplete.
+    """
+
+    def __init__(self, timeout):
+        """Start the deadline.
+
+        :param timeout: time budget in seconds
+        """
+        self.timeout = timeout
+        self.started = monotonic()
+        self.exceeded = False
+
+    def __repr__(self):
+        """Object representation."""
+        return "%s(%r)" % (self.__class__.__name__, self.timeout)
+
+    @property
+    def remaining(self):
+        """Return remaining time in seconds (never negative)."""
+        return max(0, self.timeout - (monotonic() - self.started))
+
+    @property
+    def expired(self):
+        """Return True if the time budget is exhausted."""
+        return self.remaining <= 0
+
+    def stop(self):
+        """Record that some work was skipped because of the deadline."""
+        self.exceeded = True
+
+    def es_timeout(self):
+        """Return remaining time formatted for Elasticsearch ``timeout``."""
+        return '{0}ms'.format(max(1, int(self.remaining * 1000)))
+
+
+def get_deadline():
+    """Return the deadline of the current search request or None."""
+    return getattr(g, 'search_deadline', None)
+
+
+def set_deadline(deadline):
+    """Set the deadline of the current search request."""
+    g.search_deadline = deadline
@@ -17,4 +17,89 @@
 # along with Invenio; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
 
-"""Implement various query enhancers."""
+"""Implement various query enhancers.
+
+An enhancer is a function ``apply(query, user_info=None, collection=None)``
+returning the enhanced query tree.  The enhancers listed in
+``SEARCH_QUERY_ENHANCERS`` are composed once per application into an
+:class:`EnhancerPipeline`.
+"""
+
+import threading
+
+import six
+
+from werkzeug.utils import import_string
+
+from ..deadline import monotonic
+from ..instrumentation import get_recorder
+
+
+def skip_when(predicate):
+    """Mark enhancer as a no-op for requests matching the predicate.
+
+    The predicate is called with the same keyword arguments as the enhancer
+    and the enhancer is not applied when it returns True.
+
+    .. code-block:: python
+
+        @skip_when(lambda **kwargs: 'filter' not in request.values)
+        def apply(query, user_info=None, collection=None):
+            ...
+    """
+    def decorator(enhancer):
+        enhancer.__search_skip__ = predicate
+        return enhancer
+    return decorator
+
+
+class EnhancerPipeline(object):
+
+    """Compose query enhancers into one callable.
+
+    Enhancers can be given as callables or import strings.  The time spent
+    in every enhancer is accumulated in :attr:`timings` as a
+    ``name -> [calls, seconds]`` mapping and recorded as an ``enhancer.<name>``
+    span of the current request.
+    """
+
+    def __init__(self, enhancers):
+        """Load enhancers."""
+        self.enhancers = tuple(
+            import_string(enhancer)
+            if isinstance(enhancer, six.string_types) else enhancer
+            for enhancer in enhancers
+        )
+        self.names = tuple(
+            '{0}.{1}'.format(getattr(enhancer, '__module__', ''),
+                             getattr(enhancer, '__name__', repr(enhancer)))
+            for enhancer in self.enhancers
+        )
+        self.timings = dict((name, [0, 0.0]) for name in self.names)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        """Iterate over loaded enhancers."""
+        return iter(self.enhancers)
+
+    def __len__(self):
+        """Return number of enhancers."""
+        return len(self.enhancers)
+
+    def __call__(self, query, **kwargs):
+        """Apply all enhancers that are not no-ops for this request."""
+        recorder = get_recorder()
+        for name, enhancer in zip(self.names, self.enhancers):
+            skip = getattr(enhancer, '__search_skip__', None)
+            if skip is not None and skip(**kwargs):
+                continue
+            start = monotonic()
+            query = enhancer(query, **kwargs)
+            elapsed = monotonic() - start
+            with self._lock:
+                timing = self.timings[name]
+                timing[0] += 1
+                timing[1] += elapsed
+            if recorder is not None:
+                recorder.add('enhancer.' + name, elapsed)
+        return query
@@ -99,16 +99,17 @@ def create_collection_query(restricted_cols, permitted_restricted_cols,
 def apply(query, user_info=None, collection=None):
     """Enhance the query restricting not permitted collections.
 
-    Get the permitted restricted collection for the current user from the
-    user_info object and all the restriced collections from the
+    Get the permitted restricted collection for the current user, cached in
+    the session, and all the restriced collections from the
     restricted_collection_cache.
     """
     from invenio_collections.cache import restricted_collection_cache
+    from ..utils import get_permitted_restricted_collections
 
     policy = cfg['CFG_WEBSEARCH_VIEWRESTRCOLL_POLICY'].strip().upper()
+    permitted_restricted_cols = get_permitted_restricted_collections(
+        user_info)
     restricted_cols = restricted_collection_cache.cache
-    permitted_restricted_cols = user_info.get(
-        'precached_permitted_restricted_collections', [])
     current_col = collection or cfg['CFG_SITE_NAME']
     result_tree = create_collection_query(restricted_cols,
                                           permitted_restricted_cols,
@@ -26,6 +26,7 @@ from operator import itemgetter
 
 from flask import request
 
+from invenio_search.enhancers import skip_when
 from invenio_search.registry import facets
 
 from invenio_query_parser.ast import (
@@ -90,12 +91,12 @@ def format_facet_tree_nodes(query, filter_data, facets,
     return query
 
 
+@skip_when(lambda **kwargs: 'filter' not in request.values)
 def apply(query, user_info=None, collection=None, **kwargs):
     """Enhance the query AST with the facet filters."""
     if 'filter' in request.values:
-        if 'filter' in request.values:
-            filter_data = get_groupped_facets(json.loads(
-                request.values.get('filter', '[]')
-            ))
-            query = format_facet_tree_nodes(query, filter_data, facets)
+        filter_data = get_groupped_facets(json.loads(
+            request.values.get('filter', '[]')
+        ))
+        query = format_facet_tree_nodes(query, filter_data, facets)
     return query
@@ -51,3 +51,31 @@ class InvenioWebSearchCitedbyLimitError(Exception):
     def __init__(self, res):
         """Initialization."""
         self.res = res
+
+
+class InvenioWebSearchQueryCostError(Exception):
+    """Raise when the estimated query cost exceeds the allowed budget."""
+
+    def __init__(self, cost, budget):
+        """Initialization."""
+        self.cost = cost
+        self.budget = budget
+
+    def __str__(self):
+        """String representation."""
+        return 'Query cost {0} exceeds budget {1}'.format(self.cost,
+                                                          self.budget)
+
+
+class InvenioWebSearchRegexError(Exception):
+    """Raise when a regular expression is invalid or unsafe to evaluate."""
+
+    def __init__(self, pattern, reason):
+        """Initialization."""
+        self.pattern = pattern
+        self.reason = reason
+
+    def __str__(self):
+        """String representation."""
+        return 'Regular expression {0!r} rejected: {1}'.format(self.pattern,
+                                                               self.reason)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Search engine application setup.
+
+Objects that only depend on the application configuration are built once
+when the application is created and shared by all requests.
+"""
+
+import threading
+
+import six
+
+from flask import current_app
+from werkzeug.utils import import_string
+
+from . import signals
+from .receivers import after_search, setup_logger
+
+
+def _load(value):
+    """Import object given by its import path."""
+    if isinstance(value, six.string_types):
+        return import_string(value)
+    return value
+
+
+class SearchState(object):
+
+    """Hold search objects built from the application configuration.
+
+    Every object is rebuilt when one of the configuration variables it
+    depends on is replaced, hence walkers listed in ``SEARCH_QUERY_WALKERS``
+    and ``SEARCH_WALKERS`` are instantiated once and shared by all requests
+    and threads.  They must not keep any per-request state.
+    """
+
+    def __init__(self, app):
+        """Initialize state for the application."""
+        self.app = app
+        self._objects = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name, keys, factory):
+        """Return object built by factory from configuration variables."""
+        sources = tuple(self.app.config[key] for key in keys)
+        cached = self._objects.get(name)
+        if cached is not None and len(cached[0]) == len(sources) and all(
+                a is b for a, b in zip(cached[0], sources)):
+            return cached[1]
+        with self._lock:
+            value = factory(*sources)
+            self._objects[name] = (sources, value)
+        return value
+
+    @property
+    def keyword_mapping(self):
+        """Return keyword to fields table."""
+        from .walkers.elasticsearch import KeywordMapping
+        return self._get('keyword_mapping',
+                         ('SEARCH_ELASTIC_KEYWORD_MAPPING', ),
+                         KeywordMapping)
+
+    @property
+    def parser(self):
+        """Return search query parser."""
+        return self._get('parser', ('SEARCH_QUERY_PARSER', ), _load)
+
+    @property
+    def query_enhancers(self):
+        """Return pipeline of query enhancers."""
+        from .enhancers import EnhancerPipeline
+        return self._get('query_enhancers', ('SEARCH_QUERY_ENHANCERS', ),
+                         EnhancerPipeline)
+
+    @property
+    def query_walkers(self):
+        """Return tuple of query walker instances."""
+        return self._get(
+            'query_walkers', ('SEARCH_QUERY_WALKERS', ),
+            lambda walkers: tuple(_load(walker)() for walker in walkers)
+        )
+
+    @property
+    def search_walkers(self):
+        """Return tuple of search walker instances."""
+        return self._get(
+            'search_walkers',
+            ('SEARCH_WALKERS', 'SEARCH_ELASTIC_KEYWORD_MAPPING'),
+            lambda walkers, mapping: tuple(
+                _load(walker)() for walker in walkers
+            )
+        )
+
+
+def setup_app(app):
+    """Build and validate search objects for the application."""
+    state = SearchState(app)
+    app.extensions['invenio-search'] = state
+    # Fail on invalid configuration at startup instead of mid-request.
+    with app.app_context():
+        state.keyword_mapping
+        state.parser
+        state.query_enhancers
+        state.query_walkers
+        state.search_walkers
+    setup_logger(app)
+    signals.after_search.connect(after_search, sender=app)
+    if app.config.get('SEARCH_SERVICES_PRELOAD'):
+        app.before_first_request(_preload_services)
+    return app
+
+
+def _preload_services():
+    """Prepare data of search services."""
+    try:
+        from .services import preload_data_caches
+        preload_data_caches()
+    except Exception:
+        current_app.logger.exception('Could not preload search services.')
+
+
+def get_state(app=None):
+    """Return search state of the application."""
+    app = app or current_app._get_current_object()
+    state = app.extensions.get('invenio-search')
+    if state is None:
+        setup_app(app)
+        state = app.extensions['invenio-search']
+    return state
@@ -35,7 +35,9 @@ from .cache import (
 )
 from .models import Field
 from .utils import (
+    get_access_control_version,
     get_most_popular_field_values,
+    get_permitted_restricted_collections,
     get_records_that_can_be_displayed,
 )
 
@@ -51,17 +53,18 @@ def get_current_user_records_that_can_be_displayed(qid):
         'CFG_WEBSEARCH_SEARCH_CACHE_TIMEOUT')
 
     @search_results_cache.memoize(timeout=CFG_WEBSEARCH_SEARCH_CACHE_TIMEOUT)
-    def get_records_for_user(qid, uid):
+    def get_records_for_user(qid, uid, version):
         key = get_search_results_cache_key_from_qid(qid)
         data = search_results_cache.get(key)
         if data is None:
             return intbitset([])
         cc = search_results_cache.get(key + '::cc')
         return get_records_that_can_be_displayed(
-            current_user.get('precached_permitted_restricted_collections', []),
+            get_permitted_restricted_collections(current_user),
             intbitset().fastload(data), cc)
     # Simplifies API
-    return get_records_for_user(qid, current_user.get_id())
+    return get_records_for_user(qid, current_user.get_id(),
+                                get_access_control_version())
 
 
 def faceted_results_filter(recids, filter_data, facets):
@@ -139,8 +142,9 @@ class FacetBuilder(object):
     def get_facets_for_query(self, qid, limit=20, parent=None):
         """Return facet data."""
         return get_most_popular_field_values(
-            self.get_recids(qid), Field.get_field_tags(self.name)
-        )[0:limit]
+            self.get_recids(qid), Field.get_field_tags(self.name),
+            limit=limit
+        )
 
     def get_value_recids(self, value):
         """Return record ids in intbitset for given field value."""
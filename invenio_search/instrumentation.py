@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Per-stage latency instrumentation of the search pipeline.
+
+Spans are recorded in a :class:`SpanRecorder` stored on the application
+context.  When ``SEARCH_INSTRUMENTATION`` is disabled no recorder is
+started and :func:`span` returns a shared no-op context manager.
+
+.. code-block:: python
+
+    with span('parse'):
+        tree = parse(query)
+"""
+
+import re
+from contextlib import contextmanager
+
+from flask import g
+
+from invenio.base.globals import cfg
+
+from .deadline import monotonic
+
+re_invalid_token_chars = re.compile(r"[^!#$%&'*+\-.^_`|~0-9A-Za-z]")
+
+
+class _NoopSpan(object):
+
+    """Context manager doing nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_noop_span = _NoopSpan()
+
+
+class SpanRecorder(object):
+
+    """Record named durations measured with a monotonic clock."""
+
+    def __init__(self):
+        """Initialize empty list of spans."""
+        self.spans = []
+
+    def add(self, name, duration):
+        """Record a span that was measured elsewhere."""
+        self.spans.append((name, duration))
+
+    @contextmanager
+    def span(self, name):
+        """Measure the duration of the block."""
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.spans.append((name, monotonic() - start))
+
+    def as_dict(self):
+        """Return total milliseconds per span name."""
+        result = {}
+        for name, duration in self.spans:
+            result[name] = result.get(name, 0) + duration * 1000
+        return result
+
+    def server_timing(self):
+        """Return value of the ``Server-Timing`` header."""
+        return ', '.join(
+            '{0};dur={1:.2f}'.format(re_invalid_token_chars.sub('_', name),
+                                     duration * 1000)
+            for name, duration in self.spans
+        )
+
+
+def start_recording(force=False):
+    """Start recording spans of the current request if enabled.
+
+    :param force: record even if ``SEARCH_INSTRUMENTATION`` is disabled
+    """
+    if force or cfg.get('SEARCH_INSTRUMENTATION'):
+        g.search_spans = SpanRecorder()
+    return get_recorder()
+
+
+def get_recorder():
+    """Return span recorder of the current request or None."""
+    return getattr(g, 'search_spans', None)
+
+
+def span(name):
+    """Return context manager recording the block as a span."""
+    recorder = getattr(g, 'search_spans', None)
+    if recorder is None:
+        return _noop_span
+    return recorder.span(name)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Bounded least-recently-used cache."""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """Thread-safe mapping keeping at most ``maxsize`` recently used items.
+
+    Example:
+
+    .. code-block:: python
+
+        >>> cache = LRUCache(maxsize=2)
+        >>> cache.get_or_set('a', lambda: 1)
+        1
+    """
+
+    def __init__(self, maxsize=1024):
+        """Initialize empty cache."""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return number of cached items."""
+        return len(self._data)
+
+    def __contains__(self, key):
+        """Check if key is cached without updating its position."""
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return cached value and mark it as recently used."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store value and evict the least recently used items."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        """Return cached value or store the one computed by ``factory``.
+
+        The factory is called outside the lock, so concurrent misses may
+        compute the same value twice.
+        """
+        marker = object()
+        value = self.get(key, marker)
+        if value is marker:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """Remove all items."""
+        with self._lock:
+            self._data.clear()
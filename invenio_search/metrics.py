@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Metrics of the search subsystems in Prometheus text exposition format.
+
+Metrics are collected when ``SEARCH_METRICS_ENABLED`` is set.  By default
+every process keeps its values in memory.  When ``SEARCH_METRICS_DIR`` is
+set, each process writes its values to its own memory mapped file in that
+directory and :func:`generate_latest` sums the values of all files, so
+that the metrics of all gunicorn workers are reported together.  When a
+process creates its own file, the values of processes which are no longer
+running are added to an aggregate file and their files are removed, so
+that the reported counters never decrease.
+
+.. code-block:: python
+
+    from invenio_search.metrics import es_request_seconds
+
+    with es_request_seconds.time():
+        es.search(...)
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+from flask import has_app_context
+
+from invenio.base.globals import cfg
+
+from .deadline import monotonic
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, float('inf'))
+
+
+def _pad(length):
+    """Return padding aligning a key of given length to 8 bytes."""
+    return (8 - (4 + length) % 8) % 8
+
+
+def _read_values(data, used):
+    """Yield (key, value, position) stored in a metrics file."""
+    position = 8
+    while position < used:
+        length = struct.unpack_from(b'i', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+        position += 4 + length + _pad(length)
+        yield key, struct.unpack_from(b'd', data, position)[0], position
+        position += 8
+
+
+@contextmanager
+def _locked(directory, operation):
+    """Lock the metrics directory with a ``fcntl.flock`` operation."""
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as lock:
+        fcntl.flock(lock.fileno(), operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def _is_running(pid):
+    """Return True if a process with given pid exists."""
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class MmapValues(object):
+
+    """Float values of one process stored in a memory mapped file.
+
+    The file starts with the number of used bytes followed by the entries
+    ``(key length, key, padding, value)``.
+    """
+
+    initial_size = 1 << 16
+
+    aggregate = 'metrics_aggregate.db'
+    """File holding the values of processes which are no longer running."""
+
+    def __init__(self, filename):
+        """Open or create the file."""
+        self.filename = filename
+        self._file = open(filename, 'a+b')
+        capacity = os.fstat(self._file.fileno()).st_size
+        if capacity == 0:
+            capacity = self.initial_size
+            self._file.truncate(capacity)
+        self._capacity = capacity
+        self._mmap = mmap.mmap(self._file.fileno(), capacity)
+        self._used = struct.unpack_from(b'i', self._mmap, 0)[0] or 8
+        self._positions = dict(
+            (key, position)
+            for key, _, position in _read_values(self._mmap, self._used)
+        )
+
+    def _init_value(self, key):
+        """Append a new entry for the key."""
+        encoded = key.encode('utf-8')
+        entry = struct.pack(
+            '=i{0}s{1}xd'.format(len(encoded), _pad(len(encoded))).encode(),
+            len(encoded), encoded, 0.0
+        )
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._mmap.close()
+            self._file.truncate(self._capacity)
+            self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+        self._mmap[self._used:self._used + len(entry)] = entry
+        self._used += len(entry)
+        # publish the entry only once it is completely written
+        struct.pack_into(b'i', self._mmap, 0, self._used)
+        self._positions[key] = self._used - 8
+
+    def add(self, key, amount):
+        """Increment value of the key."""
+        position = self._positions.get(key)
+        if position is None:
+            self._init_value(key)
+            position = self._positions[key]
+        value = struct.unpack_from(b'd', self._mmap, position)[0]
+        struct.pack_into(b'd', self._mmap, position, value + amount)
+
+    def close(self):
+        """Close the file."""
+        self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def _read_file(filename):
+        """Return values stored in a file."""
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if len(data) < 8:
+            return {}
+        used = struct.unpack_from(b'i', data, 0)[0]
+        return dict((key, value)
+                    for key, value, _ in _read_values(data, used))
+
+    @classmethod
+    def merge_dead(cls, directory):
+        """Move values of processes no longer running to the aggregate.
+
+        Removing their files would make the summed counters decrease, which
+        Prometheus takes for a counter reset.
+        """
+        with _locked(directory, fcntl.LOCK_EX):
+            aggregate = None
+            for filename in glob.glob(os.path.join(directory,
+                                                   'metrics_*.db')):
+                try:
+                    pid = int(os.path.basename(filename)[len('metrics_'):-3])
+                except ValueError:
+                    continue
+                if pid <= 0 or _is_running(pid):
+                    continue
+                if aggregate is None:
+                    aggregate = cls(os.path.join(directory, cls.aggregate))
+                for key, value in cls._read_file(filename).items():
+                    aggregate.add(key, value)
+                os.remove(filename)
+            if aggregate is not None:
+                aggregate.close()
+
+    @classmethod
+    def read_all(cls, directory):
+        """Return values of all process files in the directory summed."""
+        result = {}
+        # do not read a file being merged into the aggregate
+        with _locked(directory, fcntl.LOCK_SH):
+            for filename in glob.glob(os.path.join(directory,
+                                                   'metrics_*.db')):
+                for key, value in cls._read_file(filename).items():
+                    result[key] = result.get(key, 0.0) + value
+        return result
+
+
+class MemoryValues(object):
+
+    """Float values of one process stored in memory."""
+
+    def __init__(self):
+        """Initialize empty values."""
+        self.values = {}
+
+    def add(self, key, amount):
+        """Increment value of the key."""
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+
+class MetricsRegistry(object):
+
+    """Collection of metrics sharing one value store per process."""
+
+    def __init__(self):
+        """Initialize empty registry."""
+        self.metrics = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._store = None
+
+    def register(self, metric):
+        """Add metric to the registry."""
+        self.metrics.append(metric)
+        return metric
+
+    @staticmethod
+    def enabled():
+        """Return True if metrics should be collected."""
+        return has_app_context() and cfg.get('SEARCH_METRICS_ENABLED')
+
+    def _get_store(self):
+        """Return value store of the current process."""
+        pid = os.getpid()
+        if self._store is None or self._pid != pid:
+            directory = cfg.get('SEARCH_METRICS_DIR')
+            if directory:
+                MmapValues.merge_dead(directory)
+                self._store = MmapValues(os.path.join(
+                    directory, 'metrics_{0}.db'.format(pid)
+                ))
+            else:
+                self._store = MemoryValues()
+            self._pid = pid
+        return self._store
+
+    def add(self, key, amount):
+        """Increment value of a sample key."""
+        with self._lock:
+            self._get_store().add(key, amount)
+
+    def values(self):
+        """Return current sample values of all processes."""
+        directory = cfg.get('SEARCH_METRICS_DIR')
+        if directory:
+            return MmapValues.read_all(directory)
+        with self._lock:
+            return dict(self._get_store().values)
+
+    def generate_latest(self):
+        """Render all metrics in the text exposition format."""
+        values = self.values()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose(values))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _key(sample, labels):
+    """Return store key of a sample."""
+    return json.dumps([sample, sorted(labels.items())])
+
+
+def _format_labels(labels):
+    """Format labels of a sample."""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{0}="{1}"'.format(name, '{0}'.format(value).replace(
+            '\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels
+    ) + '}'
+
+
+def _format_value(value):
+    """Format sample value."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric(object):
+
+    """Base class of metrics."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=registry):
+        """Define metric and add it to the registry."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def _check_labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('Metric {0} expects labels {1}'.format(
+                self.name, self.labelnames))
+
+    def _samples(self, values):
+        """Yield (sample name, labels, value) of this metric."""
+        for key, value in values.items():
+            sample, labels = json.loads(key)
+            if sample == self.name or (
+                    sample.startswith(self.name + '_') and
+                    sample[len(self.name) + 1:] in self.suffixes):
+                yield sample, [tuple(label) for label in labels], value
+
+    def expose(self, values):
+        """Yield lines of the text exposition format."""
+        yield '# HELP {0} {1}'.format(self.name, self.documentation)
+        yield '# TYPE {0} {1}'.format(self.name, self.type)
+        for sample, labels, value in sorted(self._samples(values),
+                                            key=self._sort_key):
+            yield '{0}{1} {2}'.format(sample, _format_labels(labels),
+                                      _format_value(value))
+
+    @staticmethod
+    def _sort_key(sample):
+        return sample[0], sample[1]
+
+
+class Counter(Metric):
+
+    """Monotonically increasing value."""
+
+    type = 'counter'
+    suffixes = ()
+
+    def inc(self, amount=1, **labels):
+        """Increment the counter."""
+        if not self.registry.enabled():
+            return
+        self._check_labels(labels)
+        self.registry.add(_key(self.name, labels), amount)
+
+
+class Histogram(Metric):
+
+    """Distribution of observed values in cumulative buckets."""
+
+    type = 'histogram'
+    suffixes = ('bucket', 'sum', 'count')
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=registry):
+        """Define histogram buckets."""
+        super(Histogram, self).__init__(name, documentation, labelnames,
+                                        registry)
+        buckets = tuple(float(bucket) for bucket in buckets)
+        if buckets[-1] != float('inf'):
+            buckets += (float('inf'), )
+        self.buckets = buckets
+        self._keys_cache = {}
+
+    def _keys(self, labels):
+        """Return store keys of buckets, sum and count for the labels."""
+        cache_key = tuple(sorted(labels.items()))
+        keys = self._keys_cache.get(cache_key)
+        if keys is None:
+            self._check_labels(labels)
+            keys = self._keys_cache[cache_key] = (
+                [(bucket, _key(self.name + '_bucket',
+                               dict(labels, le=_format_value(bucket))))
+                 for bucket in self.buckets],
+                _key(self.name + '_sum', labels),
+                _key(self.name + '_count', labels),
+            )
+        return keys
+
+    def observe(self, value, **labels):
+        """Record an observed value."""
+        if not self.registry.enabled():
+            return
+        buckets, sum_key, count_key = self._keys(labels)
+        add = self.registry.add
+        for bucket, key in buckets:
+            # empty buckets are stored too so that all buckets are exposed
+            add(key, 1 if value <= bucket else 0)
+        add(sum_key, value)
+        add(count_key, 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds."""
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(monotonic() - start, **labels)
+
+    def _sort_key(self, sample):
+        name, labels, _ = sample
+        le = dict(labels).get('le')
+        return (
+            [label for label in labels if label[0] != 'le'],
+            self.suffixes.index(name[len(self.name) + 1:]),
+            float(le.replace('+Inf', 'inf')) if le else 0,
+        )
+
+
+def generate_latest():
+    """Render all search metrics in the text exposition format."""
+    return registry.generate_latest()
+
+
+query_parse_seconds = Histogram(
+    'search_query_parse_seconds', 'Time spent parsing search queries.')
+
+cache_requests_total = Counter(
+    'search_cache_requests_total', 'Lookups in search caches.',
+    ('cache', 'result'))
+
+es_request_seconds = Histogram(
+    'search_es_request_seconds', 'Latency of Elasticsearch search requests.')
+
+es_hits = Histogram(
+    'search_es_hits', 'Total number of hits of Elasticsearch searches.',
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000))
+
+service_answer_seconds = Histogram(
+    'search_service_answer_seconds', 'Latency of search services answers.',
+    ('service', ))
+
+service_timeouts_total = Counter(
+    'search_service_timeouts_total',
+    'Search services answers ignored because they came too late.',
+    ('service', ))
+
+user_query_log_seconds = Histogram(
+    'search_user_query_log_seconds', 'Time spent logging user queries.')
+
+slow_query_log_dropped_total = Counter(
+    'search_slow_query_log_dropped_total',
+    'Slow query records dropped because the log queue was full.')
+
+user_query_log_dropped_total = Counter(
+    'search_user_query_log_dropped_total',
+    'User queries not logged because the buffer was full.')
@@ -27,8 +27,10 @@ from flask_login import current_user
 
 from invenio.base.globals import cfg
 from invenio.ext.sqlalchemy import db
+from invenio.utils.hash import md5
 from invenio_accounts.models import User
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.schema import Index
 
 
@@ -162,9 +164,25 @@ class FieldTag(db.Model):
         return self.tag
 
 
+def urlargs_digest(urlargs):
+    """Return hexadecimal digest of query URL arguments."""
+    if not isinstance(urlargs, bytes):
+        urlargs = urlargs.encode('utf-8')
+    return md5(urlargs).hexdigest()
+
+
+def _default_digest(context):
+    """Compute digest of inserted URL arguments."""
+    return urlargs_digest(context.current_parameters['urlargs'])
+
+
 class WebQuery(db.Model):
 
-    """Represent a WebQuery record."""
+    """Represent a WebQuery record.
+
+    Queries are looked up by the digest of their URL arguments, which is
+    filled automatically on insert.
+    """
 
     __tablename__ = 'query'
     id = db.Column(db.Integer(15, unsigned=True), primary_key=True,
@@ -173,9 +191,37 @@ class WebQuery(db.Model):
     urlargs = db.Column(
         db.Text().with_variant(db.Text(100), 'mysql'),
         nullable=False)
+    digest = db.Column(db.Char(32), nullable=False, default=_default_digest)
 
+    @classmethod
+    def get_by_urlargs(cls, urlargs):
+        """Return query with given URL arguments or None."""
+        return cls.query.filter_by(digest=urlargs_digest(urlargs)).first()
 
-Index('ix_query_urlargs', WebQuery.urlargs, mysql_length=100)
+    @classmethod
+    def get_or_create(cls, urlargs):
+        """Return query with given URL arguments, adding it if needed.
+
+        When another transaction adds the same query concurrently, the
+        insert is rolled back to a savepoint and the query added by the
+        other transaction is returned.
+        """
+        webquery = cls.get_by_urlargs(urlargs)
+        if webquery is not None:
+            return webquery
+        webquery = cls(urlargs=urlargs)
+        try:
+            with db.session.begin_nested():
+                db.session.add(webquery)
+        except IntegrityError:
+            # a locking read sees the row committed by the other transaction
+            webquery = cls.query.filter_by(
+                digest=urlargs_digest(urlargs)
+            ).with_for_update(read=True).one()
+        return webquery
+
+
+Index('ix_query_digest', WebQuery.digest, unique=True)
 
 
 class UserQuery(db.Model):
@@ -198,18 +244,31 @@ class UserQuery(db.Model):
 
     @classmethod
     def log(cls, urlargs=None, id_user=None):
-        """Log."""
-        id_user = id_user if not None else current_user.get_id()
+        """Log user query.
+
+        With ``SEARCH_USER_QUERY_LOG_ASYNC`` (the default) the query is
+        buffered and written later by :mod:`invenio_search.querylog` instead
+        of during the request.
+        """
+        id_user = id_user if id_user is not None else current_user.get_id()
         urlargs = urlargs or request.query_string
-        if id_user < 0:
+        if id_user is None or id_user < 0:
+            return
+        if cfg.get('SEARCH_USER_QUERY_LOG_ASYNC', True):
+            from .querylog import get_query_logger
+            get_query_logger().push(urlargs, id_user, request.host)
             return
-        webquery = WebQuery.query.filter_by(urlargs=urlargs).first()
-        if webquery is None:
-            webquery = WebQuery(urlargs=urlargs)
-        db.session.add(cls(id_user=id_user, hostname=request.host,
-                           webquery=webquery))
+        cls.log_entry(urlargs, id_user, request.host)
         db.session.commit()
 
+    @classmethod
+    def log_entry(cls, urlargs, id_user, hostname, date=None):
+        """Add user query to the session updating previous execution."""
+        webquery = WebQuery.get_or_create(urlargs)
+        db.session.merge(cls(id_user=id_user, id_query=webquery.id,
+                             hostname=hostname,
+                             date=date or datetime.datetime.now()))
+
 
 __all__ = (
     'Field',
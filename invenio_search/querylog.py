@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Asynchronous batched logging of user queries.
+
+:meth:`UserQuery.log <invenio_search.models.UserQuery.log>` pushes entries
+to a bounded in-process buffer when ``SEARCH_USER_QUERY_LOG_ASYNC`` is set.
+A background thread writes them every
+``SEARCH_USER_QUERY_LOG_FLUSH_INTERVAL`` milliseconds or as soon as
+``SEARCH_USER_QUERY_LOG_BATCH_SIZE`` entries are waiting, using one bulk
+insert per batch.  Identifiers of :class:`~invenio_search.models.WebQuery`
+rows are cached by digest of their URL arguments.  When the buffer is full
+new entries are dropped and counted.
+"""
+
+import datetime
+import threading
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from invenio.base.globals import cfg
+from invenio.ext.sqlalchemy import db
+
+from .background import BackgroundQueue
+from .lru import LRUCache
+from .metrics import user_query_log_dropped_total
+from .models import UserQuery, WebQuery, urlargs_digest
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+class UserQueryLogger(object):
+
+    """Buffer user queries and write them in batches."""
+
+    def __init__(self, app, maxsize=10000, batch_size=100, interval=1.0,
+                 cache_size=10000):
+        """Initialize logger of the application.
+
+        :param maxsize: maximum number of buffered entries
+        :param batch_size: number of entries triggering a write
+        :param interval: maximum delay in seconds before buffered entries
+            are written
+        :param cache_size: number of cached query identifiers
+        """
+        self.app = app
+        self.query_ids = LRUCache(cache_size)
+        self.writer = BackgroundQueue(
+            self._write_batch, 'search-user-query-log', maxsize=maxsize,
+            batch_size=batch_size, interval=interval,
+            on_drop=user_query_log_dropped_total.inc, flush_at_exit=True
+        )
+
+    @property
+    def dropped(self):
+        """Return number of dropped entries."""
+        return self.writer.dropped
+
+    def push(self, urlargs, id_user, hostname, date=None):
+        """Buffer a user query; return False if it was dropped."""
+        return self.writer.put((urlargs, id_user, hostname,
+                                date or datetime.datetime.now()))
+
+    def flush(self):
+        """Wait until all buffered entries are written."""
+        self.writer.flush()
+
+    def _write_batch(self, entries):
+        try:
+            with self.app.app_context():
+                self.write(entries)
+        except Exception:
+            self.app.logger.exception('Cannot log user queries.')
+
+    def get_query_ids(self, urlargs_list):
+        """Return identifiers of queries, creating the missing ones.
+
+        New identifiers are returned in the second dictionary and should be
+        cached only once the transaction is committed.
+        """
+        ids = {}
+        missing = {}
+        for urlargs in urlargs_list:
+            digest = urlargs_digest(urlargs)
+            id_query = self.query_ids.get(digest)
+            if id_query is None:
+                missing[digest] = urlargs
+            else:
+                ids[urlargs] = id_query
+        new_ids = {}
+        if missing:
+            new_ids.update(
+                (missing[digest], id_query) for digest, id_query in
+                db.session.query(WebQuery.digest, WebQuery.id).filter(
+                    WebQuery.digest.in_(list(missing)))
+            )
+            webqueries = [WebQuery(urlargs=urlargs, digest=digest)
+                          for digest, urlargs in missing.items()
+                          if urlargs not in new_ids]
+            if webqueries:
+                db.session.add_all(webqueries)
+                db.session.flush()
+                new_ids.update((webquery.urlargs, webquery.id)
+                               for webquery in webqueries)
+        ids.update(new_ids)
+        return ids, new_ids
+
+    def write(self, entries):
+        """Write entries using one bulk insert."""
+        try:
+            ids, new_ids = self.get_query_ids(
+                set(entry[0] for entry in entries))
+            rows = {}
+            for urlargs, id_user, hostname, date in entries:
+                # a repeated query of the same user keeps the last date
+                rows[id_user, ids[urlargs]] = dict(
+                    id_user=id_user, id_query=ids[urlargs],
+                    hostname=hostname, date=date,
+                )
+            db.session.execute(UserQuery.__table__.insert(),
+                               list(rows.values()))
+            db.session.commit()
+        except IntegrityError:
+            # the user already ran some of the queries before
+            db.session.rollback()
+            for urlargs, id_user, hostname, date in entries:
+                UserQuery.log_entry(urlargs, id_user, hostname, date)
+            db.session.commit()
+            return
+        for urlargs, id_query in new_ids.items():
+            self.query_ids.set(urlargs_digest(urlargs), id_query)
+
+
+def get_query_logger():
+    """Return user query logger of the current application."""
+    app = current_app._get_current_object()
+    logger = _loggers.get(app)
+    if logger is None:
+        with _loggers_lock:
+            logger = _loggers.get(app)
+            if logger is None:
+                logger = _loggers[app] = UserQueryLogger(
+                    app,
+                    maxsize=cfg['SEARCH_USER_QUERY_LOG_BUFFER_SIZE'],
+                    batch_size=cfg['SEARCH_USER_QUERY_LOG_BATCH_SIZE'],
+                    interval=cfg[
+                        'SEARCH_USER_QUERY_LOG_FLUSH_INTERVAL'] / 1000.0,
+                    cache_size=cfg['SEARCH_USER_QUERY_LOG_CACHE_SIZE'],
+                )
+    return logger
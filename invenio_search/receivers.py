@@ -19,33 +19,96 @@
 
 """Define custom action handlers."""
 
+import logging
 import os
 
-from flask import flash, g, current_app
-from logging import Formatter, getLogger, FileHandler
+from flask import flash
+from logging import Formatter, getLogger, Handler
+from logging.handlers import WatchedFileHandler
 from six import iteritems
-from werkzeug.local import LocalProxy
+
+from .background import BackgroundQueue
+
+logger = getLogger('invenio.search')
+
+
+class QueueHandler(Handler):
+
+    """Logging handler passing records to a writer thread.
+
+    Records are written by the wrapped ``handler`` in a background thread,
+    so logging does no file I/O on the request path.  Records arriving while
+    the queue is full are dropped.
+    """
+
+    def __init__(self, handler, maxsize=10000):
+        """Initialize handler writing records with ``handler``."""
+        Handler.__init__(self)
+        self.handler = handler
+        self.writer = BackgroundQueue(self._handle, 'search-log',
+                                      maxsize=maxsize)
+
+    @property
+    def dropped(self):
+        """Return number of dropped records."""
+        return self.writer.dropped
+
+    def emit(self, record):
+        """Queue the record without blocking."""
+        self.writer.put(record)
+
+    def _handle(self, records):
+        for record in records:
+            try:
+                self.handler.handle(record)
+            except Exception:
+                self.handleError(record)
+
+    def flush(self):
+        """Wait until queued records are written."""
+        self.writer.flush()
+        self.handler.flush()
+
+    def close(self):
+        """Write queued records and close the wrapped handler."""
+        self.writer.close()
+        self.handler.close()
+        Handler.close(self)
+
+
+def setup_logger(app):
+    """Attach the search log handler to the search logger once.
+
+    The log is written to ``search.log`` in ``CFG_LOGDIR``.  All processes
+    append to the same file, so it is not rotated by them but by an external
+    tool such as ``logrotate``; the file is reopened once it has been moved.
+    Rotate it by renaming (no ``copytruncate``) to ``search.log.1``
+    (``delaycompress``, no ``dateext``), where
+    :mod:`invenio_search.analytics` finishes reading it.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, QueueHandler):
+            return logger
+    handler = WatchedFileHandler(
+        os.path.join(app.config['CFG_LOGDIR'], 'search.log'), delay=True
+    )
+    handler.setFormatter(Formatter(
+        '%(asctime)s#%(action)s#%(p)s#%(f)s#%(colls)s#%(total)s#%(duration)s',
+        datefmt='%Y%m%d%H%M%S'
+    ))
+    logger.addHandler(QueueHandler(
+        handler, maxsize=app.config.get('SEARCH_LOG_QUEUE_SIZE', 10000)
+    ))
+    logger.setLevel(logging.INFO)
+    # search records do not belong to the application log
+    logger.propagate = False
+    return logger
 
 
 def get_logger():
     """Get search logger."""
-    logger = getattr(g, 'search_logger', None)
-    if logger is None:
-        handler = FileHandler(
-            os.path.join(current_app.config['CFG_LOGDIR'], 'search.log'),
-            delay=True
-        )
-        logger = getLogger('invenio.search')
-        formatter = Formatter('{asctime}#{action}#{p}#{f}#{colls}#{total}',
-                              datefmt='%Y%m%d%H%M%S', style='{')
-
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        g.search_logger = logger
     return logger
 
-logger = LocalProxy(get_logger)
-
 
 def websearch_before_browse_handler(collection, **kwargs):
     """Flash message before browsing handler is called."""
@@ -59,10 +122,25 @@ def websearch_before_browse_handler(collection, **kwargs):
 
 
 def after_search(app, **kwargs):
-    """Log user query after search."""
+    """Log user query after search.
+
+    Durations of the search stages recorded by
+    :mod:`invenio_search.instrumentation` are logged in the ``timings``
+    field and their total in milliseconds in the ``duration`` field (empty
+    when the stages were not recorded).
+    """
+    from .instrumentation import get_recorder
+    from .metrics import user_query_log_seconds
     from .models import UserQuery
-    UserQuery.log()
-    logger.info(extra=kwargs)
+    with user_query_log_seconds.time():
+        UserQuery.log()
+    recorder = get_recorder()
+    if recorder is not None:
+        kwargs.setdefault('timings', recorder.as_dict())
+        kwargs.setdefault('duration', '{0:.1f}'.format(
+            sum(kwargs['timings'].values())))
+    kwargs.setdefault('duration', '')
+    logger.info('search', extra=kwargs)
 
 
 def after_insert_user_query():
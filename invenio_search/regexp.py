@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Analysis and cached compilation of regular expressions in queries."""
+
+import re
+from collections import namedtuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from invenio.base.globals import cfg
+
+from .errors import InvenioWebSearchRegexError
+from .lru import LRUCache
+
+_REPEATS = frozenset(
+    getattr(sre_parse, name) for name in (
+        'MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'
+    ) if hasattr(sre_parse, name)
+)
+
+LUCENE_OPERATORS = frozenset(u'<>~&@#"')
+"""Characters that are operators in Lucene but literals in Python patterns.
+
+They enable intervals (``<1-5>``), complement (``~``), intersection
+(``&``), any string (``@``), empty language (``#``) and quoted strings.
+"""
+
+try:
+    unichr_ = unichr
+except NameError:  # Python 3
+    unichr_ = chr
+
+_regex_cache = None
+
+
+class RegexInfo(namedtuple('RegexInfo', ('pattern', 'compiled', 'prefix'))):
+
+    """Result of the regular expression analysis.
+
+    :param pattern: original pattern
+    :param compiled: compiled regular expression
+    :param prefix: literal prefix shared by all matching strings when the
+        pattern is anchored at the beginning (as Lucene regular expressions
+        always are)
+    """
+
+
+def _children(argument):
+    """Yield sub-patterns contained in an operator argument."""
+    if isinstance(argument, sre_parse.SubPattern):
+        yield argument
+    elif isinstance(argument, (tuple, list)):
+        for item in argument:
+            for child in _children(item):
+                yield child
+
+
+def _check_nested_repeats(subpattern, repeated=False):
+    """Raise ValueError for unbounded repeats nested in repeats.
+
+    Patterns like ``(a+)+`` or ``(\\w+\\s?)*`` backtrack exponentially on
+    inputs which almost match.
+    """
+    for op, argument in subpattern:
+        if op in _REPEATS:
+            min_, max_, item = argument
+            unbounded = max_ == sre_parse.MAXREPEAT
+            if repeated and unbounded:
+                raise ValueError('nested quantifiers')
+            _check_nested_repeats(item, repeated or max_ > 1)
+        else:
+            for child in _children(argument):
+                _check_nested_repeats(child, repeated)
+
+
+def _literal_prefix(parsed):
+    """Return the leading literal characters of a parsed pattern.
+
+    The pattern is parsed with Python syntax, so the prefix stops at the
+    first character that could be a Lucene operator, escaped or not.
+    """
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    if state.flags & re.IGNORECASE:
+        return ''
+    prefix = []
+    for op, argument in parsed:
+        if op == sre_parse.AT and argument == sre_parse.AT_BEGINNING:
+            continue
+        if op != sre_parse.LITERAL or \
+                unichr_(argument) in LUCENE_OPERATORS:
+            break
+        prefix.append(argument)
+    return u''.join(map(unichr_, prefix))
+
+
+def _analyze(pattern):
+    """Check and compile the pattern."""
+    try:
+        parsed = sre_parse.parse(pattern)
+        _check_nested_repeats(parsed)
+        compiled = re.compile(pattern)
+    except (re.error, ValueError) as e:
+        raise InvenioWebSearchRegexError(pattern, str(e))
+    return RegexInfo(pattern, compiled, _literal_prefix(parsed))
+
+
+def analyze_regex(pattern):
+    """Return cached :class:`RegexInfo` for the pattern.
+
+    Analysed patterns are kept in a bounded LRU cache of
+    ``SEARCH_REGEX_CACHE_SIZE`` items shared by all walkers.
+
+    :raises InvenioWebSearchRegexError: if the pattern is invalid or prone to
+        catastrophic backtracking
+    """
+    global _regex_cache
+    if _regex_cache is None:
+        _regex_cache = LRUCache(cfg.get('SEARCH_REGEX_CACHE_SIZE', 1024))
+    return _regex_cache.get_or_set(pattern, lambda: _analyze(pattern))
+
+
+def compile_regex(pattern):
+    """Return cached compiled regular expression."""
+    return analyze_regex(pattern).compiled
+
+
+def regex_literal_prefix(pattern):
+    """Return the literal prefix that all strings matching pattern share.
+
+    Example: ``'^Ell.*s$'`` -> ``'Ell'`` and ``'Ellis?'`` -> ``'Elli'``.
+    """
+    return analyze_regex(pattern).prefix
@@ -21,9 +21,10 @@ WebSearch service to search in collection names
 """
 import re
 import urllib
+from invenio_search.service_index import CollectionNameIndex
 from invenio_search.services import ListLinksService
+from invenio_search.stemming import stem_vocabulary, stem_words
 from invenio.base.i18n import gettext_set_language
-from invenio.legacy.bibindex.engine_stemmer import stem
 from invenio.legacy.dbquery import get_table_update_time
 from invenio.config import \
      CFG_WEBSEARCH_COLLECTION_NAMES_SEARCH, \
@@ -41,6 +42,13 @@ class CollectionNameSearchService(ListLinksService):
     """
     Search collection names
     """
+    cache_answers = True
+
+    def can_answer(self, p, f, search_units):
+        "Return True if the query has words to look for in collection names"
+        return not f and CFG_WEBSEARCH_COLLECTION_NAMES_SEARCH >= 0 and \
+            any(unit[2] in ('', 'collection') for unit in search_units)
+
     def get_description(self, ln=CFG_SITE_LANG):
         "Return service description"
         return "Return collections of interest based on query"
@@ -50,92 +58,97 @@ class CollectionNameSearchService(ListLinksService):
         _ = gettext_set_language(ln)
         return _("Looking for a particular collection? Try:")
 
-    def answer(self, req, user_info, of, cc, colls_to_search, p, f, search_units, ln):
+    def answer(self, req, user_info, of, cc, colls_to_search, p, f,
+               search_units, ln):
         """
         Answer question given by context.
 
         Return (relevance, html_string) where relevance is integer
         from 0 to 100 indicating how relevant to the question the
-        answer is (see C{CFG_WEBSEARCH_SERVICE_MAX_SERVICE_ANSWER_RELEVANCE} for details) ,
-        and html_string being a formatted answer.
+        answer is (see C{CFG_WEBSEARCH_SERVICE_MAX_SERVICE_ANSWER_RELEVANCE}
+        for details), and html_string being a formatted answer.
         """
-        from invenio.legacy.search_engine import \
-             get_permitted_restricted_collections, \
-             get_coll_i18nname, \
-             collection_i18nname_cache, \
-             collection_restricted_p
+        from invenio.legacy.search_engine import get_coll_i18nname
+        from invenio_search.utils import get_permitted_restricted_collections
         _ = gettext_set_language(ln)
         # stem search units. remove those with field
         # TODO: search in hosted collection names too
         # TODO: ignore unattached trees
         # TODO: use synonyms
         if f or (CFG_WEBSEARCH_COLLECTION_NAMES_SEARCH < 0) or \
-               (CFG_WEBSEARCH_COLLECTION_NAMES_SEARCH == 0 and cc != CFG_SITE_NAME):
+               (CFG_WEBSEARCH_COLLECTION_NAMES_SEARCH == 0 and
+                cc != CFG_SITE_NAME):
             return (0, '')
 
-        words = [stem(unit[1], ln) for unit in search_units if unit[2] in ('', 'collection')] # Stemming
+        # Stemming
+        words = stem_words([unit[1] for unit in search_units
+                            if unit[2] in ('', 'collection')], ln)
 
         if not words:
             return (0, '')
 
-        permitted_restricted_collections = get_permitted_restricted_collections(user_info)
-        cache = self.get_data_cache()
-
-        matching_collections = {}
-        for word in words:
-            if CFG_CERN_SITE and word == 'cern':
-                # This keyword is useless here...
-                continue
-
-            colls = cache.get(word.lower(), [])
-            for coll in colls:
-                if collection_restricted_p(coll) and \
-                       not coll in permitted_restricted_collections:
-                    # Skip restricted collection user do not have access
-                    continue
-                if not matching_collections.has_key(coll):
-                    matching_collections[coll] = 0
-                matching_collections[coll] += 1
-
-
-        matching_collections_sorted = sorted(matching_collections.iteritems(), key=lambda (k, v): (v, k), reverse=True)
+        # permitted restricted collections are cached in the session
+        permitted_restricted_collections = \
+            get_permitted_restricted_collections(user_info)
+        index = self.get_data_cache()
+
+        # This keyword is useless here...
+        words_to_match = [word.lower() for word in words
+                          if not (CFG_CERN_SITE and word == 'cern')]
+        # Skip restricted collection user do not have access
+        matching_collections = index.score(
+            words_to_match,
+            allowed=index.visible(permitted_restricted_collections))
+
+        matching_collections_sorted = index.top(matching_collections,
+                                                len(matching_collections))
         if not matching_collections_sorted:
             return (0, '')
 
-        matching_collections_names = [(get_coll_i18nname(coll, ln, False), CFG_SITE_URL + '/collection/' + urllib.quote(coll, safe='') + '?ln=en') \
-                                      for coll, score in matching_collections_sorted]
+        matching_collections_names = [
+            (get_coll_i18nname(coll, ln, False),
+             CFG_SITE_URL + '/collection/' + urllib.quote(coll, safe='') +
+             '?ln=en')
+            for score, coll in matching_collections_sorted]
 
-        best_score = matching_collections_sorted[0][1]
-        best_coll_words = whitespace_re.split(matching_collections_sorted[0][0])
+        best_score = matching_collections_sorted[0][0]
+        best_coll_words = whitespace_re.split(
+            matching_collections_sorted[0][1])
 
-        relevance = min(100, max(0, (100 * float(2 * best_score) /  float(len(best_coll_words) + len(words)) - 10)))
+        relevance = min(100, max(0, (
+            100 * float(2 * best_score) /
+            float(len(best_coll_words) + len(words)) - 10)))
 
         if (('submit' in p.lower()) or (_('submit') in p.lower())) and \
-               not (('submit' in best_coll_words) or (_('submit') in best_coll_words)):
+               not (('submit' in best_coll_words) or
+                    (_('submit') in best_coll_words)):
             # User is probably looking for a submission. Decrease relevance
             relevance = max(0, relevance - 30)
 
-        return (relevance, self.display_answer_helper(matching_collections_names, ln))
+        return (relevance,
+                self.display_answer_helper(matching_collections_names, ln))
 
     def prepare_data_cache(self):
         """
         "Index" collection names
         """
         from invenio.legacy.search_engine import collection_i18nname_cache
-        cache = {}
-        words_and_coll = [(' '.join([' '.join([stem(word.lower(), ln) for word in \
-                                               whitespace_re.split(non_alphanum_chars_only_re.sub(' ', translation))]) for ln, translation in \
-                                     translations.iteritems()]), coll_name) for coll_name, translations in \
-                          collection_i18nname_cache.cache.iteritems()]
-        for words, coll in words_and_coll:
-            for word in whitespace_re.split(words):
-                if not word.strip():
-                    continue
-                if not cache.has_key(word):
-                    cache[word] = []
-                if not coll in cache[word]:
-                    cache[word].append(coll)
-        return cache
+        from invenio_collections.cache import restricted_collection_cache
+        words_and_coll = []
+        for coll_name, translations in \
+                collection_i18nname_cache.cache.iteritems():
+            words = []
+            for ln, translation in translations.iteritems():
+                translation_words = [
+                    word.lower() for word in whitespace_re.split(
+                        non_alphanum_chars_only_re.sub(' ', translation))
+                    if word.strip()]
+                stems = stem_vocabulary(translation_words, ln)
+                words.extend(stems[word] for word in translation_words)
+            words_and_coll.append((words, coll_name))
+        restricted_collection_cache.recreate_cache_if_needed()
+        return CollectionNameIndex(
+            words_and_coll, restricted=restricted_collection_cache.cache)
 
     def timestamp_verifier(self):
         """
@@ -146,4 +159,5 @@ class CollectionNameSearchService(ListLinksService):
         @return: string-formatted time '%Y-%m-%d %H:%M:%S'
         """
         return max(get_table_update_time('collectionname'),
-                   get_table_update_time('collection_collection'))
+                   get_table_update_time('collection_collection'),
+                   get_table_update_time('accROLE_accACTION_accARGUMENT'))
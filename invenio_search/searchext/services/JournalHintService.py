@@ -21,12 +21,19 @@ JournalHint service to display
 "Were you looking for a journal reference? Try: <link>"
 when the request is a journal reference
 """
+from invenio_search.cache import get_journal_reference_cache_key, \
+    service_answer_cache
+from invenio_search.metrics import cache_requests_total
+from invenio_search.service_index import JournalTitleIndex
 from invenio_search.services import SearchService
+from invenio_search.utils import get_permitted_restricted_collections_digest
+from invenio_knowledge.api import get_kb_mappings
+from invenio.base.globals import cfg
 from invenio.config import (CFG_SITE_URL,
                             CFG_SITE_LANG)
 from invenio.base.i18n import gettext_set_language
+from invenio.legacy.dbquery import get_table_update_time
 from invenio.legacy.search_engine import perform_request_search, print_record
-from invenio.legacy.webuser import collect_user_info
 from urllib import urlencode
 import re
 from cgi import escape
@@ -58,10 +65,63 @@ class JournalHintService(SearchService):
             return False
         return True
 
+    kbname = 'EJOURNALS'
+    """Knowledge base whose keys and values are journal titles."""
+
+    def can_answer(self, p, f, search_units):
+        """Return True if the query seems a journal reference."""
+        return not f and self.seems_a_journal_reference(p)
+
     def get_description(self, ln=CFG_SITE_LANG):
         """Return service description."""
         return "Give hints on how to search the journal reference"
 
+    def prepare_data_cache(self):
+        """Compile journal titles of the knowledge base."""
+        titles = []
+        for mapping in get_kb_mappings(self.kbname):
+            titles.append(mapping['key'])
+            titles.append(mapping['value'])
+        return JournalTitleIndex(titles)
+
+    def timestamp_verifier(self):
+        """Return the time at which the journal titles were last updated."""
+        return get_table_update_time('knwKBRVAL')
+
+    def search_reference(self, req, user_info, reference, cc,
+                         colls_to_search):
+        """Return records the journal reference resolves to.
+
+        Resolutions are cached for ``SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT``
+        seconds per reference, collections and permissions.  The reference is
+        used as is, since refextract relies on its punctuation.  Answers are
+        not cached, since the record they display depends on the user.
+        """
+        from invenio.refextract_api import search_from_reference
+
+        timeout = cfg.get('SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT')
+        key = get_journal_reference_cache_key(
+            reference, cc, colls_to_search,
+            get_permitted_restricted_collections_digest(user_info))
+        if timeout:
+            recids = service_answer_cache.get(key)
+            if recids is not None:
+                cache_requests_total.inc(cache='journal_reference',
+                                         result='hit')
+                return recids
+            cache_requests_total.inc(cache='journal_reference',
+                                     result='miss')
+
+        (field, pattern) = search_from_reference(reference)
+
+        recids = []
+        if field == "journal":
+            recids = list(perform_request_search(
+                req=req, p=pattern, f=field, cc=cc, c=colls_to_search))
+        if timeout:
+            service_answer_cache.set(key, recids, timeout=timeout)
+        return recids
+
     def answer(self, req, user_info, of, cc,
                colls_to_search, p, f, search_units, ln):
         """Answer question given by context.
@@ -71,27 +131,28 @@ class JournalHintService(SearchService):
         answer is (see C{CFG_WEBSEARCH_SERVICE_MAX_SERVICE_ANSWER_RELEVANCE}
         for details), and html_string being a formatted answer.
         """
-        from invenio.refextract_api import search_from_reference
-
         _ = gettext_set_language(ln)
 
         if f or not self.seems_a_journal_reference(p):
             return (0, "")
 
-        (field, pattern) = search_from_reference(p.decode('utf-8'))
-
-        if field is not "journal":
-            return (0, "")
+        reference = p.decode('utf-8')
+        titles = self.get_data_cache()
+        if len(titles) > 1:
+            # only run refextract on references to known journals, unless
+            # the knowledge base is empty
+            reference = titles.find_reference(reference)
+            if reference is None:
+                return (0, "")
 
-        recids = perform_request_search(
-            req=req, p=pattern, f=field, cc=cc, c=colls_to_search)
+        recids = self.search_reference(req, user_info, reference, cc,
+                                       colls_to_search)
 
         if not recids:
             return (0, "")
 
         if len(recids) == 1:
-            recid = recids.pop()
-            user_info = collect_user_info(req)
+            recid = recids[0]
             return (100, """\
 <p><span class="journalhint">%s</span></p>
 <table style="padding: 5px; border: 2px solid #ccc; margin: 20px"><tr><td>
@@ -30,6 +30,15 @@ class LHCBeamStatusService(SearchService):
     Display LHC Beam Status
     """
 
+    max_relevance = 70
+
+    def can_answer(self, p, f, search_units):
+        "Return True if the query asks for the beam status"
+        words = [unit[1].lower() for unit in search_units if unit[2] == ""]
+        return not f and ('vistars' in words or
+                          (('lhc' in words or 'beam' in words) and
+                           'status' in words))
+
     def get_description(self, ln=CFG_SITE_LANG):
         "Return service description"
         return "Return LHC Beam status info"
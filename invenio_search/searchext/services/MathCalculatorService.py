@@ -38,6 +38,10 @@ class MathCalculatorService(SearchService):
         "Return service description"
         return "Return evaluated math expression"
 
+    def can_answer(self, p, f, search_units):
+        "Return True if the query is a math expression"
+        return bool(p.strip()) and numerics_and_operators_re.sub("", p) == p
+
     def answer(self, req, user_info, of, cc, colls_to_search, p, f, search_units, ln):
         """
         Answer question given by context.
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Data prepared by search services.
+
+The data of a service is versioned by the time its source was last updated,
+as returned by the ``timestamp_verifier`` of the service.  The source is
+checked at most every ``SEARCH_SERVICES_DATA_CACHE_CHECK_INTERVAL`` seconds
+per process.  With ``SEARCH_SERVICES_DATA_CACHE_SHARED`` the data is also
+stored in the search cache, so that only one worker prepares each version
+and the other ones load the snapshot.
+"""
+
+import threading
+import time
+
+from flask import current_app
+
+from .deadline import monotonic
+
+LOCK_TIMEOUT = 600
+"""Number of seconds after which a worker preparing data is presumed dead."""
+
+
+class ServiceDataCache(object):
+
+    """Hold data prepared by a search service.
+
+    :param name: name of the service
+    :param cache_filler: function returning the data
+    :param timestamp_verifier: function returning the time at which the
+        source of the data was last updated
+    :param store: cache where snapshots are shared with other processes
+    :param timeout: number of seconds snapshots are kept in the store
+    :param wait: number of seconds to wait for a snapshot prepared by another
+        process when there is no data yet
+    """
+
+    def __init__(self, name, cache_filler, timestamp_verifier, store=None,
+                 timeout=None, wait=30):
+        """Initialize empty cache."""
+        self.name = name
+        self.cache_filler = cache_filler
+        self.timestamp_verifier = timestamp_verifier
+        self.store = store
+        self.timeout = timeout
+        self.wait = wait
+        self.cache = None
+        self.timestamp = None
+        self.checked = None
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        """Return key of the shared snapshot."""
+        return 'search::service_data::{0}'.format(self.name)
+
+    def is_fresh(self, interval):
+        """Return True if the source was checked less than interval ago."""
+        return self.timestamp is not None and self.checked is not None and \
+            monotonic() - self.checked < interval
+
+    def recreate_cache_if_needed(self, interval=0):
+        """Prepare data again if its source has been updated.
+
+        :param interval: minimal number of seconds between two checks of the
+            source
+        """
+        if self.is_fresh(interval):
+            return
+        if not self._lock.acquire(self.timestamp is None):
+            # another thread is checking, serve current data meanwhile
+            return
+        try:
+            if self.is_fresh(interval):
+                return
+            updated = self.timestamp_verifier()
+            self.checked = monotonic()
+            if self.timestamp is None or updated > self.timestamp:
+                self.create_cache(updated)
+        finally:
+            self._lock.release()
+
+    def create_cache(self, updated):
+        """Load or prepare data whose source was updated at given time."""
+        if self.store is None:
+            self.cache, self.timestamp = self.cache_filler(), updated
+            return
+        lock = self.key + '::lock'
+        # without any data, wait for the snapshot another worker prepares
+        deadline = monotonic() + (self.wait if self.timestamp is None else 0)
+        while True:
+            snapshot = self.store.get(self.key)
+            if snapshot is not None and snapshot[0] >= updated:
+                self.timestamp, self.cache = snapshot
+                return
+            locked = self.store.add(lock, True, timeout=LOCK_TIMEOUT)
+            if locked or monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        if not locked and self.timestamp is not None:
+            # serve current data until the next check
+            return
+        try:
+            self.cache, self.timestamp = self.cache_filler(), updated
+            self.store.set(self.key, (updated, self.cache),
+                           timeout=self.timeout)
+        finally:
+            if locked:
+                self.store.delete(lock)
+
+
+def preload_data_caches(services):
+    """Prepare data of given search services."""
+    for service in services:
+        if not service.has_data_cache():
+            continue
+        try:
+            service.get_data_cache()
+        except Exception:
+            current_app.logger.exception(
+                'Could not prepare data of search service %s.',
+                service.__class__.__name__)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Indexes of the data of search services.
+
+In :class:`TokenIndex`, each distinct value is stored once and referred to by
+its integer id; every token maps to the sorted array of ids of the values it
+appears in.  Ids are assigned in the order of the values, so that comparing
+ids compares values.
+
+:class:`TokenAutomaton` finds known phrases in a text in a single pass.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+
+import six
+from intbitset import intbitset
+
+re_word = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Return list of ``(word, offset)`` of upper-cased words in text."""
+    return [(match.group().upper(), match.start())
+            for match in re_word.finditer(text)]
+
+
+class TokenIndex(object):
+
+    """Map tokens to the values they appear in.
+
+    :param items: iterable of ``(tokens, value)`` pairs
+    """
+
+    def __init__(self, items=()):
+        """Build index of given items."""
+        items = list(items)
+        self.values = sorted(set(value for dummy, value in items))
+        ids = dict((value, id_) for id_, value in enumerate(self.values))
+        postings = defaultdict(set)
+        for tokens, value in items:
+            id_ = ids[value]
+            for token in tokens:
+                postings[token].add(id_)
+        self.postings = dict(
+            (token, self.make_postings(value_ids))
+            for token, value_ids in six.iteritems(postings)
+        )
+        self.tokens = sorted(self.postings)
+
+    def make_postings(self, ids):
+        """Return compact sequence of the ids of a token."""
+        return array('i', sorted(ids))
+
+    def __len__(self):
+        """Return number of tokens."""
+        return len(self.tokens)
+
+    def get_ids(self, values):
+        """Return ids of the indexed values among given ones."""
+        ids = intbitset()
+        for value in values:
+            i = bisect_left(self.values, value)
+            if i < len(self.values) and self.values[i] == value:
+                ids.add(i)
+        return ids
+
+    def lookup(self, token, prefix=False):
+        """Return ids of values containing the token.
+
+        :param prefix: if True, also return ids of values containing a token
+            starting with the given one
+        """
+        if not prefix:
+            return self.postings.get(token, ())
+        tokens = self.tokens
+        start = end = bisect_left(tokens, token)
+        while end < len(tokens) and tokens[end].startswith(token):
+            end += 1
+        if end - start == 1:
+            return self.postings[tokens[start]]
+        ids = set()
+        for i in six.moves.range(start, end):
+            ids.update(self.postings[tokens[i]])
+        return ids
+
+    def score(self, tokens, prefix_min_length=None, allowed=None):
+        """Return number of given tokens found per value id.
+
+        :param prefix_min_length: tokens at least that long also match tokens
+            they are a prefix of
+        :param allowed: if given, only count values whose id is in this
+            :class:`intbitset`
+        """
+        scores = Counter()
+        for token in tokens:
+            prefix = prefix_min_length is not None and \
+                len(token) >= prefix_min_length
+            ids = self.lookup(token, prefix)
+            if allowed is not None:
+                if not isinstance(ids, intbitset):
+                    ids = intbitset(list(ids))
+                ids = allowed & ids
+            scores.update(ids)
+        return scores
+
+    def top(self, scores, k):
+        """Return ``k`` best ``(score, value)`` pairs, best first.
+
+        Scores are small integers, hence ids are selected score by score from
+        the best one down instead of sorting all of them.
+        """
+        best = []
+        score = max(six.itervalues(scores)) if scores else 0
+        while score > 0 and len(best) < k:
+            ids = [id_ for id_, value in six.iteritems(scores)
+                   if value == score]
+            ids.sort(reverse=True)
+            best.extend((score, self.values[id_])
+                        for id_ in ids[:k - len(best)])
+            score -= 1
+        return best
+
+
+class CollectionNameIndex(TokenIndex):
+
+    """Index collection names, flagging restricted collections.
+
+    :param items: iterable of ``(tokens, collection)`` pairs
+    :param restricted: names of the restricted collections
+    """
+
+    def __init__(self, items=(), restricted=()):
+        """Build index of given items."""
+        super(CollectionNameIndex, self).__init__(items)
+        self.restricted = self.get_ids(restricted)
+        self.public = intbitset(six.moves.range(len(self.values))) - \
+            self.restricted
+
+    def make_postings(self, ids):
+        """Return ids of collections as :class:`intbitset`."""
+        return intbitset(ids)
+
+    def visible(self, permitted):
+        """Return ids of collections visible to a user.
+
+        :param permitted: names of the restricted collections the user is
+            authorized to view
+        """
+        return self.public | (self.get_ids(permitted) & self.restricted)
+
+
+class TokenAutomaton(object):
+
+    """Aho-Corasick automaton finding phrases in sequences of tokens.
+
+    States are numbered; ``goto[state]`` maps tokens to next states and
+    ``outputs[state]`` lists ``(length, value)`` of the phrases ending there.
+
+    :param phrases: iterable of ``(tokens, value)`` pairs
+    """
+
+    def __init__(self, phrases=()):
+        """Build automaton of given phrases."""
+        self.goto = [{}]
+        self.outputs = [()]
+        for tokens, value in phrases:
+            if not tokens:
+                continue
+            state = 0
+            for token in tokens:
+                next_state = self.goto[state].get(token)
+                if next_state is None:
+                    next_state = self.goto[state][token] = len(self.goto)
+                    self.goto.append({})
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] += ((len(tokens), value), )
+
+        # failure links, breadth first so that shorter phrases come first
+        self.fail = [0] * len(self.goto)
+        queue = deque(six.itervalues(self.goto[0]))
+        while queue:
+            state = queue.popleft()
+            for token, next_state in six.iteritems(self.goto[state]):
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and token not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.fail[next_state] = self.goto[fail].get(token, 0)
+                self.outputs[next_state] += self.outputs[fail]
+
+    def __len__(self):
+        """Return number of states."""
+        return len(self.goto)
+
+    def find(self, tokens):
+        """Yield ``(start, end, value)`` of the phrases found in tokens."""
+        goto, fail = self.goto, self.fail
+        state = 0
+        for i, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, value in self.outputs[state]:
+                yield i + 1 - length, i + 1, value
+
+
+class JournalTitleIndex(TokenAutomaton):
+
+    """Find journal references in texts.
+
+    :param titles: iterable of journal titles
+    """
+
+    def __init__(self, titles=()):
+        """Build automaton of the words of given titles."""
+        super(JournalTitleIndex, self).__init__(
+            (tuple(word for word, dummy in tokenize(title)), title)
+            for title in set(titles)
+        )
+
+    def find_reference(self, text):
+        """Return part of text starting with a journal title.
+
+        The longest title followed by a number (e.g. the volume) is chosen.
+
+        :return: ``None`` if no title is followed by a number
+        """
+        tokens = tokenize(text)
+        numbers = [i for i, (word, dummy) in enumerate(tokens)
+                   if word.isdigit()]
+        if not numbers:
+            return None
+        best = None
+        for start, end, dummy in self.find(word for word, dummy in tokens):
+            if end <= numbers[-1] and (
+                    best is None or end - start > best[1] - best[0]):
+                best = (start, end)
+        if best is None:
+            return None
+        return text[tokens[best[0]][1]:]
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Run search services concurrently.
+
+Services answer in a bounded pool of ``SEARCH_SERVICES_POOL_SIZE``
+threads.  Each service has ``SEARCH_SERVICE_TIMEOUT`` seconds to answer once
+it starts running, and all of them together ``SEARCH_SERVICES_TIMEOUT``
+seconds (:data:`DEFAULT_SERVICES_TIMEOUT` when unset) or less if the search
+deadline expires earlier; answers arriving later are ignored.
+
+Services get the user information and the request data already collected by
+the caller, and threads run them in an application context whose ``g``
+holds a copy of the values of the current request instead of a request
+context of their own.  Services still waiting for a thread when the answers
+are no longer awaited are not run; running ones cannot be interrupted and
+their answer is dropped.
+"""
+
+import os
+import threading
+from collections import deque
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+from flask import current_app, g, has_request_context
+
+from invenio.base.globals import cfg
+
+from .deadline import get_deadline, monotonic
+from .metrics import service_answer_seconds, service_timeouts_total
+
+DEFAULT_SERVICES_TIMEOUT = 2.0
+"""Seconds all services have to answer when no timeout is configured."""
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(size):
+    """Return thread pool of given size of the current process."""
+    global _pool, _pool_key
+    key = (os.getpid(), size)
+    if _pool_key != key:
+        with _pool_lock:
+            if _pool_key != key:
+                if _pool is not None and _pool_key[0] == os.getpid():
+                    # let running services finish
+                    _pool.close()
+                _pool = ThreadPool(size)
+                _pool_key = key
+    return _pool
+
+
+def _timed_answer(service, method, args):
+    """Return service answer recording its latency."""
+    with service_answer_seconds.time(service=service.__class__.__name__):
+        return getattr(service, method)(*args)
+
+
+def _answer_in_context(app, values, service, method, args, started,
+                       cancelled):
+    """Return service answer inside a new application context.
+
+    :param values: attributes of ``g`` of the request
+    :param cancelled: event set when the answer is no longer awaited
+    """
+    if cancelled.is_set():
+        return None
+    started[id(service)] = monotonic()
+    with app.app_context():
+        g.__dict__.update(values)
+        return _timed_answer(service, method, args)
+
+
+def run_services(services, args, skip=None, method='answer'):
+    """Return list of answers of services which answered in time.
+
+    :param args: positional arguments of the service ``method``
+    :param method: name of the service method returning the answer
+    :param skip: function called with the answers received so far and the
+        next service, returning True if the service need not run.  Services
+        are expected to be ordered so that all services following a skipped
+        one are skipped too.
+    """
+    size = cfg.get('SEARCH_SERVICES_POOL_SIZE')
+    answers = []
+    remaining = deque(services)
+    if not size or not has_request_context():
+        for service in remaining:
+            if skip is not None and skip(answers, service):
+                break
+            answers.append(_timed_answer(service, method, args))
+        return answers
+
+    service_timeout = cfg.get('SEARCH_SERVICE_TIMEOUT')
+    # a hung service must never block the request
+    timeout = cfg.get('SEARCH_SERVICES_TIMEOUT') or DEFAULT_SERVICES_TIMEOUT
+    end = monotonic() + timeout
+    search_deadline = get_deadline()
+    if search_deadline is not None:
+        end = min(end, monotonic() + search_deadline.remaining)
+
+    app = current_app._get_current_object()
+    values = dict(g.__dict__)
+    pool = get_pool(size)
+    started = {}
+    pending = deque()
+    cancelled = threading.Event()
+
+    def submit():
+        while remaining and len(pending) < size:
+            service = remaining.popleft()
+            if skip is not None and skip(answers, service):
+                remaining.clear()
+                break
+            pending.append((service, pool.apply_async(_answer_in_context, (
+                app, values, service, method, args, started, cancelled))))
+
+    submit()
+    try:
+        while pending:
+            service, result = pending.popleft()
+            name = service.__class__.__name__
+            while True:
+                # the service timeout counts from the moment it starts running
+                start = started.get(id(service))
+                limit = end
+                if start is not None and service_timeout:
+                    limit = min(limit, start + service_timeout)
+                wait = limit - monotonic()
+                if start is None and service_timeout:
+                    # still waiting for a free thread
+                    wait = min(wait, service_timeout)
+                try:
+                    answers.append(result.get(max(wait, 0)))
+                except TimeoutError:
+                    # wait again from the moment it started running
+                    if start is None and monotonic() < end:
+                        continue
+                    service_timeouts_total.inc(service=name)
+                    current_app.logger.warning(
+                        'Search service %s did not answer in time.', name)
+                except Exception:
+                    current_app.logger.exception(
+                        'Search service %s failed.', name)
+                break
+            submit()
+    finally:
+        # do not start services still queued behind timed out ones
+        cancelled.set()
+    return answers
@@ -20,15 +20,26 @@
 """Provide the infrastructure to load/query search services."""
 
 import re
+import threading
+
+import six
+
+from invenio.base.globals import cfg
 from invenio.config import CFG_SITE_LANG
 from invenio_knowledge.api import get_kb_mappings
-from invenio.legacy.miscutil.data_cacher import DataCacher
-from invenio.legacy.bibindex.engine_stemmer import stem
 from invenio.legacy.dbquery import get_table_update_time
 from invenio.base.i18n import gettext_set_language
 from invenio.legacy import template
 
 from . import registry
+from .cache import get_service_answer_cache_key, service_answer_cache, \
+    service_data_cache
+from .metrics import cache_requests_total
+from .service_data import ServiceDataCache
+from .service_index import TokenIndex
+from .service_pool import run_services
+from .stemming import stem_vocabulary, stem_words
+from .utils import get_permitted_restricted_collections_digest
 
 CFG_WEBSEARCH_SERVICE_MAX_SERVICE_ANSWER_RELEVANCE = 100  # from 0 to 100
 """
@@ -78,6 +89,9 @@ by a "See more collections" link.
 """
 
 
+_data_cache_lock = threading.Lock()
+
+
 # Base class
 class SearchService:
 
@@ -88,6 +102,8 @@ class SearchService:
       - Override L{prepare_data_cache} to prepare some cache needed for answers
       - Override L{timestamp_verifier} to indicate if cache must be refreshed
       - Override L{answer} to return answer (score, html_string)
+      - Override L{can_answer} to skip queries the service cannot answer
+      - Set L{max_relevance} if answers are never that relevant
 
     Services that inherits directly from this class are fully
     responsible for displaying the output. See also
@@ -96,6 +112,22 @@ class SearchService:
 
     cache = None
 
+    cache_answers = False
+    """Cache answers for ``SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT`` seconds.
+
+    Answers are cached per normalized pattern, field, collection, language
+    and permissions of the user, and expire as soon as the data prepared by
+    L{prepare_data_cache} changes.
+    """
+
+    max_relevance = CFG_WEBSEARCH_SERVICE_MAX_SERVICE_ANSWER_RELEVANCE
+    """Upper bound of the relevance of the answers of the service.
+
+    Services are run in decreasing order of this bound and are not run at all
+    when their answer could not be displayed next to the answers already
+    given.
+    """
+
     def get_description(self, ln=CFG_SITE_LANG):
         """Return service description.
 
@@ -124,6 +156,13 @@ class SearchService:
         """
         return lambda x: 0
 
+    def can_answer(self, p, f, search_units):
+        """Return False if the service has no answer for the query.
+
+        It is called before scheduling the service and must be cheap.
+        """
+        return True
+
     def answer(self, req, user_info, of, cc, colls_to_search, p, f,
                search_units, ln):
         """Answer question given by context.
@@ -137,23 +176,89 @@ class SearchService:
         """
         return (0, "")
 
+    def normalize_pattern(self, p):
+        """Return pattern used in the answer cache key."""
+        return ' '.join(p.split())
+
+    def has_data_cache(self):
+        """Return True if the service overrides L{prepare_data_cache}."""
+        return six.get_unbound_function(self.__class__.prepare_data_cache) \
+            is not six.get_unbound_function(SearchService.prepare_data_cache)
+
+    def data_version(self):
+        """Return version of the data the answers depend on.
+
+        The version of the data already held is returned without checking
+        its source, which :meth:`get_data_cache` does when answering.
+        """
+        if not self.has_data_cache():
+            return None
+        cache = self.__class__.__dict__.get('cache')
+        if cache is None or cache.timestamp is None:
+            self.get_data_cache()
+            cache = self.__class__.cache
+        return cache.timestamp
+
+    def cached_answer(self, req, user_info, of, cc, colls_to_search, p, f,
+                      search_units, ln, permissions=None):
+        """Return answer from the answer cache or compute it.
+
+        :param permissions: digest of the restricted collections the user can
+            see
+        """
+        timeout = cfg.get('SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT')
+        if not self.cache_answers or not timeout:
+            return self.answer(req, user_info, of, cc, colls_to_search, p, f,
+                               search_units, ln)
+        name = self.__class__.__name__
+        key = get_service_answer_cache_key(
+            name, self.normalize_pattern(p), f, cc, colls_to_search, ln,
+            permissions, self.data_version())
+        answer = service_answer_cache.get(key)
+        if answer is not None:
+            cache_requests_total.inc(cache='answer.' + name, result='hit')
+            return answer
+        cache_requests_total.inc(cache='answer.' + name, result='miss')
+        answer = self.answer(req, user_info, of, cc, colls_to_search, p, f,
+                             search_units, ln)
+        service_answer_cache.set(key, answer, timeout=timeout)
+        return answer
+
     def get_data_cache(self, recreate_cache_if_needed=True):
         """Return always up-to-date data from cache.
 
         The returned value depends on the what has been stored with
-        :meth:`~SearchService.prepare_data_cache`.
+        :meth:`~SearchService.prepare_data_cache`.  The source of the data is
+        checked at most every ``SEARCH_SERVICES_DATA_CACHE_CHECK_INTERVAL``
+        seconds.
 
         :param recreate_cache_if_needed: if True, force refreshing data cache.
         """
-        try:
-            self.__class__.cache.is_ok_p
-        except Exception:
-            self.__class__.cache = DataCacher(self.prepare_data_cache,
-                                              self.timestamp_verifier)
-        if recreate_cache_if_needed:
-            self.__class__.cache.recreate_cache_if_needed()
-
-        return self.__class__.cache.cache
+        cache_name = self.__class__.__name__
+        cache = self.__class__.__dict__.get('cache')
+        if cache is None:
+            with _data_cache_lock:
+                cache = self.__class__.__dict__.get('cache')
+                if cache is None:
+                    cache = ServiceDataCache(
+                        cache_name, self.prepare_data_cache,
+                        self.timestamp_verifier,
+                        store=service_data_cache if cfg.get(
+                            'SEARCH_SERVICES_DATA_CACHE_SHARED') else None,
+                        timeout=cfg.get(
+                            'SEARCH_SERVICES_DATA_CACHE_SHARED_TIMEOUT'))
+                    self.__class__.cache = cache
+        timestamp = cache.timestamp
+        if recreate_cache_if_needed or timestamp is None:
+            cache.recreate_cache_if_needed(
+                cfg.get('SEARCH_SERVICES_DATA_CACHE_CHECK_INTERVAL', 0))
+        cache_requests_total.inc(
+            cache=cache_name,
+            result='hit' if timestamp is not None and
+            timestamp == cache.timestamp else 'miss'
+        )
+
+        return cache.cache
 
 
 # List display service
@@ -216,6 +321,18 @@ class KnowledgeBaseService(ListLinksService):
     words to an answer in the form "label|url". See for eg. KB 'FAQ'.
     """
 
+    cache_answers = True
+
+    max_answers = 10
+    """Maximal number of links displayed."""
+
+    prefix_min_length = 4
+    """Query words at least that long also match longer words of keys."""
+
+    def can_answer(self, p, f, search_units):
+        """Return True if the query has words without field."""
+        return any(unit[2] == '' for unit in search_units)
+
     def get_kbname(self):
         """Return name of the knowledge base to use for answering.
 
@@ -238,35 +355,25 @@ class KnowledgeBaseService(ListLinksService):
         """
         _ = gettext_set_language(ln)
         # words = [stem(unit[1], ln) for unit in search_units if unit[2] == '']
-        words = [stem(unit[1].lower(), CFG_SITE_LANG) for unit in search_units
-                 if unit[2] == '']
-        cache = self.get_data_cache()
-
-        matching_values = {}
-        for word in words:
-            res = cache.get(word, [])
-            for keyword in res:
-                if keyword not in matching_values:
-                    matching_values[keyword] = 1
-                else:
-                    matching_values[keyword] += 1
-
-        # order matching values per score
-        matching_values_sorted = sorted(matching_values.iteritems(),
-                                        key=lambda (k, v): (v, k),
-                                        reverse=True)
-
-        if not matching_values_sorted:
+        words = stem_words([unit[1].lower() for unit in search_units
+                            if unit[2] == ''], CFG_SITE_LANG)
+        index = self.get_data_cache()
+
+        # best matching values per score
+        matching_values = index.top(
+            index.score(words, self.prefix_min_length), self.max_answers)
+
+        if not matching_values:
             return (0, '')
 
-        best_score = matching_values_sorted[0][1]
+        best_score = matching_values[0][0]
 
         # Compute relevance. How many words from query did match
         relevance = min(100, max(
             0, (100 * float(best_score) / len(
                 [word for word in words if len(word) > 3]
             )) - 10))
-        labels_and_links = [m.split("|", 1) for m in matching_values.keys()]
+        labels_and_links = [m.split("|", 1) for dummy, m in matching_values]
         translated_labels_and_links = [(_(label), url)
                                        for label, url in labels_and_links]
 
@@ -275,18 +382,16 @@ class KnowledgeBaseService(ListLinksService):
 
     def prepare_data_cache(self):
         """*Index* knowledge base and cache it."""
-        cache = {}
-        for mapping in get_kb_mappings(self.get_kbname()):
-            key = mapping['key']
-            value = mapping['value']
-            words = clean_and_split_words_and_stem(key, CFG_SITE_LANG,
-                                                   stem_p=True)
-            for word in words:
-                if word not in cache:
-                    cache[word] = []
-                if value not in cache[word]:
-                    cache[word].append(value)
-        return cache
+        keys_and_values = [
+            (clean_and_split_words_and_stem(mapping['key'], CFG_SITE_LANG,
+                                            stem_p=False), mapping['value'])
+            for mapping in get_kb_mappings(self.get_kbname())
+        ]
+        # stem every distinct word of the knowledge base once
+        stems = stem_vocabulary((word for words, dummy in keys_and_values
+                                 for word in words), CFG_SITE_LANG)
+        return TokenIndex(([stems[word] for word in words], value)
+                          for words, value in keys_and_values)
 
     def timestamp_verifier(self):
         """Return the time at which the data was last updated.
@@ -314,11 +419,41 @@ def clean_and_split_words_and_stem(string, ln=CFG_SITE_LANG, stem_p=True):
     words = re_split_words_pattern.split(alphanum_string)
     if stem_p:
         # lowering must be done after stemming
-        words = [stem(word, ln) for word in words]
+        words = stem_words(words, ln)
 
     return words
 
 
+def cannot_change_answers(answers, service):
+    """Return True if the service answer could not be displayed.
+
+    Mirror the cutoffs of :func:`get_answers` using the upper bound of the
+    relevance of the service answer, so that the displayed answers are the
+    same whether the service runs or not.
+    """
+    bound = service.max_relevance
+    relevances = sorted((answer[0] for answer in answers), reverse=True)
+    if not relevances:
+        return bound <= CFG_WEBSEARCH_SERVICE_MIN_RELEVANCE_TO_DISPLAY
+    best = relevances[0]
+    if best <= CFG_WEBSEARCH_SERVICE_MIN_RELEVANCE_TO_DISPLAY:
+        return bound <= CFG_WEBSEARCH_SERVICE_MIN_RELEVANCE_TO_DISPLAY
+    if best == CFG_WEBSEARCH_SERVICE_MAX_SERVICE_ANSWER_RELEVANCE:
+        # definitive answer
+        return True
+    if best - bound > CFG_WEBSEARCH_SERVICE_MAX_RELEVANCE_DIFFERENCE:
+        return True
+    return len(relevances) >= CFG_WEBSEARCH_SERVICE_MAX_NB_SERVICE_DISPLAY \
+        and relevances[CFG_WEBSEARCH_SERVICE_MAX_NB_SERVICE_DISPLAY - 1] > \
+        bound
+
+
+def preload_data_caches():
+    """Prepare data of all registered search services."""
+    from .service_data import preload_data_caches
+    preload_data_caches(registry.services)
+
+
 def get_answers(req, user_info, of, cc, colls_to_search, p, f, ln):
     """Return answers from all registered search services."""
     if p:
@@ -327,17 +462,24 @@ def get_answers(req, user_info, of, cc, colls_to_search, p, f, ln):
     else:
         search_units = []
 
-    def search_service_answers():
-        for search_service in registry.services:
-            yield search_service.answer(req, user_info, of, cc,
-                                        colls_to_search, p, f,
-                                        search_units, ln)
+    services = sorted(
+        (service for service in registry.services
+         if service.can_answer(p, f, search_units)),
+        key=lambda service: service.max_relevance, reverse=True
+    )
+    # also caches the permitted restricted collections for the services
+    # answering in other threads
+    permissions = get_permitted_restricted_collections_digest(user_info)
+    answers = run_services(services, (req, user_info, of, cc,
+                                      colls_to_search, p, f,
+                                      search_units, ln, permissions),
+                           skip=cannot_change_answers,
+                           method='cached_answer')
 
     nb_answers = 0
     best_relevance = None
 
-    for answer_relevance, answer_html in sorted(
-            search_service_answers(), reverse=True):
+    for answer_relevance, answer_html in sorted(answers, reverse=True):
         nb_answers += 1
         if best_relevance is None:
             best_relevance = answer_relevance
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Slow query log.
+
+Searches taking longer than ``SEARCH_SLOW_QUERY_THRESHOLD`` seconds are
+written as JSON lines to ``SEARCH_SLOW_QUERY_LOG`` together with the parsed
+query, the generated Elasticsearch DSL, the stage timings and the number of
+hits.  Records are completed with the permissions digest of the user,
+serialized and written by a background thread; when the writer falls behind
+and its queue is full, records are dropped instead of blocking the request.
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+
+from flask import current_app
+
+from invenio.base.globals import cfg
+
+from .background import BackgroundQueue
+from .instrumentation import get_recorder
+from .metrics import slow_query_log_dropped_total
+from .utils import get_permitted_restricted_collections_digest
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+class SlowQueryLog(object):
+
+    """Append JSON records to a file from a background thread.
+
+    :param app: application in whose context permissions are computed
+    """
+
+    def __init__(self, filename, maxsize=1000, app=None):
+        """Initialize log writing to the given file."""
+        self.filename = filename
+        self.app = app
+        self.writer = BackgroundQueue(
+            self._write, 'search-slow-query-log', maxsize=maxsize,
+            on_drop=slow_query_log_dropped_total.inc
+        )
+
+    @property
+    def dropped(self):
+        """Return number of dropped records."""
+        return self.writer.dropped
+
+    def write(self, record, user_info=None):
+        """Queue record without blocking; return False if it was dropped.
+
+        :param user_info: user whose permissions digest is added to the
+            record by the writer thread
+        """
+        return self.writer.put((record, user_info))
+
+    def flush(self):
+        """Wait until all queued records are written."""
+        self.writer.flush()
+
+    def get_permissions(self, user_info):
+        """Return digest of the restricted collections user can see."""
+        return get_permitted_restricted_collections_digest(user_info)
+
+    def _write(self, items):
+        context = self.app.app_context() if self.app is not None else None
+        if context is not None:
+            context.push()
+        try:
+            lines = []
+            for record, user_info in items:
+                if user_info is not None:
+                    record['permissions'] = self.get_permissions(user_info)
+                lines.append(json.dumps(record, default=repr,
+                                        sort_keys=True) + '\n')
+            with open(self.filename, 'a') as f:
+                f.writelines(lines)
+        except Exception:
+            logging.getLogger(__name__).exception(
+                'Cannot write slow query log %s', self.filename)
+        finally:
+            if context is not None:
+                context.pop()
+
+
+def get_slow_query_log():
+    """Return slow query log of the configured file."""
+    app = current_app._get_current_object()
+    filename = cfg.get('SEARCH_SLOW_QUERY_LOG') or os.path.join(
+        cfg['CFG_LOGDIR'], 'search_slow.log')
+    log = _logs.get((app, filename))
+    if log is None:
+        with _logs_lock:
+            log = _logs.setdefault((app, filename), SlowQueryLog(
+                filename, cfg.get('SEARCH_SLOW_QUERY_LOG_QUEUE_SIZE', 1000),
+                app=app
+            ))
+    return log
+
+
+def is_slow(duration):
+    """Return True if a search of given duration should be logged."""
+    threshold = cfg.get('SEARCH_SLOW_QUERY_THRESHOLD')
+    return threshold is not None and duration >= threshold
+
+
+def log_slow_query(p, query, results, collection, user_info, duration):
+    """Queue slow query record.
+
+    :param p: search pattern as typed by the user
+    :param query: :class:`~invenio_search.api.Query` instance
+    :param results: :class:`~invenio_search.api.Results` of the search
+    :param user_info: user who searched (not a proxy to the current user,
+        since the record is completed in another thread)
+    :param duration: duration of the search in seconds
+    """
+    recorder = get_recorder()
+    return get_slow_query_log().write({
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'p': p,
+        'ast': repr(query.query),
+        'dsl': results.body,
+        'collection': collection,
+        'duration': duration * 1000,
+        'timings': recorder.as_dict() if recorder is not None else {},
+        'hits': len(results),
+    }, user_info)
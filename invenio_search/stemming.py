@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Cached stemming of words.
+
+Search services stem the words of every query again and again, so stems are
+kept in a bounded LRU cache of ``SEARCH_STEM_CACHE_SIZE`` items shared by all
+of them.  The vocabulary of their data is stemmed once when it is prepared,
+without going through the cache.
+"""
+
+from invenio.base.globals import cfg
+from invenio.legacy.bibindex.engine_stemmer import stem as _stem
+
+from .lru import LRUCache
+
+_stem_cache = None
+
+
+def get_stem_cache():
+    """Return cache of stems of the current process."""
+    global _stem_cache
+    if _stem_cache is None:
+        _stem_cache = LRUCache(cfg.get('SEARCH_STEM_CACHE_SIZE', 10000))
+    return _stem_cache
+
+
+def stem(word, ln):
+    """Return cached stem of the word in given language."""
+    return get_stem_cache().get_or_set((word, ln), lambda: _stem(word, ln))
+
+
+def stem_words(words, ln):
+    """Return list of stems of the words, stemming each distinct word once."""
+    words = list(words)
+    stems = {}
+    for word in words:
+        if word not in stems:
+            stems[word] = stem(word, ln)
+    return [stems[word] for word in words]
+
+
+def stem_vocabulary(words, ln):
+    """Return dictionary of stems of the distinct words, bypassing the cache.
+
+    Stemming a whole vocabulary through the stem cache would evict the stems
+    of query words.
+    """
+    return dict((word, _stem(word, ln)) for word in set(words))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Add digest of URL arguments to query table."""
+
+from sqlalchemy import inspect
+
+from invenio.ext.sqlalchemy import db
+from invenio.legacy.dbquery import run_sql
+from invenio.utils.hash import md5
+from invenio_upgrader.api import op
+
+
+depends_on = [u'search_2015_03_03_fix_models']
+
+QUERY_REFERENCES = (
+    ('user_query', 'id_query'),
+    ('user_query_basket', 'id_query'),
+)
+"""Columns known to reference ``query.id`` without a foreign key."""
+
+
+def info():
+    """Info."""
+    return "Look up queries by digest of their URL arguments."
+
+
+def _query_references():
+    """Return ``(table, column, other key columns)`` referencing queries.
+
+    Besides :data:`QUERY_REFERENCES`, columns with a foreign key to
+    ``query.id`` in any table are included.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    references = set(ref for ref in QUERY_REFERENCES if ref[0] in tables)
+    for table in tables:
+        for foreign_key in inspector.get_foreign_keys(table):
+            if foreign_key['referred_table'] == 'query' and \
+                    foreign_key['referred_columns'] == ['id']:
+                references.update(
+                    (table, column)
+                    for column in foreign_key['constrained_columns'])
+    result = []
+    for table, column in sorted(references):
+        primary_key = inspector.get_pk_constraint(table)
+        key = [name for name in primary_key['constrained_columns']
+               if name != column]
+        result.append((table, column, key))
+    return result
+
+
+def _merge_references(table, column, key, id_query, duplicates):
+    """Point references of duplicate queries to ``id_query``.
+
+    Rows which would then share their primary key with another row are
+    deleted instead, so that no backend specific ``UPDATE IGNORE`` is
+    needed.
+    """
+    ids = [id_query] + duplicates
+    placeholders = ', '.join(['%s'] * len(ids))
+    if key:
+        columns = ', '.join(key)
+        kept = set()
+        for row in run_sql(
+                "SELECT {0}, {1} FROM {2} WHERE {0} IN ({3}) "
+                "ORDER BY {0} = %s DESC".format(
+                    column, columns, table, placeholders),
+                tuple(ids) + (id_query, )):
+            if row[1:] not in kept:
+                kept.add(row[1:])
+            elif row[0] != id_query:
+                run_sql("DELETE FROM {0} WHERE {1} = %s AND {2}".format(
+                    table, column,
+                    ' AND '.join('{0} = %s'.format(name) for name in key)),
+                    (row[0], ) + tuple(row[1:]))
+    run_sql("UPDATE {0} SET {1} = %s WHERE {1} IN ({2})".format(
+        table, column, ', '.join(['%s'] * len(duplicates))),
+        (id_query, ) + tuple(duplicates))
+
+
+def do_upgrade():
+    """Implement your upgrades here."""
+    op.add_column('query', db.Column('digest', db.Char(32), nullable=True))
+
+    # fill digests in batches
+    last_id = 0
+    while True:
+        rows = run_sql("""SELECT id, urlargs FROM query WHERE id > %s
+                          ORDER BY id LIMIT 10000""", (last_id, ))
+        if not rows:
+            break
+        for id_query, urlargs in rows:
+            run_sql("UPDATE query SET digest = %s WHERE id = %s",
+                    (md5(urlargs).hexdigest(), id_query))
+        last_id = rows[-1][0]
+
+    # merge duplicate queries into the oldest one
+    references = _query_references()
+    for digest, id_query in run_sql(
+            """SELECT digest, MIN(id) FROM query GROUP BY digest
+               HAVING COUNT(*) > 1"""):
+        duplicates = [row[0] for row in run_sql(
+            "SELECT id FROM query WHERE digest = %s AND id <> %s",
+            (digest, id_query))]
+        for table, column, key in references:
+            _merge_references(table, column, key, id_query, duplicates)
+        run_sql("DELETE FROM query WHERE id IN ({0})".format(
+            ', '.join(['%s'] * len(duplicates))), tuple(duplicates))
+
+    op.alter_column('query', 'digest', existing_type=db.Char(32),
+                    nullable=False)
+    op.create_index('ix_query_digest', 'query', ['digest'], unique=True)
+    op.drop_index('ix_query_urlargs', table_name='query')
+
+
+def estimate():
+    """Estimate running time of upgrade in seconds (optional)."""
+    total = run_sql("SELECT count(*) FROM query")
+    return int(float(total[0][0]) / 1000) + 1
+
+
+def pre_upgrade():
+    """Run pre-upgrade checks (optional)."""
+
+
+def post_upgrade():
+    """Run post-upgrade checks (optional)."""
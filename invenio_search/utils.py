@@ -20,23 +20,34 @@
 """Utility functions for search engine."""
 
 import functools
+import heapq
+from collections import Counter
+from itertools import islice
 
-import six
-
-from flask import g
+from flask import g, has_app_context, has_request_context, session
 from intbitset import intbitset
-from six import iteritems, string_types
-from werkzeug.utils import import_string
+from six import iteritems, itervalues, string_types
 
 from invenio.base.globals import cfg
+from invenio.utils.hash import md5
 from invenio_collections.cache import (
     get_collection_allchildren,
     restricted_collection_cache,
 )
 
+from .deadline import monotonic
+
+ACCESS_CONTROL_TABLES = ('accROLE%', 'accARGUMENT', 'user_accROLE')
+"""Tables whose changes may change the restricted collections users see."""
+
+_access_control_version = (None, None)
+
+_restricted_collections_version = None
+
 
 def get_most_popular_field_values(recids, tags, exclude_values=None,
-                                  count_repetitive_values=True, split_by=0):
+                                  count_repetitive_values=True, split_by=0,
+                                  limit=None):
     """Analyze RECIDS and look for TAGS and return most popular values.
 
     Optionally return the frequency with which they occur sorted according to
@@ -62,82 +73,177 @@ def get_most_popular_field_values(recids, tags, exclude_values=None,
         ... ('Ellis, J'))
         [('Ellis, N', 7), ...]
 
+    Values of many records are fetched and counted in chunks of
+    ``SEARCH_FACETS_CHUNK_SIZE`` records.
+
+    :param limit: maximal number of values to return
     :return: list of tuples containing tag and its frequency
     """
-    from invenio.legacy.bibrecord import get_fieldvalues
-
-    valuefreqdict = {}
-    # sanity check:
-    if not exclude_values:
-        exclude_values = []
     if isinstance(tags, string_types):
         tags = (tags,)
-    # find values to count:
-    vals_to_count = []
+    if isinstance(exclude_values, string_types):
+        exclude_values = (exclude_values,)
+    # count values:
+    valuefreqdict = Counter()
     displaytmp = {}
     if count_repetitive_values:
         # counting technique A: can look up many records at once: (very fast)
-        for tag in tags:
-            vals_to_count.extend(get_fieldvalues(recids, tag, sort=False,
-                                                 split_by=split_by))
+        from invenio.legacy.bibrecord import get_fieldvalues
+        chunk_size = cfg.get('SEARCH_FACETS_CHUNK_SIZE', 10000)
+        for chunk in _chunks(recids, chunk_size):
+            for tag in tags:
+                valuefreqdict.update(get_fieldvalues(chunk, tag, sort=False,
+                                                     split_by=split_by))
     else:
-        # counting technique B: must count record-by-record: (slow)
-        for recid in recids:
-            vals_in_rec = []
+        # counting technique B: count each value once per record, even
+        # across various tags, so values of many records are fetched at once
+        # and unified by (recid, lowercased value) pairs:
+        chunk_size = cfg.get('SEARCH_FACETS_CHUNK_SIZE', 10000)
+        for chunk in _chunks(recids, chunk_size):
+            pairs = set()
             for tag in tags:
-                for val in get_fieldvalues(recid, tag, False):
-                    vals_in_rec.append(val)
-            # do not count repetitive values within this record
-            # (even across various tags, so need to unify again):
-            dtmp = {}
-            for val in vals_in_rec:
-                dtmp[val.lower()] = 1
-                displaytmp[val.lower()] = val
-            vals_in_rec = dtmp.keys()
-            vals_to_count.extend(vals_in_rec)
+                for recid, val in get_fieldvalues_by_record(chunk, tag):
+                    lowered = val.lower()
+                    displaytmp[lowered] = val
+                    pairs.add((recid, lowered))
+            valuefreqdict.update(val for dummy, val in pairs)
     # are we to exclude some of found values?
-    for val in vals_to_count:
-        if val not in exclude_values:
-            if val in valuefreqdict:
-                valuefreqdict[val] += 1
-            else:
-                valuefreqdict[val] = 1
-    # sort by descending frequency of values:
-    f = []   # frequencies
-    n = []   # original names
-    ln = []  # lowercased names
-    # build lists within one iteration
-    for (val, freq) in iteritems(valuefreqdict):
-        f.append(-1 * freq)
-        if val in displaytmp:
-            n.append(displaytmp[val])
-        else:
-            n.append(val)
-        ln.append(val.lower())
-    # sort by frequency (desc) and then by lowercased name.
+    for val in exclude_values or ():
+        valuefreqdict.pop(val, None)
+    return most_common_values(valuefreqdict, limit, displaytmp)
+
+
+def get_fieldvalues_by_record(recids, tag):
+    """Return ``(recid, value)`` pairs of tag in given records.
+
+    Unlike ``get_fieldvalues``, the record of each value is kept, and values
+    of all records are fetched with a single query.
+
+    :param recids: list of record identifiers
+    :param tag: MARC tag, possibly containing ``%`` wildcards after its
+        first two digits, which select the tables to query
+    :return: list of ``(recid, value)`` tuples in no particular order
+    """
+    from invenio.legacy.dbquery import run_sql
+
+    recids = list(recids)
+    if not recids:
+        return []
+    if tag == '001___':
+        return [(recid, str(recid)) for recid in recids]
+    # the digits are part of the table names
     try:
-        import numpy
-        indices = numpy.lexsort([ln, f])
-    except ImportError:
-        def _cmp(a, b):
-            if f[a] == f[b]:
-                return ln[a] - ln[b]
-            else:
-                return f[a] - f[b]
-        indices = sorted(
-            range(min(len(ln), len(f))),
-            cmp=_cmp
-        )
-    return [(n[i], -1 * f[i]) for i in indices]
+        digits = int(tag[0:2])
+    except ValueError:
+        return []
+    if not 0 <= digits <= 99:
+        return []
+    bx = 'bib{0:02d}x'.format(digits)
+    bibx = 'bibrec_' + bx
+    query = 'SELECT bibx.id_bibrec, bx.value FROM {0} AS bx, {1} AS bibx ' \
+        'WHERE bibx.id_bibrec IN ({2}) AND bx.id=bibx.id_bibxxx ' \
+        'AND bx.tag LIKE %s'.format(bx, bibx, ','.join(['%s'] * len(recids)))
+    return [(recid, value) for recid, value in
+            run_sql(query, tuple(recids) + (tag, ))]
+
+
+def _chunks(iterable, size):
+    """Yield lists of at most size consecutive items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def most_common_values(counts, limit=None, names=None):
+    """Return most common values with their frequency.
+
+    Values are sorted by descending frequency and then by lowercased name.
+    Only values at least as frequent as the ``limit``-th one are selected,
+    with a heap, instead of sorting all of them.
+
+    :param counts: mapping of values to their frequency
+    :param limit: maximal number of values to return
+    :param names: mapping of values to the names to return instead
+    :return: list of ``(name, frequency)``
+    """
+    def order(item):
+        return -item[1], item[0].lower()
+
+    items = iteritems(counts)
+    if limit is not None and 0 < limit < len(counts):
+        threshold = heapq.nlargest(limit, itervalues(counts))[-1]
+        best = heapq.nsmallest(
+            limit, (item for item in items if item[1] >= threshold),
+            key=order)
+    else:
+        best = sorted(items, key=order)[:limit]
+    names = names or {}
+    return [(names.get(val, val), freq) for val, freq in best]
+
+
+def get_access_control_version():
+    """Return time at which access control tables were last updated.
+
+    The tables are checked at most every
+    ``SEARCH_ACCESS_CONTROL_CHECK_INTERVAL`` seconds per process.
+    """
+    global _access_control_version
+    checked, version = _access_control_version
+    now = monotonic()
+    interval = cfg.get('SEARCH_ACCESS_CONTROL_CHECK_INTERVAL', 0)
+    if checked is None or now - checked >= interval:
+        from invenio.legacy.dbquery import get_table_update_time
+        version = max(get_table_update_time(table)
+                      for table in ACCESS_CONTROL_TABLES)
+        _access_control_version = (now, version)
+    return version
 
 
 def get_permitted_restricted_collections(user_info,
                                          recreate_cache_if_needed=True):
-    """Return a list of restricted collection with user is authorization."""
-    from invenio.modules.access.engine import acc_authorize_action
+    """Return a list of restricted collection with user is authorization.
 
-    if recreate_cache_if_needed:
+    The list of the user of the current session is cached in the session
+    until the access control tables change, and in ``g`` so that search
+    services answering in other threads find it too.
+
+    :param recreate_cache_if_needed: if True, refresh the restricted
+        collection cache when the access control tables changed.
+    """
+    global _restricted_collections_version
+    version = get_access_control_version()
+    if recreate_cache_if_needed and \
+            version != _restricted_collections_version:
         restricted_collection_cache.recreate_cache_if_needed()
+        _restricted_collections_version = version
+
+    uid = user_info.get('uid')
+    cacheable = uid is not None and has_app_context()
+    if cacheable:
+        cached = getattr(g, 'search_permitted_restricted_collections', None)
+        if cached is None and has_request_context():
+            cached = session.get('search_permitted_restricted_collections')
+        if cached is not None and cached['uid'] == uid and \
+                cached['version'] == version:
+            g.search_permitted_restricted_collections = cached
+            return cached['collections']
+
+    ret = _get_permitted_restricted_collections(user_info)
+    if cacheable:
+        cached = dict(uid=uid, version=version, collections=ret)
+        g.search_permitted_restricted_collections = cached
+        if has_request_context():
+            session['search_permitted_restricted_collections'] = cached
+    return ret
+
+
+def _get_permitted_restricted_collections(user_info):
+    """Return restricted collections user is authorized to view."""
+    from invenio.modules.access.engine import acc_authorize_action
+
     ret = []
 
     auths = acc_authorize_action(
@@ -153,6 +259,16 @@ def get_permitted_restricted_collections(user_info,
     return ret
 
 
+def get_permitted_restricted_collections_digest(user_info):
+    """Return digest identifying the restricted collections user can see.
+
+    Users with the same permissions share the digest, so it can be used in
+    cache keys and logs instead of the user identity.
+    """
+    collections = sorted(get_permitted_restricted_collections(user_info))
+    return md5(repr(collections)).hexdigest()
+
+
 def g_memoise(method=None, key=None):
     """Memoise method results on application context."""
     if method is None:
@@ -170,39 +286,25 @@ def g_memoise(method=None, key=None):
     return decorator
 
 
-@g_memoise
 def query_enhancers():
-    """Return list of query enhancers."""
-    functions = []
-    for enhancer in cfg['SEARCH_QUERY_ENHANCERS']:
-        if isinstance(enhancer, six.string_types):
-            enhancer = import_string(enhancer)
-            functions.append(enhancer)
-    return functions
+    """Return pipeline of query enhancers shared by all requests."""
+    from .ext import get_state
+    return get_state().query_enhancers
 
 
-@g_memoise
 def parser():
     """Return search query parser."""
-    query_parser = cfg['SEARCH_QUERY_PARSER']
-    if isinstance(query_parser, six.string_types):
-        query_parser = import_string(query_parser)
-    return query_parser
+    from .ext import get_state
+    return get_state().parser
 
 
-@g_memoise
 def query_walkers():
-    """Return query walker instances."""
-    return [
-        import_string(walker)() if isinstance(walker, six.string_types)
-        else walker() for walker in cfg['SEARCH_QUERY_WALKERS']
-    ]
+    """Return query walker instances shared by all requests."""
+    from .ext import get_state
+    return get_state().query_walkers
 
 
-@g_memoise
 def search_walkers():
-    """Return in search walker instances."""
-    return [
-        import_string(walker)() if isinstance(walker, six.string_types)
-        else walker() for walker in cfg['SEARCH_WALKERS']
-    ]
+    """Return search walker instances shared by all requests."""
+    from .ext import get_state
+    return get_state().search_walkers
@@ -64,8 +64,14 @@ from invenio.utils.pagination import Pagination
 from werkzeug.http import http_date
 from werkzeug.local import LocalProxy
 
+from .. import signals, slowlog
 from ..api import Query
+from ..deadline import monotonic
+from ..errors import InvenioWebSearchQueryCostError, \
+    InvenioWebSearchRegexError
 from ..forms import EasySearchForm
+from ..instrumentation import span, start_recording
+from ..metrics import CONTENT_TYPE_LATEST, generate_latest
 
 blueprint = Blueprint('search', __name__, url_prefix="",
                       template_folder='../templates',
@@ -76,6 +82,13 @@ blueprint = Blueprint('search', __name__, url_prefix="",
 default_breadcrumb_root(blueprint, '.')
 
 
+@blueprint.record_once
+def setup_search(state):
+    """Build search objects when the blueprint is registered."""
+    from ..ext import setup_app
+    setup_app(state.app)
+
+
 def _collection_of():
     """Get output format from user settings."""
     of = current_user['settings'].get('of')
@@ -198,12 +211,26 @@ def search(collection, p, of, ot, so, sf, sp, rm, rg, jrec):
         del args['f']
         return redirect(url_for('.search', **args))
 
+    start = monotonic()
+    log_slow = cfg.get('SEARCH_SLOW_QUERY_THRESHOLD') is not None
+    recorder = start_recording(force=log_slow)
+
     # fix for queries like `/search?p=+ellis`
     p = p.strip().encode('utf-8')
 
     collection_breadcrumbs(collection)
 
-    response = Query(p).search(collection=collection.name)
+    query = Query(p)
+    try:
+        query.check_cost()
+        response = query.search(collection=collection.name,
+                                wl=request.values.get('wl', type=int))
+    except InvenioWebSearchQueryCostError:
+        current_app.logger.info('Rejected expensive query: %s', p)
+        abort(400)
+    except InvenioWebSearchRegexError as e:
+        current_app.logger.info('Rejected regular expression: %s', e)
+        abort(400)
     response.body.update({
         'size': int(rg),
         'from': jrec-1,
@@ -231,12 +258,20 @@ def search(collection, p, of, ot, so, sf, sp, rm, rg, jrec):
         # lists
         filtered_facets = FacetsVisitor.jsonable(filtered_facets)
 
-    if len(response) and jrec > len(response):
+    total = len(response)
+    if total and jrec > total:
         args = request.args.copy()
         args['jrec'] = 1
         return redirect(url_for('.search', **args))
 
-    pagination = Pagination((jrec-1) // rg + 1, rg, len(response))
+    pagination = Pagination((jrec-1) // rg + 1, rg, total)
+
+    if response.partial:
+        flash(_('The search took too long to complete. '
+                'Only partial results are displayed.'), 'warning')
+    if response.wildcards_truncated:
+        flash(_('Some wildcard terms matched too many words. '
+                'Only the most frequent ones were searched.'), 'info')
 
     ctx = dict(
         facets={},  # facets.get_facets_config(collection, qid),
@@ -253,7 +288,21 @@ def search(collection, p, of, ot, so, sf, sp, rm, rg, jrec):
     # TODO add search services
     # TODO add external collection search
 
-    return response_formated_records(response.records(), of, **ctx)
+    records = response.records()
+    with span('format'):
+        output = make_response(response_formated_records(records, of, **ctx))
+    if recorder is not None and cfg.get('SEARCH_INSTRUMENTATION'):
+        output.headers['Server-Timing'] = recorder.server_timing()
+    signals.after_search.send(current_app._get_current_object(),
+                              action='search', p=p, f='',
+                              colls=collection.name, total=total)
+    if log_slow:
+        duration = monotonic() - start
+        if slowlog.is_slow(duration):
+            slowlog.log_slow_query(p, query, response, collection.name,
+                                   current_user._get_current_object(),
+                                   duration)
+    return output
 
 
 @blueprint.route('/facet/<name>/<qid>', methods=['GET', 'POST'])
@@ -302,6 +351,18 @@ def dispatch():
     return redirect(request.referrer)
 
 
+@blueprint.route('/search/metrics')
+def metrics():
+    """Expose search metrics in Prometheus text format to administrators."""
+    if not cfg.get('SEARCH_METRICS_ENABLED'):
+        abort(404)
+    if not current_user.is_super_admin:
+        abort(401 if current_user.is_guest else 403)
+    response = make_response(generate_latest())
+    response.headers['Content-Type'] = CONTENT_TYPE_LATEST
+    return response
+
+
 @blueprint.route('/opensearchdescription')
 def opensearchdescription():
     """Render OpenSearch description file."""
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Implement AST visitors estimating and reducing the cost of a query."""
+
+import math
+
+from invenio.base.globals import cfg
+from invenio_query_parser.ast import (
+    AndOp, KeywordOp, OrOp,
+    NotOp, Keyword, Value,
+    SingleQuotedValue,
+    DoubleQuotedValue,
+    RegexValue, RangeOp,
+    ValueQuery, EmptyQuery,
+    GreaterOp, GreaterEqualOp,
+    LowerOp, LowerEqualOp
+)
+from invenio_query_parser.visitor import make_visitor
+
+from ..regexp import regex_literal_prefix
+from .elasticsearch import WILDCARDS, ElasticSearchDSL
+
+
+def has_leading_wildcard(value):
+    """Return True if value starts with a wildcard character."""
+    return value.startswith(WILDCARDS)
+
+
+def has_wildcard(value):
+    """Return True if value contains a wildcard character."""
+    return any(wildcard in value for wildcard in WILDCARDS)
+
+
+class QueryCost(object):
+
+    """Implement visitor to estimate the cost of a query.
+
+    The cost is the sum of the weights defined in
+    ``SEARCH_QUERY_COST_WEIGHTS`` for every node of the query tree, where the
+    cost of each searched value is multiplied by the number of fields it is
+    fanned out to by ``SEARCH_ELASTIC_KEYWORD_MAPPING``.
+    """
+
+    visitor = make_visitor()
+
+    def __init__(self, weights=None, map_keyword_to_fields=None):
+        """Initialize cost weights and keyword to fields mapping."""
+        self.weights = weights or cfg['SEARCH_QUERY_COST_WEIGHTS']
+        self.map_keyword_to_fields = (
+            map_keyword_to_fields or ElasticSearchDSL().map_keyword_to_fields
+        )
+
+    def _value(self, cost, mode):
+        def _f(nb_fields):
+            return cost * nb_fields
+        _f.__search_mode__ = mode
+        return _f
+
+    def _range(self, left, right):
+        cost = self.weights['range']
+        try:
+            width = abs(float(right) - float(left))
+        except (TypeError, ValueError):
+            return self._value(cost, 'a')
+        return self._value(cost * (1 + math.log10(1 + width)), 'a')
+
+    # pylint: disable=W0613,E0102
+
+    @visitor(AndOp)
+    def visit(self, node, left, right):
+        return self.weights['node'] + left + right
+
+    @visitor(OrOp)
+    def visit(self, node, left, right):
+        return self.weights['node'] + left + right
+
+    @visitor(NotOp)
+    def visit(self, node, op):
+        return self.weights['node'] + op
+
+    @visitor(KeywordOp)
+    def visit(self, node, left, right):
+        if callable(right):
+            fields = self.map_keyword_to_fields(
+                left, getattr(right, '__search_mode__', 'a')
+            )
+            return self.weights['node'] + right(len(fields))
+        # second level operation
+        return self.weights['node'] + right
+
+    @visitor(ValueQuery)
+    def visit(self, node, op):
+        return self.weights['node'] + op(1)
+
+    @visitor(Keyword)
+    def visit(self, node):
+        return node.value
+
+    @visitor(Value)
+    def visit(self, node):
+        cost = self.weights['term']
+        if has_leading_wildcard(node.value):
+            cost += self.weights['leading_wildcard']
+        elif has_wildcard(node.value):
+            cost += self.weights['wildcard']
+        return self._value(cost, 'a')
+
+    @visitor(SingleQuotedValue)
+    def visit(self, node):
+        return self._value(self.weights['phrase'], 'p')
+
+    @visitor(DoubleQuotedValue)
+    def visit(self, node):
+        return self._value(self.weights['term'], 'e')
+
+    @visitor(RegexValue)
+    def visit(self, node):
+        cost = self.weights['regex']
+        if not regex_literal_prefix(node.value):
+            cost += self.weights['leading_wildcard']
+        # searched in the same fields as ElasticSearchDSL does
+        return self._value(cost, 'a')
+
+    @visitor(RangeOp)
+    def visit(self, node, left, right):
+        return self._range(node.left.value, node.right.value)
+
+    @visitor(EmptyQuery)
+    def visit(self, node):
+        return self.weights['node']
+
+    @visitor(GreaterOp)
+    def visit(self, node, value_fn):
+        return self._value(self.weights['open_range'], 'a')
+
+    @visitor(LowerOp)
+    def visit(self, node, value_fn):
+        return self._value(self.weights['open_range'], 'a')
+
+    @visitor(GreaterEqualOp)
+    def visit(self, node, value_fn):
+        return self._value(self.weights['open_range'], 'a')
+
+    @visitor(LowerEqualOp)
+    def visit(self, node, value_fn):
+        return self._value(self.weights['open_range'], 'a')
+
+    # pylint: enable=W0612,E0102
+
+
+class QueryDowngrade(object):
+
+    """Implement visitor replacing expensive values by cheaper ones.
+
+    * leading wildcards are removed (``*ellis`` -> ``ellis``),
+    * regular expressions with a literal prefix are replaced by a prefix
+      search (``/^Ell.*s$/`` -> ``Ell*``).
+    """
+
+    visitor = make_visitor()
+
+    # pylint: disable=W0613,E0102
+
+    @visitor(AndOp)
+    def visit(self, node, left, right):
+        return AndOp(left, right)
+
+    @visitor(OrOp)
+    def visit(self, node, left, right):
+        return OrOp(left, right)
+
+    @visitor(NotOp)
+    def visit(self, node, op):
+        return NotOp(op)
+
+    @visitor(KeywordOp)
+    def visit(self, node, left, right):
+        return KeywordOp(left, right)
+
+    @visitor(ValueQuery)
+    def visit(self, node, op):
+        return ValueQuery(op)
+
+    @visitor(Keyword)
+    def visit(self, node):
+        return node
+
+    @visitor(Value)
+    def visit(self, node):
+        value = node.value.lstrip(''.join(WILDCARDS))
+        return Value(value) if value else node
+
+    @visitor(SingleQuotedValue)
+    def visit(self, node):
+        return node
+
+    @visitor(DoubleQuotedValue)
+    def visit(self, node):
+        return node
+
+    @visitor(RegexValue)
+    def visit(self, node):
+        prefix = regex_literal_prefix(node.value)
+        return Value(prefix + '*') if prefix else node
+
+    @visitor(RangeOp)
+    def visit(self, node, left, right):
+        return RangeOp(left, right)
+
+    @visitor(EmptyQuery)
+    def visit(self, node):
+        return node
+
+    @visitor(GreaterOp)
+    def visit(self, node, op):
+        return GreaterOp(op)
+
+    @visitor(LowerOp)
+    def visit(self, node, op):
+        return LowerOp(op)
+
+    @visitor(GreaterEqualOp)
+    def visit(self, node, op):
+        return GreaterEqualOp(op)
+
+    @visitor(LowerEqualOp)
+    def visit(self, node, op):
+        return LowerEqualOp(op)
+
+    # pylint: enable=W0612,E0102
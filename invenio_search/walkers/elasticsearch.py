@@ -19,6 +19,8 @@
 
 """Implement AST convertor to Elastic Search DSL."""
 
+from flask import g, has_app_context
+
 from invenio.base.globals import cfg
 from invenio_query_parser.ast import (
     AndOp, KeywordOp, OrOp,
@@ -33,6 +35,79 @@ from invenio_query_parser.ast import (
 
 from invenio_query_parser.visitor import make_visitor
 
+from six import iteritems
+
+from ..regexp import analyze_regex
+
+WILDCARDS = ('*', '%')
+
+SEARCH_MODES = ('a', 'p', 'e')
+"""Search modes of values: any word, phrase and exact value."""
+
+GLOBAL_FIELDS = ('global_fulltext', )
+
+
+class KeywordMapping(object):
+
+    """Immutable lookup table from (keyword, mode) to a tuple of fields.
+
+    The table is built once from ``SEARCH_ELASTIC_KEYWORD_MAPPING`` and
+    validated as a whole, so a keyword mapped per mode must define all
+    :data:`SEARCH_MODES`.
+
+    :raises RuntimeError: if a mode is missing in the mapping
+    """
+
+    __slots__ = ('mapping', '_table')
+
+    def __init__(self, mapping):
+        """Build the lookup table."""
+        table = {}
+        for keyword, fields in iteritems(mapping or {}):
+            if isinstance(fields, dict):
+                for mode in SEARCH_MODES:
+                    if mode not in fields:
+                        raise RuntimeError(
+                            'Not defined mapping for keyword "{keyword}" and '
+                            'mode "{mode}"'.format(keyword=keyword, mode=mode)
+                        )
+                for mode, mode_fields in iteritems(fields):
+                    if mode_fields:
+                        table[(keyword, mode)] = tuple(mode_fields)
+            elif fields:
+                table[(keyword, None)] = tuple(fields)
+        self.mapping = mapping
+        self._table = table
+
+    def __call__(self, keyword, mode='a'):
+        """Return tuple of fields for the keyword in given mode."""
+        fields = self._table.get((keyword, mode))
+        if fields is None:
+            fields = self._table.get((keyword, None))
+            if fields is None:
+                return (str(keyword), )
+        return fields
+
+
+def wildcard_query(field, value, limit=0):
+    """Return prefix or wildcard query limited to ``limit`` expanded terms.
+
+    Prefix and wildcard queries are not analyzed, so the pattern is
+    lowercased like the terms of the fields searched in mode ``'a'``.
+
+    :param limit: maximum number of terms the pattern is expanded to
+        (``0`` means no limit)
+    """
+    pattern = value.replace('%', '*').lower()
+    options = {}
+    if limit:
+        options['rewrite'] = 'top_terms_{0}'.format(limit)
+    if '*' not in pattern.rstrip('*') and '?' not in pattern:
+        options['value'] = pattern.rstrip('*')
+        return {'prefix': {field: options}}
+    options['value'] = pattern
+    return {'wildcard': {field: options}}
+
 
 class ElasticSearchDSL(object):
 
@@ -43,28 +118,40 @@ class ElasticSearchDSL(object):
     # pylint: disable=W0613,E0102
 
     def __init__(self):
-        """Provide a dictinary mapping invenio keywords
-        to elasticsearch fields as a list
+        """Use the keyword to fields table shared by the application.
+
+        The table maps invenio keywords to elasticsearch fields,
         eg. {"author": ["author.last_name, author.first_name"]}
         """
-        self.keyword_dict = cfg['SEARCH_ELASTIC_KEYWORD_MAPPING']
+        from ..ext import get_state
+        self.keyword_fields = get_state().keyword_mapping
 
-    def map_keyword_to_fields(self, keyword, mode='a'):
-        """Convert keyword to keyword list for searches
-           Map keyword to elasticsearch fields if needed
+    @property
+    def keyword_dict(self):
+        """Return mapping of invenio keywords to elasticsearch fields."""
+        return self.keyword_fields.mapping
+
+    @keyword_dict.setter
+    def keyword_dict(self, value):
+        """Use a custom mapping of keywords for this instance."""
+        self.keyword_fields = KeywordMapping(value)
+
+    @property
+    def wildcard_limit(self):
+        """Return maximum number of terms a wildcard can expand to.
+
+        The limit given to :meth:`invenio_search.api.Query.search` takes
+        precedence over ``CFG_WEBSEARCH_WILDCARD_LIMIT``.
         """
-        if self.keyword_dict:
-            res = self.keyword_dict.get(keyword)
-            if isinstance(res, dict):
-                if mode in res:
-                    res = res[mode]
-                else:
-                    raise RuntimeError(
-                        'Not defined mapping for keyword "{keyword}" and '
-                        'mode "{mode}"'.format(keyword=keyword, mode=mode)
-                    )
-            return res if res else [str(keyword)]
-        return [str(keyword)]
+        if has_app_context():
+            limit = getattr(g, 'search_wildcard_limit', None)
+            if limit is not None:
+                return limit
+        return cfg.get('CFG_WEBSEARCH_WILDCARD_LIMIT', 0)
+
+    def map_keyword_to_fields(self, keyword, mode='a'):
+        """Map keyword to tuple of elasticsearch fields."""
+        return self.keyword_fields(keyword, mode)
 
     @visitor(AndOp)
     def visit(self, node, left, right):
@@ -89,7 +176,7 @@ class ElasticSearchDSL(object):
 
     @visitor(ValueQuery)
     def visit(self, node, op):
-        return op(['global_fulltext'])
+        return op(GLOBAL_FIELDS)
 
     @visitor(Keyword)
     def visit(self, node):
@@ -97,11 +184,24 @@ class ElasticSearchDSL(object):
 
     @visitor(Value)
     def visit(self, node):
+        if any(wildcard in node.value for wildcard in WILDCARDS):
+            limit = self.wildcard_limit
+
+            def _f(keyword):
+                if len(keyword) > 1:
+                    return {"bool": {"should": [
+                        wildcard_query(k, node.value, limit)
+                        for k in keyword
+                    ]}}
+                return wildcard_query(keyword[0], node.value, limit)
+            _f.__search_mode__ = 'a'
+            return _f
+
         def _f(keyword):
             return {
                 'multi_match': {
                     'query': node.value,
-                    'fields': keyword
+                    'fields': list(keyword)
                 }
             }
         _f.__search_mode__ = 'a'
@@ -114,7 +214,7 @@ class ElasticSearchDSL(object):
                 'multi_match': {
                     'query': node.value,
                     'type': 'phrase',
-                    'fields': keyword
+                    'fields': list(keyword)
                 }
             }
         _f.__search_mode__ = 'p'
@@ -134,13 +234,21 @@ class ElasticSearchDSL(object):
 
     @visitor(RegexValue)
     def visit(self, node):
+        # reject unsafe patterns and narrow the search by the literal prefix
+        prefix = analyze_regex(node.value).prefix
+
+        def _regexp(k):
+            query = {'regexp': {k: node.value}}
+            if prefix:
+                return {'bool': {'must': [{'prefix': {k: prefix}}, query]}}
+            return query
+
         def _f(keyword):
             if len(keyword) > 1:
                 res = {"bool": {"should": []}}
-                res["bool"]["should"] = [{'regexp': {k: node.value}}
-                                         for k in keyword]
+                res["bool"]["should"] = [_regexp(k) for k in keyword]
             elif keyword[0] != "_all":
-                res = {'regexp': {keyword[0]: node.value}}
+                res = _regexp(keyword[0])
             else:
                 raise RuntimeError("Not supported regex search for all fields")
             return res
@@ -150,9 +258,9 @@ class ElasticSearchDSL(object):
     def visit(self, node, left, right):
         condition = {}
         if left:
-            condition['gte'] = left(None)["multi_match"]["query"]
+            condition['gte'] = node.left.value
         if right:
-            condition['lte'] = right(None)["multi_match"]["query"]
+            condition['lte'] = node.right.value
 
         def _f(keyword):
             if len(keyword) > 1:
@@ -184,21 +292,21 @@ class ElasticSearchDSL(object):
 
     @visitor(GreaterOp)
     def visit(self, node, value_fn):
-        condition = {"gt": value_fn(None)["multi_match"]["query"]}
+        condition = {"gt": node.op.value}
         return self._operators(node, condition)
 
     @visitor(LowerOp)
     def visit(self, node, value_fn):
-        condition = {"lt": value_fn(None)["multi_match"]["query"]}
+        condition = {"lt": node.op.value}
         return self._operators(node, condition)
 
     @visitor(GreaterEqualOp)
     def visit(self, node, value_fn):
-        condition = {"gte": value_fn(None)["multi_match"]["query"]}
+        condition = {"gte": node.op.value}
         return self._operators(node, condition)
 
     @visitor(LowerEqualOp)
     def visit(self, node, value_fn):
-        condition = {"lte": value_fn(None)["multi_match"]["query"]}
+        condition = {"lte": node.op.value}
         return self._operators(node, condition)
     # pylint: enable=W0612,E0102
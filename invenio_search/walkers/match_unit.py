@@ -19,7 +19,6 @@
 
 """Implement AST vistor."""
 
-import re
 from collections import MutableMapping, MutableSequence
 
 import six
@@ -30,6 +29,8 @@ from invenio_query_parser.visitor import make_visitor
 
 from invenio.utils.memoise import memoize
 
+from ..regexp import compile_regex
+
 
 @memoize
 def get_field_tags(field, tagtype="marc"):
@@ -55,7 +56,7 @@ def match_unit(record, p, f=None, m='a', wl=None):
 
     # compile search value only once for non exact search
     if m != 'e' and isinstance(p, six.string_types):
-        p = re.compile(p)
+        p = compile_regex(p)
 
     if isinstance(record, MutableSequence):
         return any([match_unit(field, p, f=f, m=m, wl=wl)
@@ -31,9 +31,19 @@ from invenio_query_parser.ast import (
 )
 from invenio_query_parser.visitor import make_visitor
 
+from ..deadline import get_deadline
 from ..searchext.engines.native import search_unit
 
 
+def _search_unit(**kwargs):
+    """Call ``search_unit`` unless the request deadline has expired."""
+    deadline = get_deadline()
+    if deadline is not None and deadline.expired:
+        deadline.stop()
+        return intbitset()
+    return search_unit(**kwargs)
+
+
 class SearchUnit(object):
 
     """Implement visitor using ``search_unit`` API."""
@@ -60,11 +70,11 @@ class SearchUnit(object):
             left.update(dict(p=right))
         else:
             left.update(right)
-        return search_unit(**left)
+        return _search_unit(**left)
 
     @visitor(ValueQuery)
     def visit(self, node, op):
-        return search_unit(**op)
+        return _search_unit(**op)
 
     @visitor(GreaterOp)
     def visit(self, node, op):
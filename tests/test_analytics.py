@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for search analytics rollups."""
+
+import datetime
+import os
+import shutil
+import tempfile
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.analytics import SearchAnalytics, parse_log_line
+
+
+class TestSearchAnalytics(InvenioTestCase):
+
+    """Test rollups of the search log."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = os.path.join(self.directory, 'search.log')
+        self.analytics = SearchAnalytics(
+            os.path.join(self.directory, 'analytics.db'))
+
+    def tearDown(self):
+        self.analytics.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, lines, filename=None, mode='a'):
+        with open(filename or self.log, mode) as f:
+            f.write(''.join(lines))
+
+    def test_parse_log_line(self):
+        self.assertEqual(
+            parse_log_line("20151001120000#search#title:a#b##"
+                           "['Articles', 'Theses']#0#12.5\n"),
+            ('2015-10-01', 'title:a#b', ['Articles', 'Theses'], 0, 12.5))
+        self.assertEqual(
+            parse_log_line("20151001120000#search#ellis##['Articles']#3\n"),
+            ('2015-10-01', 'ellis', ['Articles'], 3, None))
+        self.assertEqual(parse_log_line("20151001120000#browse#a##b#3\n"),
+                         None)
+
+    def test_process_log(self):
+        self.write(["20151001120000#search#ellis##['Articles']#{0}#{1}\n"
+                    .format(i % 3, i + 1) for i in range(100)])
+        self.write(["20151002120000#search#higgs##['Articles']#5#\n",
+                    "20151002120000#search#incomplete"])
+        self.assertEqual(self.analytics.process_log(self.log), 101)
+        self.assertEqual(self.analytics.process_log(self.log), 0)
+        self.write(["##['Articles']#0#3\n"])
+        self.assertEqual(self.analytics.process_log(self.log), 1)
+
+        self.assertEqual(self.analytics.top_queries('Articles', limit=2),
+                         [('ellis', 100), ('higgs', 1)])
+        self.assertEqual(self.analytics.zero_hit_queries(),
+                         [('ellis', 34), ('incomplete', 1)])
+        p95 = self.analytics.latency_percentile('Articles', 95)
+        self.assertTrue(95 <= p95 < 95 * 1.1)
+
+    def test_rotated_log(self):
+        self.write(["20151001120000#search#ellis##['Articles']#1#\n"])
+        self.analytics.process_log(self.log)
+        os.rename(self.log, self.log + '.1')
+        self.write(["20151001120000#search#higgs##['Articles']#1#\n"],
+                   self.log + '.1')
+        self.write(["20151002120000#search#higgs##['Theses']#1#\n"])
+        self.assertEqual(self.analytics.process_log(self.log), 2)
+
+    def test_user_queries(self):
+        self.assertEqual(self.analytics.process_user_queries([
+            (datetime.datetime(2015, 10, 1, 1), 1, 10, 'p=ellis&cc=Articles'),
+            (datetime.datetime(2015, 10, 1, 2), 1, 11, 'p=higgs&cc=Articles'),
+            (datetime.datetime(2015, 10, 1, 3), 2, 10, 'p=ellis&cc=Articles'),
+        ]), 3)
+        self.assertEqual(self.analytics.last_user_query_date(),
+                         datetime.datetime(2015, 10, 1, 3))
+        self.assertEqual(self.analytics.top_user_queries('Articles'),
+                         [('ellis', 2), ('higgs', 1)])
+
+    def test_user_queries_read_again(self):
+        self.analytics.process_user_queries([
+            (datetime.datetime(2015, 10, 1, 1), 1, 10, 'p=ellis'),
+        ])
+        self.assertEqual(self.analytics.user_queries_since(lag=60),
+                         datetime.datetime(2015, 10, 1, 0, 59))
+        # same row read again, its date updated the same day and a row
+        # inserted late with the same date
+        self.assertEqual(self.analytics.process_user_queries([
+            (datetime.datetime(2015, 10, 1, 1), 1, 10, 'p=ellis'),
+            (datetime.datetime(2015, 10, 1, 1), 2, 10, 'p=ellis'),
+            (datetime.datetime(2015, 10, 1, 5), 1, 10, 'p=ellis'),
+            (datetime.datetime(2015, 10, 2, 1), 1, 10, 'p=ellis'),
+        ]), 2)
+        self.assertEqual(self.analytics.top_user_queries(day='2015-10-01'),
+                         [('ellis', 2)])
+        self.assertEqual(self.analytics.top_user_queries(day='2015-10-02'),
+                         [('ellis', 1)])
+
+    def test_compact(self):
+        self.write(["2015100{0}120000#search#{1}##['Articles']#1#\n".format(
+            day, p) for day, p in [(1, 'a'), (2, 'a'), (2, 'b'), (2, 'a'),
+                                   (3, 'c'), (3, 'd')]])
+        self.analytics.process_log(self.log)
+        self.analytics.compact(retention_days=1, keep=1,
+                               today=datetime.date(2015, 10, 3))
+        self.assertEqual(self.analytics.top_queries(),
+                         [('a', 2), ('c', 1), ('d', 1)])
+
+    def test_compact_keep(self):
+        self.write(["2015100{0}120000#search#{1}##['{2}']#1#\n".format(
+            day, p, c) for day, p, c, n in [
+                (1, 'a', 'A', 3), (1, 'b', 'A', 2), (1, 'c', 'A', 1),
+                (1, 'd', 'B', 1), (2, 'e', 'A', 1), (2, 'f', 'A', 1)]
+            for dummy in range(n)])
+        self.analytics.process_log(self.log)
+        self.analytics.compact(retention_days=10, keep=2,
+                               today=datetime.date(2015, 10, 2))
+        self.assertEqual(self.analytics.top_queries('A', day='2015-10-01'),
+                         [('a', 3), ('b', 2)])
+        self.assertEqual(self.analytics.top_queries('B'), [('d', 1)])
+        self.assertEqual(len(self.analytics.top_queries('A',
+                                                        day='2015-10-02')),
+                         2)
+
+
+TEST_SUITE = make_test_suite(TestSearchAnalytics)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
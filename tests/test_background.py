@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for queues handled by a background thread."""
+
+import os
+import threading
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.background import BackgroundQueue
+
+
+class TestBackgroundQueue(InvenioTestCase):
+
+    """Test batching, dropping and stopping of background queues."""
+
+    def setUp(self):
+        self.batches = []
+        self.threads = set()
+
+    def handler(self, items):
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(items)
+
+    def test_batches(self):
+        writer = BackgroundQueue(self.handler, 'test-writer', batch_size=2,
+                                 interval=0.05)
+        for i in range(5):
+            self.assertTrue(writer.put(i))
+        writer.flush()
+        self.assertEqual(sum(self.batches, []), [0, 1, 2, 3, 4])
+        self.assertTrue(all(len(batch) <= 2 for batch in self.batches))
+        self.assertEqual(self.threads, set(['test-writer']))
+
+    def test_drop_when_full(self):
+        dropped = []
+        writer = BackgroundQueue(self.handler, 'test-writer', maxsize=1,
+                                 on_drop=lambda: dropped.append(True))
+        # pretend the thread is running but stalled
+        writer._pid = os.getpid()
+        self.assertTrue(writer.put(0))
+        self.assertFalse(writer.put(1))
+        self.assertEqual(writer.dropped, 1)
+        self.assertEqual(dropped, [True])
+
+    def test_handler_error(self):
+        def handler(items):
+            self.batches.append(items)
+            raise ValueError(items)
+
+        writer = BackgroundQueue(handler, 'test-writer')
+        writer.put(0)
+        writer.flush()
+        writer.put(1)
+        writer.flush()
+        self.assertEqual(self.batches, [[0], [1]])
+
+    def test_close(self):
+        writer = BackgroundQueue(self.handler, 'test-writer')
+        writer.put(0)
+        writer.close()
+        self.assertFalse(writer.running)
+        self.assertEqual(self.batches, [[0]])
+
+
+TEST_SUITE = make_test_suite(TestBackgroundQueue)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the time budget of search requests."""
+
+import time
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.api import Results
+from invenio_search.deadline import Deadline, get_deadline, set_deadline
+
+
+class FakeElasticsearch(object):
+
+    """Return given response and remember the requests."""
+
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def search(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.response
+
+
+class TestDeadline(InvenioTestCase):
+
+    """Test the time budget of a search request."""
+
+    def test_remaining(self):
+        deadline = Deadline(60)
+        self.assertTrue(0 < deadline.remaining <= 60)
+        self.assertFalse(deadline.expired)
+        self.assertTrue(deadline.es_timeout().endswith('ms'))
+
+    def test_expired(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        self.assertEqual(deadline.remaining, 0)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.es_timeout(), '1ms')
+
+    def test_exceeded_only_when_stopped(self):
+        deadline = Deadline(0)
+        self.assertTrue(deadline.expired)
+        self.assertFalse(deadline.exceeded)
+        deadline.stop()
+        self.assertTrue(deadline.exceeded)
+
+    def test_application_context(self):
+        deadline = Deadline(10)
+        set_deadline(deadline)
+        self.assertTrue(get_deadline() is deadline)
+        set_deadline(None)
+        self.assertTrue(get_deadline() is None)
+
+
+class TestPartialResults(InvenioTestCase):
+
+    """Test propagation of the time budget to the results."""
+
+    def setUp(self):
+        from invenio.ext import es
+        self.module = es
+        self.es = es.es
+
+    def tearDown(self):
+        self.module.es = self.es
+
+    def search(self, response, deadline=None):
+        self.module.es = FakeElasticsearch(
+            dict(response, hits={'total': 0, 'hits': []}))
+        results = Results({'match_all': {}}, deadline=deadline)
+        self.assertEqual(len(results), 0)
+        return results
+
+    def test_not_fetched(self):
+        results = Results({'match_all': {}})
+        self.assertFalse(results.partial)
+        self.assertTrue(results._results is None)
+
+    def test_complete(self):
+        self.assertFalse(self.search({'timed_out': False}).partial)
+
+    def test_timed_out(self):
+        results = self.search({'timed_out': True}, Deadline(60))
+        self.assertTrue(results.partial)
+        request = self.module.es.requests[0]
+        self.assertTrue(request['body']['timeout'].endswith('ms'))
+        self.assertTrue(request['request_timeout'] > 60)
+
+    def test_terminated_early(self):
+        self.assertTrue(self.search({'terminated_early': True}).partial)
+
+    def test_native_engine_stopped(self):
+        deadline = Deadline(60)
+        deadline.stop()
+        results = Results({'match_all': {}}, deadline=deadline)
+        self.assertTrue(results.partial)
+
+
+TEST_SUITE = make_test_suite(TestDeadline, TestPartialResults)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -26,7 +26,30 @@ from invenio_query_parser.ast import (
     GreaterOp, GreaterEqualOp, LowerOp, LowerEqualOp
 )
 
-from invenio_search.walkers.elasticsearch import ElasticSearchDSL
+from invenio_search.api import Results
+from invenio_search.deadline import Deadline
+from invenio_search.walkers.elasticsearch import ElasticSearchDSL, \
+    KeywordMapping, wildcard_query
+
+
+class FakeIndices(object):
+
+    """Explain rewritten wildcards with given terms."""
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.requests = []
+
+    def validate_query(self, **kwargs):
+        self.requests.append(kwargs)
+        ((clause, fields), ) = kwargs['body']['query'].items()
+        ((field, options), ) = fields.items()
+        limit = int(options['rewrite'][len('top_terms_'):])
+        explanation = ' '.join('{0}:{1}'.format(field, term)
+                               for term in self.terms[:limit])
+        return {'valid': True, 'explanations': [
+            {'index': 'records', 'valid': True, 'explanation': explanation}
+        ]}
 
 
 class TestElasticSearchWalker(InvenioTestCase):
@@ -71,7 +94,9 @@ class TestElasticSearchWalker(InvenioTestCase):
     def test_regex_value(self):
         tree = ValueQuery(RegexValue('^E.*s$'))
         self.assertEqual(tree.accept(self.converter), {
-            "regexp": {"global_fulltext": '^E.*s$'}
+            "bool": {"must": [
+                {"prefix": {"global_fulltext": "E"}},
+                {"regexp": {"global_fulltext": '^E.*s$'}}]}
         })
 
     # Key-value queries
@@ -117,10 +142,68 @@ class TestElasticSearchWalker(InvenioTestCase):
         })
 
     def test_key_regex(self):
+        tree = KeywordOp(Keyword('boo'), RegexValue('.*bar'))
+        self.assertEqual(tree.accept(self.converter), {
+            "regexp": {"boo": ".*bar"}
+        })
+
+    def test_key_regex_prefix(self):
         tree = KeywordOp(Keyword('boo'), RegexValue('bar'))
-        print tree.accept(self.converter)
         self.assertEqual(tree.accept(self.converter), {
-            "regexp": {"boo": "bar"}
+            "bool": {"must": [
+                {"prefix": {"boo": "bar"}},
+                {"regexp": {"boo": "bar"}}]}
+        })
+
+    def test_key_regex_lucene_interval(self):
+        tree = KeywordOp(Keyword('boo'), RegexValue('bar<1-5>'))
+        self.assertEqual(tree.accept(self.converter), {
+            "bool": {"must": [
+                {"prefix": {"boo": "bar"}},
+                {"regexp": {"boo": "bar<1-5>"}}]}
+        })
+
+    # Keyword mapping
+    def test_keyword_mapping(self):
+        mapping = KeywordMapping({
+            "foo": ["test1", "test2"],
+            "bar": {"a": ["a1"], "p": ["p1"], "e": ["e1", "e2"]},
+        })
+        self.assertEqual(mapping("foo", "e"), ("test1", "test2"))
+        self.assertEqual(mapping("bar", "e"), ("e1", "e2"))
+        self.assertEqual(mapping("baz"), ("baz", ))
+
+    def test_keyword_mapping_missing_mode(self):
+        self.assertRaises(RuntimeError, KeywordMapping,
+                          {"bar": {"a": ["a1"], "p": ["p1"]}})
+
+    # Wildcards
+    def test_key_val_wildcard(self):
+        from flask import g
+        g.search_wildcard_limit = 100
+        tree = KeywordOp(Keyword('foo'), Value('ell*'))
+        self.assertEqual(tree.accept(self.converter), {
+            "bool": {
+                "should": [
+                    {"prefix": {"test1": {"value": "ell",
+                                          "rewrite": "top_terms_100"}}},
+                    {"prefix": {"test2": {"value": "ell",
+                                          "rewrite": "top_terms_100"}}}]
+            }
+        })
+
+    def test_wildcard_query(self):
+        self.assertEqual(wildcard_query('title', 'ell%'), {
+            "prefix": {"title": {"value": "ell"}}
+        })
+        self.assertEqual(wildcard_query('title', 'e*is', 10), {
+            "wildcard": {"title": {"value": "e*is",
+                                   "rewrite": "top_terms_10"}}
+        })
+
+    def test_wildcard_query_lowercase(self):
+        self.assertEqual(wildcard_query('title', 'Ellis*'), {
+            "prefix": {"title": {"value": "ellis"}}
         })
 
     # Combined queries - boolean opeations
@@ -282,7 +365,78 @@ class TestElasticSearchWalker(InvenioTestCase):
             }
         })
 
-TEST_SUITE = make_test_suite(TestElasticSearchWalker)
+
+class TestWildcardsTruncated(InvenioTestCase):
+
+    """Test detection of wildcards expanded to more terms than the limit."""
+
+    limited = {'prefix': {'title': {'value': 'ell',
+                                    'rewrite': 'top_terms_1'}}}
+
+    def setUp(self):
+        from invenio.ext import es
+        self.module = es
+        self.es = es.es
+        self.check = self.app.config.get('SEARCH_WILDCARD_TRUNCATION_CHECK')
+        self.app.config['SEARCH_WILDCARD_TRUNCATION_CHECK'] = True
+
+    def tearDown(self):
+        self.module.es = self.es
+        self.app.config['SEARCH_WILDCARD_TRUNCATION_CHECK'] = self.check
+
+    def truncated(self, query, terms, deadline=None):
+        class FakeElasticsearch(object):
+            indices = FakeIndices(terms)
+        self.module.es = FakeElasticsearch()
+        return Results(query, deadline=deadline).wildcards_truncated
+
+    def test_no_limit(self):
+        query = {'prefix': {'title': {'value': 'ell'}}}
+        self.assertFalse(self.truncated(query, ['ellis', 'ellison']))
+        self.assertEqual(self.module.es.indices.requests, [])
+
+    def test_within_limit(self):
+        query = {'prefix': {'title': {'value': 'ell',
+                                      'rewrite': 'top_terms_2'}}}
+        self.assertFalse(self.truncated(query, ['ellis', 'ellison']))
+        request = self.module.es.indices.requests[0]
+        self.assertEqual(request['body']['query']['prefix']['title'],
+                         {'value': 'ell', 'rewrite': 'top_terms_3'})
+
+    def test_truncated(self):
+        query = {'bool': {'should': [
+            {'multi_match': {'query': 'foo', 'fields': ['title']}},
+            {'wildcard': {'title': {'value': 'e*s',
+                                    'rewrite': 'top_terms_1'}}},
+        ]}}
+        self.assertTrue(self.truncated(query, ['ellis', 'ellison']))
+
+    def test_disabled(self):
+        self.app.config['SEARCH_WILDCARD_TRUNCATION_CHECK'] = False
+        self.assertFalse(self.truncated(self.limited, ['ellis', 'ellison']))
+        self.assertEqual(self.module.es.indices.requests, [])
+
+    def test_deadline(self):
+        self.assertTrue(self.truncated(self.limited, ['ellis', 'ellison'],
+                                       deadline=Deadline(10)))
+        request = self.module.es.indices.requests[0]
+        self.assertTrue(0 < request['request_timeout'] <= 10)
+
+    def test_partial(self):
+        deadline = Deadline(10)
+        deadline.stop()
+        self.assertFalse(self.truncated(self.limited, ['ellis', 'ellison'],
+                                        deadline=deadline))
+        self.assertEqual(self.module.es.indices.requests, [])
+
+    def test_expired(self):
+        self.assertFalse(self.truncated(self.limited, ['ellis', 'ellison'],
+                                        deadline=Deadline(0)))
+        self.assertEqual(self.module.es.indices.requests, [])
+
+
+TEST_SUITE = make_test_suite(TestElasticSearchWalker,
+                             TestWildcardsTruncated)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the query enhancer pipeline."""
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+from invenio_query_parser.ast import AndOp, Keyword, KeywordOp, Value
+
+from invenio_search.enhancers import EnhancerPipeline, skip_when
+
+
+def add_foo(query, **kwargs):
+    return AndOp(query, KeywordOp(Keyword('foo'), Value('bar')))
+
+
+@skip_when(lambda **kwargs: kwargs.get('collection') is None)
+def add_collection(query, collection=None, **kwargs):
+    return AndOp(query, KeywordOp(Keyword('collection'), Value(collection)))
+
+
+class TestEnhancerPipeline(InvenioTestCase):
+
+    """Test composition of query enhancers."""
+
+    def test_callables_and_strings(self):
+        pipeline = EnhancerPipeline([
+            add_foo, 'test_enhancer_pipeline:add_collection'
+        ])
+        self.assertEqual(len(pipeline), 2)
+        query = Value('baz')
+        self.assertEqual(
+            pipeline(query, collection='Articles'),
+            AndOp(AndOp(query, KeywordOp(Keyword('foo'), Value('bar'))),
+                  KeywordOp(Keyword('collection'), Value('Articles')))
+        )
+
+    def test_skip_noop_enhancer(self):
+        pipeline = EnhancerPipeline([add_collection])
+        query = Value('baz')
+        self.assertEqual(pipeline(query, collection=None), query)
+        self.assertEqual(list(pipeline.timings.values()), [[0, 0.0]])
+
+    def test_timings(self):
+        pipeline = EnhancerPipeline([add_foo])
+        pipeline(Value('baz'))
+        pipeline(Value('baz'))
+        self.assertEqual(pipeline.timings[pipeline.names[0]][0], 2)
+
+
+TEST_SUITE = make_test_suite(TestEnhancerPipeline)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
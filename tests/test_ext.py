@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for search objects shared by the application."""
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.ext import get_state
+from invenio_search.utils import query_walkers, search_walkers
+
+
+class TestSearchState(InvenioTestCase):
+
+    """Test objects built once from the application configuration."""
+
+    def test_walkers_are_shared(self):
+        self.assertTrue(search_walkers() is search_walkers())
+        self.assertTrue(query_walkers() is query_walkers())
+
+    def test_rebuild_on_config_change(self):
+        walkers = search_walkers()
+        self.app.config['SEARCH_ELASTIC_KEYWORD_MAPPING'] = {
+            'foo': ['test1', 'test2']
+        }
+        self.assertFalse(walkers is search_walkers())
+        self.assertEqual(get_state().keyword_mapping('foo'),
+                         ('test1', 'test2'))
+
+
+TEST_SUITE = make_test_suite(TestSearchState)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
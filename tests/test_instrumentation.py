@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for search pipeline instrumentation."""
+
+from flask import g
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.instrumentation import SpanRecorder, get_recorder, \
+    span, start_recording
+
+
+class TestInstrumentation(InvenioTestCase):
+
+    """Test recording of search stages."""
+
+    def tearDown(self):
+        g.pop('search_spans', None)
+
+    def test_disabled(self):
+        self.app.config['SEARCH_INSTRUMENTATION'] = False
+        self.assertEqual(start_recording(), None)
+        with span('parse'):
+            pass
+        self.assertEqual(get_recorder(), None)
+
+    def test_enabled(self):
+        self.app.config['SEARCH_INSTRUMENTATION'] = True
+        recorder = start_recording()
+        with span('parse'):
+            pass
+        recorder.add('es', 0.0125)
+        recorder.add('es', 0.0125)
+        self.assertEqual([name for name, _ in recorder.spans],
+                         ['parse', 'es', 'es'])
+        self.assertEqual(recorder.as_dict()['es'], 25)
+
+    def test_server_timing(self):
+        recorder = SpanRecorder()
+        recorder.add('walker.ElasticSearchDSL', 0.001)
+        recorder.add('enhancer.a:b', 0.5)
+        self.assertEqual(recorder.server_timing(),
+                         'walker.ElasticSearchDSL;dur=1.00, '
+                         'enhancer.a_b;dur=500.00')
+
+
+TEST_SUITE = make_test_suite(TestInstrumentation)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
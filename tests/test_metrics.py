@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for search metrics."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.metrics import Counter, Histogram, MetricsRegistry, \
+    MmapValues
+
+
+class TestMetrics(InvenioTestCase):
+
+    """Test metrics collection and exposition."""
+
+    def setUp(self):
+        self.app.config['SEARCH_METRICS_ENABLED'] = True
+        self.app.config['SEARCH_METRICS_DIR'] = None
+        self.registry = MetricsRegistry()
+
+    def test_disabled(self):
+        self.app.config['SEARCH_METRICS_ENABLED'] = False
+        counter = Counter('c_total', 'Counter.', registry=self.registry)
+        counter.inc()
+        self.assertEqual(self.registry.values(), {})
+
+    def test_counter(self):
+        counter = Counter('search_cache_requests_total', 'Cache lookups.',
+                          ('cache', 'result'), registry=self.registry)
+        counter.inc(cache='results', result='hit')
+        counter.inc(2, cache='results', result='hit')
+        counter.inc(cache='results', result='miss')
+        self.assertRaises(ValueError, counter.inc, cache='results')
+        self.assertEqual(
+            self.registry.generate_latest(),
+            '# HELP search_cache_requests_total Cache lookups.\n'
+            '# TYPE search_cache_requests_total counter\n'
+            'search_cache_requests_total{cache="results",result="hit"} 3.0\n'
+            'search_cache_requests_total{cache="results",result="miss"} 1.0\n'
+        )
+
+    def test_histogram(self):
+        histogram = Histogram('latency_seconds', 'Latency.',
+                              buckets=(0.1, 1), registry=self.registry)
+        histogram.observe(0.5)
+        histogram.observe(2)
+        self.assertEqual(
+            self.registry.generate_latest(),
+            '# HELP latency_seconds Latency.\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{le="0.1"} 0.0\n'
+            'latency_seconds_bucket{le="1.0"} 1.0\n'
+            'latency_seconds_bucket{le="+Inf"} 2.0\n'
+            'latency_seconds_sum 2.5\n'
+            'latency_seconds_count 2.0\n'
+        )
+
+    def test_mmap_values(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.app.config['SEARCH_METRICS_DIR'] = directory
+            counter = Counter('c_total', 'Counter.', ('name', ),
+                              registry=self.registry)
+            for i in range(5000):
+                counter.inc(name=u'n\xe9{0}'.format(i % 2000))
+            # another process writing to the same directory
+            other = MmapValues(os.path.join(directory, 'metrics_0.db'))
+            other.add(self.registry.values().popitem()[0], 10)
+            other.close()
+            values = self.registry.values()
+            self.assertEqual(len(values), 2000)
+            self.assertEqual(sum(values.values()), 5010)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_mmap_resize(self):
+        directory = tempfile.mkdtemp()
+        try:
+            values = MmapValues(os.path.join(directory, 'metrics_1.db'))
+            old = values._mmap
+            for i in range(5000):
+                values.add('key{0}'.format(i), i)
+            self.assertRaises(ValueError, old.__getitem__, 0)
+            values.close()
+            self.assertEqual(
+                sum(MmapValues.read_all(directory).values()), 12497500)
+        finally:
+            shutil.rmtree(directory)
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def test_merge_dead_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for pid in (self.dead_pid(), os.getpid()):
+                MmapValues(os.path.join(
+                    directory, 'metrics_{0}.db'.format(pid))).close()
+            MmapValues.merge_dead(directory)
+            self.assertEqual(set(os.listdir(directory)),
+                             set(['metrics.lock', MmapValues.aggregate,
+                                  'metrics_{0}.db'.format(os.getpid())]))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_counter_kept_after_merge(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for pid in (self.dead_pid(), self.dead_pid(), os.getpid()):
+                values = MmapValues(os.path.join(
+                    directory, 'metrics_{0}.db'.format(pid)))
+                values.add('c_total', pid)
+                values.close()
+            before = MmapValues.read_all(directory)
+            MmapValues.merge_dead(directory)
+            self.assertEqual(MmapValues.read_all(directory), before)
+            self.assertEqual(len(os.listdir(directory)), 3)
+        finally:
+            shutil.rmtree(directory)
+
+
+TEST_SUITE = make_test_suite(TestMetrics)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the query cost estimator."""
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+from invenio_query_parser.ast import (
+    AndOp, KeywordOp, NotOp, Keyword, Value, DoubleQuotedValue, ValueQuery,
+    RegexValue, RangeOp
+)
+
+from invenio_search.api import Query
+from invenio_search.errors import InvenioWebSearchQueryCostError
+from invenio_search.walkers.cost import QueryCost, QueryDowngrade
+
+
+class EstimatedQuery(Query):
+
+    """Query with a given cost counting its estimations."""
+
+    def __init__(self, estimated_cost):
+        super(EstimatedQuery, self).__init__('foo')
+        self.estimated_cost = estimated_cost
+        self.estimations = 0
+
+    def cost(self):
+        self.estimations += 1
+        return self.estimated_cost
+
+
+class TestQueryCost(InvenioTestCase):
+
+    """Test estimation and reduction of query cost."""
+
+    def setUp(self):
+        weights = {
+            'node': 1, 'term': 1, 'phrase': 2, 'wildcard': 10,
+            'leading_wildcard': 100, 'regex': 50, 'range': 5,
+            'open_range': 10,
+        }
+        mapping = {'foo': ['test1', 'test2']}
+        self.cost = QueryCost(
+            weights=weights,
+            map_keyword_to_fields=lambda k, m: mapping.get(k, [k])
+        )
+
+    def test_value_query(self):
+        self.assertEqual(ValueQuery(Value('bar')).accept(self.cost), 2)
+
+    def test_fan_out(self):
+        tree = KeywordOp(Keyword('foo'), DoubleQuotedValue('bar'))
+        self.assertEqual(tree.accept(self.cost), 3)
+
+    def test_wildcards(self):
+        trailing = KeywordOp(Keyword('foo'), Value('bar*'))
+        leading = KeywordOp(Keyword('foo'), Value('*bar'))
+        self.assertEqual(trailing.accept(self.cost), 23)
+        self.assertEqual(leading.accept(self.cost), 203)
+
+    def test_regex(self):
+        prefixed = KeywordOp(Keyword('title'), RegexValue('^bar.*'))
+        unprefixed = KeywordOp(Keyword('title'), RegexValue('.*bar'))
+        self.assertEqual(prefixed.accept(self.cost), 51)
+        self.assertEqual(unprefixed.accept(self.cost), 151)
+
+    def test_regex_fan_out(self):
+        mapping = {'author': {'a': ['authors.full_name', 'authors.raw'],
+                              'p': ['authors.raw'], 'e': ['authors.raw']}}
+        cost = QueryCost(
+            weights=self.cost.weights,
+            map_keyword_to_fields=lambda k, m: mapping[k][m]
+        )
+        tree = KeywordOp(Keyword('author'), RegexValue('^ell.*'))
+        self.assertEqual(tree.accept(cost), 101)
+
+    def test_range_width(self):
+        narrow = KeywordOp(Keyword('year'),
+                           RangeOp(Value('2000'), Value('2001')))
+        wide = KeywordOp(Keyword('year'),
+                         RangeOp(Value('1000'), Value('2000')))
+        self.assertTrue(narrow.accept(self.cost) < wide.accept(self.cost))
+
+    def test_boolean_nodes(self):
+        tree = AndOp(ValueQuery(Value('a')), NotOp(ValueQuery(Value('b'))))
+        self.assertEqual(tree.accept(self.cost), 6)
+
+    def test_downgrade(self):
+        tree = AndOp(KeywordOp(Keyword('foo'), Value('*bar')),
+                     KeywordOp(Keyword('title'), RegexValue('^baz.*')))
+        self.assertEqual(tree.accept(QueryDowngrade()), AndOp(
+            KeywordOp(Keyword('foo'), Value('bar')),
+            KeywordOp(Keyword('title'), Value('baz*'))
+        ))
+
+
+class TestCheckCost(InvenioTestCase):
+
+    """Test admission control of queries."""
+
+    def test_no_budget(self):
+        query = EstimatedQuery(1000)
+        self.assertTrue(query.check_cost() is None)
+        self.assertEqual(query.estimations, 0)
+
+    def test_within_budget(self):
+        query = EstimatedQuery(5)
+        self.assertEqual(query.check_cost(budget=10), 5)
+
+    def test_reject(self):
+        query = EstimatedQuery(50)
+        self.assertRaises(InvenioWebSearchQueryCostError, query.check_cost,
+                          budget=10, policy='REJECT')
+
+
+TEST_SUITE = make_test_suite(TestQueryCost, TestCheckCost)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for batched user query logging."""
+
+import os
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+
+class TestUserQueryLogger(InvenioTestCase):
+
+    """Test buffering of user queries."""
+
+    def logger(self, **kwargs):
+        from invenio_search.querylog import UserQueryLogger
+
+        batches = []
+
+        class Logger(UserQueryLogger):
+
+            def write(self, entries):
+                batches.append([entry[:3] for entry in entries])
+
+        return Logger(self.app, **kwargs), batches
+
+    def test_batches(self):
+        logger, batches = self.logger(batch_size=2, interval=0.05)
+        for i in range(5):
+            self.assertTrue(logger.push('p={0}'.format(i), 1, 'localhost'))
+        logger.flush()
+        self.assertEqual(sum(len(batch) for batch in batches), 5)
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+        self.assertEqual(batches[0][0], ('p=0', 1, 'localhost'))
+
+    def test_interval(self):
+        logger, batches = self.logger(batch_size=100, interval=0.01)
+        logger.push('p=ellis', 1, 'localhost')
+        logger.flush()
+        self.assertEqual(batches, [[('p=ellis', 1, 'localhost')]])
+
+    def test_drop_when_full(self):
+        logger, batches = self.logger(maxsize=1)
+        # pretend the writer thread is running but stalled
+        logger.writer._pid = os.getpid()
+        self.assertTrue(logger.push('p=ellis', 1, 'localhost'))
+        self.assertFalse(logger.push('p=higgs', 1, 'localhost'))
+        self.assertEqual(logger.dropped, 1)
+
+    def test_urlargs_digest(self):
+        from invenio_search.models import urlargs_digest
+        self.assertEqual(len(urlargs_digest('p=ellis')), 32)
+        self.assertEqual(urlargs_digest(u'p=ellis'),
+                         urlargs_digest(b'p=ellis'))
+        self.assertNotEqual(urlargs_digest('p=ellis&jrec=11'),
+                            urlargs_digest('p=ellis&jrec=21'))
+
+
+class TestUserQueryLog(InvenioTestCase):
+
+    """Test logging user queries added concurrently."""
+
+    urlargs = 'p=test_user_query_log_concurrent'
+
+    def setUp(self):
+        from invenio_search.models import WebQuery
+        self.get_by_urlargs = WebQuery.__dict__['get_by_urlargs']
+
+    def tearDown(self):
+        from invenio.ext.sqlalchemy import db
+        from invenio_search.models import UserQuery, WebQuery, urlargs_digest
+        WebQuery.get_by_urlargs = self.get_by_urlargs
+        db.session.rollback()
+        for webquery in WebQuery.query.filter_by(
+                digest=urlargs_digest(self.urlargs)):
+            UserQuery.query.filter_by(id_query=webquery.id).delete()
+            db.session.delete(webquery)
+        db.session.commit()
+
+    def test_same_query_in_concurrent_sessions(self):
+        from invenio.ext.sqlalchemy import db
+        from invenio_search.models import UserQuery, WebQuery
+
+        # both sessions look the query up before either adds it
+        WebQuery.get_by_urlargs = classmethod(lambda cls, urlargs: None)
+        other = db.create_scoped_session()
+        try:
+            other.add(WebQuery(urlargs=self.urlargs))
+            other.commit()
+        finally:
+            other.remove()
+
+        UserQuery.log_entry(self.urlargs, 1, 'localhost')
+        db.session.commit()
+        WebQuery.get_by_urlargs = self.get_by_urlargs
+        webquery = WebQuery.get_by_urlargs(self.urlargs)
+        self.assertEqual(
+            [execution.id_user for execution in webquery.executions], [1])
+
+
+TEST_SUITE = make_test_suite(TestUserQueryLogger, TestUserQueryLog)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
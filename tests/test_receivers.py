@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for search log handler."""
+
+import logging
+import os
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.receivers import QueueHandler, logger, setup_logger
+
+
+class ListHandler(logging.Handler):
+
+    """Collect messages of handled records."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestQueueHandler(InvenioTestCase):
+
+    """Test non-blocking search log handler."""
+
+    def test_write(self):
+        target = ListHandler()
+        handler = QueueHandler(target)
+        test_logger = logging.getLogger('invenio.search.test')
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        try:
+            for i in range(3):
+                test_logger.warning('search %d', i)
+            handler.flush()
+            self.assertEqual(target.messages,
+                             ['search 0', 'search 1', 'search 2'])
+        finally:
+            test_logger.removeHandler(handler)
+            handler.close()
+
+    def test_drop_when_full(self):
+        handler = QueueHandler(ListHandler(), maxsize=1)
+        # pretend the writer thread is running but stalled
+        handler.writer._pid = os.getpid()
+        record = logging.makeLogRecord({'msg': 'search'})
+        handler.emit(record)
+        handler.emit(record)
+        self.assertEqual(handler.dropped, 1)
+
+    def test_format(self):
+        setup_logger(self.app)
+        handler = [handler for handler in logger.handlers
+                   if isinstance(handler, QueueHandler)][0].handler
+        record = logging.makeLogRecord(dict(
+            msg='search', action='search', p='ellis', f='',
+            colls='Articles', total=3, duration='12.5'))
+        self.assertEqual(handler.format(record).split('#', 1)[1],
+                         'search#ellis##Articles#3#12.5')
+
+    def test_after_search_connected(self):
+        from invenio_search import signals
+        self.assertTrue(signals.after_search.has_receivers_for(self.app))
+
+    def test_setup_once(self):
+        setup_logger(self.app)
+        setup_logger(self.app)
+        self.assertEqual(len([handler for handler in logger.handlers
+                              if isinstance(handler, QueueHandler)]), 1)
+
+
+TEST_SUITE = make_test_suite(TestQueueHandler)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
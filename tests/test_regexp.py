@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the regular expression analysis."""
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.errors import InvenioWebSearchRegexError
+from invenio_search.regexp import analyze_regex, compile_regex, \
+    regex_literal_prefix
+
+
+class TestRegexAnalysis(InvenioTestCase):
+
+    """Test safety checks, prefix extraction and caching."""
+
+    def test_literal_prefix(self):
+        self.assertEqual(regex_literal_prefix('^Ell.*s$'), 'Ell')
+        self.assertEqual(regex_literal_prefix('Ellis?'), 'Elli')
+        self.assertEqual(regex_literal_prefix('.*is'), '')
+        self.assertEqual(regex_literal_prefix('Ellis|Smith'), '')
+        self.assertEqual(regex_literal_prefix('(?i)Ellis'), '')
+
+    def test_lucene_operators(self):
+        self.assertEqual(regex_literal_prefix('foo<1-5>'), 'foo')
+        self.assertEqual(regex_literal_prefix('ab~c'), 'ab')
+        self.assertEqual(regex_literal_prefix('abc@'), 'abc')
+        self.assertEqual(regex_literal_prefix('ab&abc'), 'ab')
+        self.assertEqual(regex_literal_prefix('ab#'), 'ab')
+        self.assertEqual(regex_literal_prefix('a"b.c"'), 'a')
+        self.assertEqual(regex_literal_prefix(r'ab\~c'), 'ab')
+
+    def test_unsafe_patterns(self):
+        for pattern in ('(a+)+$', '(a*)*b', r'(\w+\s?)*$', '(.*a){2,}'):
+            self.assertRaises(InvenioWebSearchRegexError,
+                              analyze_regex, pattern)
+
+    def test_safe_patterns(self):
+        for pattern in ('a+b+', r'(\d{2})+', '(ab)*', '^E.*s$'):
+            analyze_regex(pattern)
+
+    def test_invalid_pattern(self):
+        self.assertRaises(InvenioWebSearchRegexError, analyze_regex, '(a')
+
+    def test_cached_compilation(self):
+        self.assertTrue(compile_regex('El+is') is compile_regex('El+is'))
+
+
+TEST_SUITE = make_test_suite(TestRegexAnalysis)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
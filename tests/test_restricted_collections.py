@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for caching restricted collections users can see."""
+
+from flask import session
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search import utils
+
+
+class TestPermittedRestrictedCollections(InvenioTestCase):
+
+    """Test caching permitted restricted collections in the session."""
+
+    def setUp(self):
+        self.app.config['SEARCH_ACCESS_CONTROL_CHECK_INTERVAL'] = 3600
+        utils._access_control_version = (None, None)
+
+    def test_access_control_version(self):
+        version = utils.get_access_control_version()
+        checked = utils._access_control_version[0]
+        self.assertEqual(utils.get_access_control_version(), version)
+        self.assertEqual(utils._access_control_version[0], checked)
+
+    def test_session_cache(self):
+        version = utils.get_access_control_version()
+        with self.app.test_request_context():
+            session['search_permitted_restricted_collections'] = dict(
+                uid=42, version=version, collections=['Theses'])
+            self.assertEqual(
+                utils.get_permitted_restricted_collections({'uid': 42}),
+                ['Theses'])
+            # another version of the access control tables
+            utils._access_control_version = (
+                utils._access_control_version[0], 'other version')
+            self.assertNotEqual(
+                utils.get_permitted_restricted_collections({'uid': 42}),
+                ['Theses'])
+            self.assertEqual(
+                session['search_permitted_restricted_collections']['version'],
+                'other version')
+
+
+TEST_SUITE = make_test_suite(TestPermittedRestrictedCollections)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
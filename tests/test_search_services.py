@@ -75,8 +75,108 @@ class WebSearchServicesJournalHintService(InvenioTestCase):
                 % (repr(test_input), repr(test_output), repr(expected))
             )
 
+    def test_answers_not_cached(self):
+        """Check that records displayed to a user are not cached."""
+        self.assertFalse(self.plugin.cache_answers)
 
-TEST_SUITE = make_test_suite()
+
+class WebSearchServicesScheduling(InvenioTestCase):
+
+    """Check skipping of services which cannot change displayed answers."""
+
+    def skipped(self, relevances, bound):
+        from invenio_search.services import SearchService, \
+            cannot_change_answers
+
+        class Service(SearchService):
+            max_relevance = bound
+
+        return cannot_change_answers(
+            [(relevance, '') for relevance in relevances], Service())
+
+    def test_no_answers(self):
+        self.assertFalse(self.skipped([], 100))
+        self.assertTrue(self.skipped([], 20))
+
+    def test_definitive_answer(self):
+        self.assertTrue(self.skipped([100], 100))
+
+    def test_irrelevant_answers(self):
+        self.assertFalse(self.skipped([0, 10], 50))
+        self.assertTrue(self.skipped([0, 10], 21))
+
+    def test_relevance_difference(self):
+        self.assertFalse(self.skipped([80], 50))
+        self.assertTrue(self.skipped([80], 49))
+
+    def test_enough_answers(self):
+        self.assertTrue(self.skipped([90, 80], 70))
+        self.assertFalse(self.skipped([90, 80], 80))
+        self.assertFalse(self.skipped([90, 0], 70))
+
+    def test_math_calculator(self):
+        from invenio_search.searchext.services.MathCalculatorService import \
+            MathCalculatorService
+        service = MathCalculatorService()
+        self.assertTrue(service.can_answer('1 + 2 * 3', '', []))
+        self.assertFalse(service.can_answer('ellis', '', []))
+        self.assertFalse(service.can_answer(' ', '', []))
+
+
+class WebSearchServicesAnswerCache(InvenioTestCase):
+
+    """Check caching of search service answers."""
+
+    def setUp(self):
+        from invenio_search.services import SearchService
+
+        self.app.config['SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT'] = 60
+        calls = self.calls = []
+
+        class Service(SearchService):
+            cache_answers = True
+
+            def answer(self, req, user_info, of, cc, colls_to_search, p, f,
+                       search_units, ln):
+                calls.append(p)
+                return (50, p)
+
+        self.service = Service()
+
+    def tearDown(self):
+        from invenio_search.cache import service_answer_cache
+        service_answer_cache.clear()
+
+    def answer(self, p, permissions='a', colls=None):
+        return self.service.cached_answer(None, {}, 'hb', 'Atlantis',
+                                          colls or [], p, '', [], 'en',
+                                          permissions)
+
+    def test_cached(self):
+        self.assertEqual(self.answer('ellis'), (50, 'ellis'))
+        self.assertEqual(self.answer(' ellis '), (50, 'ellis'))
+        self.assertEqual(self.calls, ['ellis'])
+
+    def test_permissions(self):
+        self.answer('ellis')
+        self.answer('ellis', permissions='b')
+        self.assertEqual(self.calls, ['ellis', 'ellis'])
+
+    def test_collections(self):
+        self.answer('ellis')
+        self.answer('ellis', colls=['Theses'])
+        self.assertEqual(self.calls, ['ellis', 'ellis'])
+
+    def test_disabled(self):
+        self.app.config['SEARCH_SERVICES_ANSWER_CACHE_TIMEOUT'] = 0
+        self.answer('ellis')
+        self.answer('ellis')
+        self.assertEqual(self.calls, ['ellis', 'ellis'])
+
+
+TEST_SUITE = make_test_suite(WebSearchServicesJournalHintService,
+                             WebSearchServicesScheduling,
+                             WebSearchServicesAnswerCache)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for data prepared by search services."""
+
+import time
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.service_data import ServiceDataCache
+
+
+class Store(object):
+
+    """Keep values in a dictionary like the cache."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.values[key] = value
+
+    def add(self, key, value, timeout=None):
+        if key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class Source(object):
+
+    """Count how many times data is prepared and checked."""
+
+    def __init__(self):
+        self.updated = '2015-10-01 00:00:00'
+        self.filled = 0
+        self.checked = 0
+
+    def fill(self):
+        self.filled += 1
+        return {'updated': self.updated}
+
+    def verify(self):
+        self.checked += 1
+        return self.updated
+
+
+class TestServiceDataCache(InvenioTestCase):
+
+    """Test preparing data of search services."""
+
+    def setUp(self):
+        self.source = Source()
+
+    def cache(self, store=None):
+        return ServiceDataCache('Service', self.source.fill,
+                                self.source.verify, store=store, wait=0.2)
+
+    def test_check_interval(self):
+        cache = self.cache()
+        for dummy in range(3):
+            cache.recreate_cache_if_needed(interval=60)
+        self.assertEqual((self.source.filled, self.source.checked), (1, 1))
+        self.assertEqual(cache.timestamp, '2015-10-01 00:00:00')
+
+        self.source.updated = '2015-10-02 00:00:00'
+        cache.recreate_cache_if_needed(interval=60)
+        self.assertEqual(cache.cache['updated'], '2015-10-01 00:00:00')
+        cache.recreate_cache_if_needed(interval=0)
+        self.assertEqual(cache.cache['updated'], '2015-10-02 00:00:00')
+        self.assertEqual((self.source.filled, self.source.checked), (2, 2))
+
+    def test_shared_snapshot(self):
+        store = Store()
+        first, second = self.cache(store), self.cache(store)
+        first.recreate_cache_if_needed()
+        second.recreate_cache_if_needed()
+        self.assertEqual(self.source.filled, 1)
+        self.assertEqual(second.cache, first.cache)
+        self.assertFalse('search::service_data::Service::lock' in
+                         store.values)
+
+        self.source.updated = '2015-10-02 00:00:00'
+        second.recreate_cache_if_needed()
+        first.recreate_cache_if_needed()
+        self.assertEqual(self.source.filled, 2)
+        self.assertEqual(first.timestamp, '2015-10-02 00:00:00')
+
+    def test_shared_snapshot_being_prepared(self):
+        store = Store()
+        cache = self.cache(store)
+        cache.recreate_cache_if_needed()
+        self.source.updated = '2015-10-02 00:00:00'
+        store.add('search::service_data::Service::lock', True)
+        # keep current data while another worker prepares the new one
+        start = time.time()
+        cache.recreate_cache_if_needed()
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(cache.timestamp, '2015-10-01 00:00:00')
+        self.assertEqual(self.source.filled, 1)
+
+    def test_no_snapshot_prepared(self):
+        store = Store()
+        store.add('search::service_data::Service::lock', True)
+        cache = self.cache(store)
+        cache.recreate_cache_if_needed()
+        self.assertEqual(cache.timestamp, '2015-10-01 00:00:00')
+        self.assertEqual(self.source.filled, 1)
+
+
+TEST_SUITE = make_test_suite(TestServiceDataCache)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the index of search service data."""
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.service_index import CollectionNameIndex, \
+    JournalTitleIndex, TokenAutomaton, TokenIndex
+
+
+class TestTokenIndex(InvenioTestCase):
+
+    """Test matching tokens to values."""
+
+    def setUp(self):
+        self.index = TokenIndex([
+            (['higg', 'boson'], 'Higgs|/higgs'),
+            (['boson', 'detector'], 'Detectors|/detectors'),
+            (['higg'], 'Higgs|/higgs'),
+            (['particl', 'physic'], 'Physics|/physics'),
+            (['particip'], 'Participants|/participants'),
+        ])
+
+    def test_values_stored_once(self):
+        self.assertEqual(len(self.index.values), 4)
+        self.assertEqual(list(self.index.lookup('higg')), [1])
+
+    def test_score(self):
+        scores = self.index.score(['higg', 'boson', 'unknown'])
+        self.assertEqual(self.index.top(scores, 10),
+                         [(2, 'Higgs|/higgs'), (1, 'Detectors|/detectors')])
+
+    def test_top(self):
+        scores = self.index.score(['boson', 'detector', 'physic'])
+        self.assertEqual(self.index.top(scores, 2),
+                         [(2, 'Detectors|/detectors'),
+                          (1, 'Physics|/physics')])
+        self.assertEqual(self.index.top({}, 2), [])
+
+    def test_prefix(self):
+        self.assertEqual(self.index.score(['parti']), {})
+        scores = self.index.score(['parti'], prefix_min_length=4)
+        self.assertEqual(self.index.top(scores, 10),
+                         [(1, 'Physics|/physics'),
+                          (1, 'Participants|/participants')])
+        scores = self.index.score(['det'], prefix_min_length=4)
+        self.assertEqual(scores, {})
+
+
+class TestCollectionNameIndex(InvenioTestCase):
+
+    """Test filtering restricted collections."""
+
+    def setUp(self):
+        self.index = CollectionNameIndex([
+            (['articl'], 'Articles'),
+            (['theses', 'articl'], 'Theses'),
+            (['intern', 'articl', 'note'], 'Internal Notes'),
+        ], restricted=['Internal Notes', 'Unknown'])
+
+    def test_restricted(self):
+        self.assertEqual(list(self.index.restricted), [1])
+        self.assertEqual(list(self.index.visible([])), [0, 2])
+        self.assertEqual(list(self.index.visible(['Internal Notes',
+                                                  'Theses'])), [0, 1, 2])
+
+    def test_score_visible(self):
+        scores = self.index.score(['articl', 'note'],
+                                  allowed=self.index.visible([]))
+        self.assertEqual(self.index.top(scores, 10),
+                         [(1, 'Theses'), (1, 'Articles')])
+        scores = self.index.score(
+            ['articl', 'note'],
+            allowed=self.index.visible(['Internal Notes']))
+        self.assertEqual(self.index.top(scores, 1),
+                         [(2, 'Internal Notes')])
+
+
+class TestTokenAutomaton(InvenioTestCase):
+
+    """Test finding phrases in one pass."""
+
+    def test_find(self):
+        automaton = TokenAutomaton([
+            (('PHYS', 'REV'), 'PR'),
+            (('PHYS', 'REV', 'LETT'), 'PRL'),
+            (('REV', 'LETT'), 'RL'),
+            ((), 'empty'),
+        ])
+        self.assertEqual(
+            sorted(automaton.find(['NUCL', 'PHYS', 'REV', 'LETT', 'PHYS'])),
+            [(1, 3, 'PR'), (1, 4, 'PRL'), (2, 4, 'RL')])
+        self.assertEqual(list(automaton.find(['PHYS', 'PHYS', 'REV'])),
+                         [(1, 3, 'PR')])
+        self.assertEqual(list(automaton.find([])), [])
+
+
+class TestJournalTitleIndex(InvenioTestCase):
+
+    """Test finding journal references."""
+
+    def setUp(self):
+        self.index = JournalTitleIndex(['Phys. Rev.', 'Phys. Rev. Lett.',
+                                        'JHEP', 'Phys.Rev.'])
+
+    def test_find_reference(self):
+        self.assertEqual(
+            self.index.find_reference(u'Ellis, Phys.Rev.Lett. 101 (2008) 1'),
+            u'Phys.Rev.Lett. 101 (2008) 1')
+        self.assertEqual(self.index.find_reference(u'jhep 0901,1'),
+                         u'jhep 0901,1')
+
+    def test_no_reference(self):
+        self.assertEqual(self.index.find_reference(u'Ellis, John (2008)'),
+                         None)
+        # a title must be followed by a number
+        self.assertEqual(self.index.find_reference(u'1999, Phys. Rev.'),
+                         None)
+
+
+TEST_SUITE = make_test_suite(TestTokenIndex, TestCollectionNameIndex,
+                             TestTokenAutomaton, TestJournalTitleIndex)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
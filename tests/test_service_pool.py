@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for concurrent search services."""
+
+import time
+
+from flask import g, has_request_context
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search import service_pool
+from invenio_search.service_pool import run_services
+
+
+class Service(object):
+
+    """Answer with given relevance after a delay."""
+
+    def __init__(self, relevance, delay=0, error=False):
+        self.relevance = relevance
+        self.delay = delay
+        self.error = error
+
+    def answer(self, p):
+        time.sleep(self.delay)
+        if self.error:
+            raise ValueError(p)
+        return self.relevance, '{0}:{1}'.format(p, self.relevance)
+
+
+class TestServicePool(InvenioTestCase):
+
+    """Test running search services in a thread pool."""
+
+    def setUp(self):
+        self.app.config.update(SEARCH_SERVICES_POOL_SIZE=4,
+                               SEARCH_SERVICE_TIMEOUT=0.2,
+                               SEARCH_SERVICES_TIMEOUT=1)
+
+    def test_serial(self):
+        self.app.config['SEARCH_SERVICES_POOL_SIZE'] = 0
+        self.assertEqual(run_services([Service(10), Service(20)], ('p', )),
+                         [(10, 'p:10'), (20, 'p:20')])
+
+    def test_concurrent(self):
+        start = time.time()
+        answers = run_services([Service(i, delay=0.1) for i in range(4)],
+                               ('p', ))
+        self.assertEqual(answers, [(i, 'p:{0}'.format(i)) for i in range(4)])
+        self.assertTrue(time.time() - start < 0.3)
+
+    def test_slow_and_failing(self):
+        answers = run_services([Service(10), Service(20, delay=1),
+                                Service(30, error=True), Service(40)],
+                               ('p', ))
+        self.assertEqual(answers, [(10, 'p:10'), (40, 'p:40')])
+
+    def test_queued_services(self):
+        # more services than threads: waiting for a free thread does not
+        # count in the service timeout
+        self.app.config['SEARCH_SERVICES_POOL_SIZE'] = 1
+        answers = run_services([Service(i, delay=0.15) for i in range(3)],
+                               ('p', ))
+        self.assertEqual(len(answers), 3)
+
+    def test_global_timeout(self):
+        self.app.config.update(SEARCH_SERVICES_POOL_SIZE=1,
+                               SEARCH_SERVICES_TIMEOUT=0.25)
+        answers = run_services([Service(i, delay=0.15) for i in range(3)],
+                               ('p', ))
+        self.assertEqual(len(answers), 1)
+
+    def test_no_timeouts(self):
+        # a hung service does not block the request without timeouts
+        self.app.config.update(SEARCH_SERVICE_TIMEOUT=0,
+                               SEARCH_SERVICES_TIMEOUT=None)
+        default = service_pool.DEFAULT_SERVICES_TIMEOUT
+        service_pool.DEFAULT_SERVICES_TIMEOUT = 0.1
+        try:
+            start = time.time()
+            answers = run_services([Service(10), Service(20, delay=0.5)],
+                                   ('p', ))
+        finally:
+            service_pool.DEFAULT_SERVICES_TIMEOUT = default
+        self.assertEqual(answers, [(10, 'p:10')])
+        self.assertTrue(time.time() - start < 0.3)
+
+    def test_request_values(self):
+        class ContextService(Service):
+            def answer(self, p):
+                return has_request_context(), g.search_test_value
+
+        g.search_test_value = 'value'
+        try:
+            self.assertEqual(run_services([ContextService(10)], ('p', )),
+                             [(False, 'value')])
+        finally:
+            del g.search_test_value
+
+    def test_queued_services_dropped(self):
+        # services still queued behind timed out ones are not run once the
+        # answers are no longer awaited
+        self.app.config.update(SEARCH_SERVICES_POOL_SIZE=1,
+                               SEARCH_SERVICES_TIMEOUT=0.1)
+        self.assertEqual(run_services([Service(10, delay=0.3)], ('p', )), [])
+        ran = []
+        service = Service(20)
+        service.answer = ran.append
+        self.assertEqual(run_services([service], ('p', )), [])
+        time.sleep(0.3)
+        self.assertEqual(ran, [])
+
+
+TEST_SUITE = make_test_suite(TestServicePool)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
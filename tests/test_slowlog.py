@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for slow query log."""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.slowlog import SlowQueryLog, is_slow
+
+
+class TestSlowQueryLog(InvenioTestCase):
+
+    """Test slow query log writer."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'search_slow.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_is_slow(self):
+        self.app.config['SEARCH_SLOW_QUERY_THRESHOLD'] = None
+        self.assertFalse(is_slow(100))
+        self.app.config['SEARCH_SLOW_QUERY_THRESHOLD'] = 0.5
+        self.assertFalse(is_slow(0.1))
+        self.assertTrue(is_slow(0.5))
+
+    def test_write(self):
+        log = SlowQueryLog(self.filename)
+        for i in range(3):
+            self.assertTrue(log.write({'p': 'title:foo', 'hits': i}))
+        log.flush()
+        with open(self.filename) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['hits'] for record in records], [0, 1, 2])
+
+    def test_drop_when_full(self):
+        log = SlowQueryLog(self.filename, maxsize=1)
+        # pretend the writer thread is running but stalled
+        log.writer._pid = os.getpid()
+        self.assertTrue(log.write({'hits': 0}))
+        self.assertFalse(log.write({'hits': 1}))
+        self.assertEqual(log.dropped, 1)
+
+    def test_permissions_in_writer_thread(self):
+        threads = []
+
+        class Log(SlowQueryLog):
+
+            def get_permissions(self, user_info):
+                threads.append(threading.current_thread().name)
+                return 'digest of {0}'.format(user_info['uid'])
+
+        log = Log(self.filename, app=self.app)
+        log.write({'p': 'title:foo'}, {'uid': 1})
+        log.write({'p': 'title:bar'})
+        log.flush()
+        with open(self.filename) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(threads, ['search-slow-query-log'])
+        self.assertEqual(records[0]['permissions'], 'digest of 1')
+        self.assertFalse('permissions' in records[1])
+
+
+TEST_SUITE = make_test_suite(TestSlowQueryLog)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for cached stemming."""
+
+from invenio.legacy.bibindex.engine_stemmer import stem as _stem
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search.stemming import get_stem_cache, stem, stem_vocabulary, \
+    stem_words
+
+
+class TestStemming(InvenioTestCase):
+
+    """Test stemming words through the stem cache."""
+
+    def setUp(self):
+        self.cache = get_stem_cache()
+        self.cache.clear()
+
+    def test_stem(self):
+        self.assertEqual(stem('particles', 'en'), _stem('particles', 'en'))
+        self.assertTrue(('particles', 'en') in self.cache)
+        self.assertFalse(('particles', 'fr') in self.cache)
+
+    def test_stem_words(self):
+        words = ['detectors', 'particles', 'detectors']
+        self.assertEqual(stem_words(iter(words), 'en'),
+                         [stem(word, 'en') for word in words])
+        self.assertEqual(len(self.cache), 2)
+
+    def test_stem_vocabulary(self):
+        self.assertEqual(
+            stem_vocabulary(iter(['detectors', 'particles', 'detectors']),
+                            'en'),
+            {'detectors': _stem('detectors', 'en'),
+             'particles': _stem('particles', 'en')})
+        self.assertEqual(len(self.cache), 0)
+
+
+TEST_SUITE = make_test_suite(TestStemming)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
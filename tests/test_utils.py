@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for search utility functions."""
+
+from invenio.testsuite import make_test_suite, run_test_suite, InvenioTestCase
+
+from invenio_search import utils
+from invenio_search.utils import most_common_values
+
+
+class TestMostCommonValues(InvenioTestCase):
+
+    """Test selecting the most common field values."""
+
+    def setUp(self):
+        self.counts = {'THESIS': 7, 'preprint': 10, 'Book': 7, 'note': 1}
+
+    def test_order(self):
+        self.assertEqual(most_common_values(self.counts),
+                         [('preprint', 10), ('Book', 7), ('THESIS', 7),
+                          ('note', 1)])
+
+    def test_limit(self):
+        self.assertEqual(most_common_values(self.counts, 2),
+                         [('preprint', 10), ('Book', 7)])
+        self.assertEqual(most_common_values(self.counts, 0), [])
+        self.assertEqual(len(most_common_values(self.counts, 10)), 4)
+
+    def test_names(self):
+        names = {'ellis, j': 'Ellis, J'}
+        self.assertEqual(most_common_values({'ellis, j': 2}, names=names),
+                         [('Ellis, J', 2)])
+
+
+class TestDistinctValuesPerRecord(InvenioTestCase):
+
+    """Test counting values once per record."""
+
+    values = {
+        '100__a': [(1, 'Ellis, J'), (2, 'Ellis, J'), (3, 'Ellis, N')],
+        '700__a': [(1, 'ELLIS, J'), (1, 'Ellis, N'), (2, 'Ellis, J')],
+    }
+
+    def setUp(self):
+        self.queries = []
+
+        def get_fieldvalues_by_record(recids, tag):
+            self.queries.append((list(recids), tag))
+            return [(recid, val) for recid, val in self.values[tag]
+                    if recid in recids]
+
+        self.get_fieldvalues_by_record = utils.get_fieldvalues_by_record
+        utils.get_fieldvalues_by_record = get_fieldvalues_by_record
+        self.chunk_size = self.app.config.get('SEARCH_FACETS_CHUNK_SIZE')
+
+    def tearDown(self):
+        utils.get_fieldvalues_by_record = self.get_fieldvalues_by_record
+        self.app.config['SEARCH_FACETS_CHUNK_SIZE'] = self.chunk_size
+
+    def test_count_once_per_record(self):
+        result = utils.get_most_popular_field_values(
+            [1, 2, 3], ('100__a', '700__a'), count_repetitive_values=False)
+        self.assertEqual(dict((val.lower(), freq) for val, freq in result),
+                         {'ellis, j': 2, 'ellis, n': 2})
+        self.assertEqual(self.queries, [([1, 2, 3], '100__a'),
+                                        ([1, 2, 3], '700__a')])
+
+    def test_chunks(self):
+        self.app.config['SEARCH_FACETS_CHUNK_SIZE'] = 2
+        result = utils.get_most_popular_field_values(
+            [1, 2, 3], ('100__a', '700__a'), count_repetitive_values=False,
+            limit=1)
+        self.assertEqual(len(self.queries), 4)
+        self.assertEqual([freq for dummy, freq in result], [2])
+
+    def test_invalid_tag(self):
+        # the digits of the tag are part of the table names
+        for tag in ('%%0__a', '1%0__a', 'ab0__a'):
+            self.assertEqual(self.get_fieldvalues_by_record([1], tag), [])
+
+
+TEST_SUITE = make_test_suite(TestMostCommonValues,
+                             TestDistinctValuesPerRecord)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
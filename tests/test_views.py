@@ -19,12 +19,26 @@
 
 """Unit tests for search views."""
 
+import logging
+
 from intbitset import intbitset
 from flask import url_for, current_app
 from invenio.testsuite import InvenioTestCase, make_test_suite, \
     run_test_suite
 
 
+class RecordListHandler(logging.Handler):
+
+    """Collect handled log records."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
 class SearchViewTest(InvenioTestCase):
     """ Test search view functions. """
 
@@ -40,6 +54,21 @@ class SearchViewTest(InvenioTestCase):
         response = self.client.get(url_for('search.search'))
         self.assert200(response)
 
+    def test_search_writes_log_line(self):
+        from invenio_search.receivers import logger
+        handler = RecordListHandler()
+        logger.addHandler(handler)
+        try:
+            response = self.client.get(url_for('search.search', p='ellis'))
+            self.assert200(response)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual([(record.action, record.p)
+                          for record in handler.records],
+                         [('search', 'ellis')])
+        self.assertEqual(handler.records[0].colls,
+                         current_app.config['CFG_SITE_NAME'])
+
 
 TEST_SUITE = make_test_suite(SearchViewTest)
 